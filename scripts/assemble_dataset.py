@@ -1,81 +1,90 @@
+import io
+import sys
+import argparse
 import pandas as pd
 import configs
 import os
-import time
 import zipfile
 import shutil
+import incremental
+import storage
 
-def main():
-    labelled_dataset = pd.read_csv(configs.LABELLED_DATASET_PATH)
-    dataset = []
-
-    collected_attributes1 = pd.read_csv(f"{configs.DATA_PATH}/collected_attributes1.csv")
-    collected_attributes2 = pd.read_csv(f"{configs.DATA_PATH}/collected_attributes2.csv")
-    collected_attributes3 = pd.read_csv(f"{configs.DATA_PATH}/authors_self_conflicts.csv")
-    collected_attributes4 = pd.read_csv(f"{configs.DATA_PATH}/merge_types_data.csv")
-    macTool_data = pd.read_csv(f"{configs.DATA_PATH}/macTool_output.csv")
-
-    columns = list(labelled_dataset.columns)
-    columns1 = ["left_lines_added",	"left_lines_removed",	"right_lines_added",	"right_lines_removed",	"conclusion_delay",	"keyword_fix",	"keyword_bug",	"keyword_feature",	"keyword_improve",	"keyword_document",	"keyword_refactor",	"keyword_update",	"keyword_add",	"keyword_remove",	"keyword_use",	"keyword_delete",	"keyword_change"]
-    columns2 = ["leftCC",	"rightCC",	"fileCC",	"chunkAbsSize",	"chunkRelSize",	"chunkPosition", "fileSize", "chunk_left_abs_size",	"chunk_left_rel_size", "chunk_right_abs_size", "chunk_right_rel_size"]
-    columns3 = ["Branching time",	"Merge isolation time",	"Devs 1",	"Devs 2",	"Different devs",	"Same devs",	"Devs intersection",	"Commits 1",	"Commits 2",	"Changed files 1",	"Changed files 2", "Changed files intersection"]
-    columns4 = ["self_conflict_perc"]
-    columns5 = ["has_multiple_devs_on_each_side"]
+COLUMNS1 = ["left_lines_added",	"left_lines_removed",	"right_lines_added",	"right_lines_removed",	"conclusion_delay",	"keyword_fix",	"keyword_bug",	"keyword_feature",	"keyword_improve",	"keyword_document",	"keyword_refactor",	"keyword_update",	"keyword_add",	"keyword_remove",	"keyword_use",	"keyword_delete",	"keyword_change"]
+COLUMNS2 = ["leftCC",	"rightCC",	"fileCC",	"chunkAbsSize",	"chunkRelSize",	"chunkPosition", "fileSize", "chunk_left_abs_size",	"chunk_left_rel_size", "chunk_right_abs_size", "chunk_right_rel_size"]
+COLUMNS3 = ["Branching time",	"Merge isolation time",	"Devs 1",	"Devs 2",	"Different devs",	"Same devs",	"Devs intersection",	"Commits 1",	"Commits 2",	"Changed files 1",	"Changed files 2", "Changed files intersection"]
+COLUMNS4 = ["self_conflict_perc"]
+COLUMNS5 = ["has_multiple_devs_on_each_side"]
 
-    columns.extend(columns1)
-    columns.extend(columns2)
-    columns.extend(columns3)
-    columns.extend(columns4)
-    columns.extend(columns5)
+# (file, key, columns) of each collected attributes file, in the order their columns are added to the dataset
+ATTRIBUTES_FILES = [
+    ("collected_attributes1.csv", "sha", COLUMNS1),
+    ("collected_attributes2.csv", "chunk_id", COLUMNS2),
+    ("macTool_output.csv", "chunk_id", COLUMNS3),
+    ("authors_self_conflicts.csv", "chunk_id", COLUMNS4),
+    ("merge_types_data.csv", "chunk_id", COLUMNS5),
+]
 
-    print(f'Starting the assemble process for {len(labelled_dataset)} chunks...')
-    current_index = 0
-    for index, row in labelled_dataset.iterrows():
-        data = []
-        current_index +=1
-        status = (current_index / len(labelled_dataset)) * 100
-        print(f"{time.ctime()} ### {status:.1f}% of chunks processed. Processing chunk {row['chunk_id']} for project: {row['project']}")
-        sha = row['sha']
-        chunk_id = row['chunk_id']
-        for column in labelled_dataset.columns:
-            data.append(row[column])
+'''
+    Adds the collected attributes to the labelled chunks using left joins.
+    If a key appears more than once in an attributes file, its first row is used. Chunks without attributes get empty values.
+'''
+def assemble(labelled_dataset, attributes):
+    dataset = labelled_dataset.reset_index(drop=True)
+    for (file_name, key, columns), df in zip(ATTRIBUTES_FILES, attributes):
+        df = df.drop_duplicates(key, keep='first').set_index(key)[columns]
+        dataset = dataset.join(df, on=key)
+    return dataset
 
-        commit = collected_attributes1[collected_attributes1['sha'] == sha]
-        if len(commit) > 0:
-            for column in columns1:
-                data.append(commit.iloc[0][column])
-        else:
-            data.extend([None] * len(columns1))
-        chunk = collected_attributes2[collected_attributes2['chunk_id'] == chunk_id]
-        if len(chunk) > 0:
-            for column in columns2:
-                data.append(chunk.iloc[0][column])
-        else:
-            data.extend([None] * len(columns2))
+# only the key and the attributes columns of each file are read
+def read_attributes():
+    return [storage.read(f"{configs.DATA_PATH}/{file_name}", columns=[key] + columns) for file_name, key, columns in ATTRIBUTES_FILES]
 
-        chunk = macTool_data[macTool_data['chunk_id'] == chunk_id]
-        if len(chunk) > 0:
-            for column in columns3:
-                data.append(chunk.iloc[0][column])
-        else:
-            data.extend([None] * len(columns3))
-        
-        chunk = collected_attributes3[collected_attributes3['chunk_id'] == chunk_id]
-        if len(chunk) > 0:
-            for column in columns4:
-                data.append(chunk.iloc[0][column])
-        else:
-            data.extend([None] * len(columns4))
+# compares the assembled dataset with an existing file, as they would be read from the files
+def verify(dataset, output_path):
+    current = storage.read(output_path)
+    if storage.get_format(storage.find_path(output_path)) == 'csv':
+        assembled = pd.read_csv(io.StringIO(dataset.to_csv(index=False)))
+    else:
+        # categorical columns are compared by their values
+        current = current.astype({column: object for column in current.select_dtypes('category').columns})
+        assembled = storage.apply_schema(dataset)
+        assembled = assembled.astype({column: object for column in assembled.select_dtypes('category').columns})
+    if list(current.columns) != list(assembled.columns):
+        print(f'Different columns: {list(current.columns)} != {list(assembled.columns)}')
+        return False
+    if len(current) != len(assembled):
+        print(f'Different number of rows: {len(current)} != {len(assembled)}')
+        return False
+    different = ~((current == assembled) | (current.isnull() & assembled.isnull()))
+    different_rows = different.any(axis=1)
+    if different_rows.any():
+        print(f'{different_rows.sum()} rows are different. First ones:')
+        for index in different_rows[different_rows].index[:10]:
+            columns = list(different.columns[different.loc[index]])
+            print(f"chunk {current.loc[index, 'chunk_id']}: {columns[:5]} {list(current.loc[index, columns[:5]])} != {list(assembled.loc[index, columns[:5]])}")
+        return False
+    print(f'The assembled dataset is equal to {output_path} ({len(current)} rows).')
+    return True
 
-        chunk = collected_attributes4[collected_attributes4['chunk_id'] == chunk_id]
-        if len(chunk) > 0:
-            for column in columns5:
-                data.append(chunk.iloc[0][column])
-        else:
-            data.extend([None] * len(columns5))
+def main():
+    parser = argparse.ArgumentParser(description='Combines the collected attributes into a single csv.')
+    parser.add_argument('--incremental', action='store_true', help='only process the chunks that are not in the output yet and append them to it.')
+    parser.add_argument('--verify', action='store_true', help='compares the assembled dataset with the existing output instead of writing it.')
+    arguments = parser.parse_args()
+    output_path = f'{configs.DATA_PATH}/dataset.csv'
+    labelled_dataset = storage.read(configs.LABELLED_DATASET_PATH)
+    if arguments.incremental:
+        labelled_dataset = incremental.get_new_rows(labelled_dataset, output_path)
 
-        dataset.append(data)
+    print(f'Starting the assemble process for {len(labelled_dataset)} chunks...')
+    dataset = assemble(labelled_dataset, read_attributes())
 
-    pd.DataFrame(dataset, columns = columns).to_csv(f'{configs.DATA_PATH}/dataset.csv', index=False)
+    if arguments.verify:
+        if not verify(dataset, output_path):
+            sys.exit(1)
+    elif arguments.incremental:
+        incremental.append_rows(dataset, output_path)
+    else:
+        storage.write(dataset, output_path)
 
 main()
@@ -0,0 +1,106 @@
+import os
+import ast
+import numpy as np
+import pandas as pd
+import configs
+
+'''
+    Long format storage for the authors of the chunks (one row per author of each side of a chunk):
+        chunk_id, side (left/right), author, modified, deleted, moved_renamed
+    collect_chunk_authors.py saves the authors in chunk_authors.csv as python dicts (authors_left/authors_right).
+    The table is saved in a parquet file, where the author column is dictionary encoded (each name is stored once).
+    Chunks without authors in both sides have no rows in the table.
+'''
+CSV_PATH = f'{configs.DATA_PATH}/chunk_authors.csv'
+PARQUET_PATH = f'{configs.DATA_PATH}/chunk_authors_table.parquet'
+COLUMNS = ['chunk_id', 'side', 'author', 'modified', 'deleted', 'moved_renamed']
+SIDES = ['left', 'right']
+
+def get_rows(chunk_id, authors_left, authors_right):
+    rows = []
+    for side, authors in zip(SIDES, [authors_left, authors_right]):
+        for author, values in authors.items():
+            rows.append((chunk_id, side, author, values['modified'], values['deleted'], values['moved/renamed']))
+    return rows
+
+def to_table(rows):
+    table = pd.DataFrame(rows, columns=COLUMNS)
+    return table.astype({'chunk_id': 'int64', 'side': pd.CategoricalDtype(SIDES), 'author': 'category',
+        'modified': 'int32', 'deleted': 'int32', 'moved_renamed': 'bool'})
+
+# data: rows of chunk_authors.csv (chunk_id, left_size, right_size, authors_left, authors_right) with the authors as dicts
+def from_records(data):
+    rows = []
+    for chunk_id, left_size, right_size, authors_left, authors_right in data:
+        rows.extend(get_rows(chunk_id, authors_left, authors_right))
+    return to_table(rows)
+
+# the dicts are parsed with ast.literal_eval (only literals are accepted), once for each chunk
+def from_csv(df):
+    df = df.drop_duplicates('chunk_id', keep='first')
+    rows = []
+    for chunk_id, authors_left, authors_right in zip(df['chunk_id'], df['authors_left'], df['authors_right']):
+        rows.extend(get_rows(chunk_id, ast.literal_eval(authors_left), ast.literal_eval(authors_right)))
+    return to_table(rows)
+
+def save(table, file_path=PARQUET_PATH):
+    table.to_parquet(file_path, index=False)
+
+'''
+    Reads the authors table. If the parquet file does not exist or is older than chunk_authors.csv
+    (e.g., after merging the shards of collect_chunk_authors.py), it is generated again from the csv file.
+'''
+def read_authors(columns=None, file_path=PARQUET_PATH, csv_path=CSV_PATH):
+    if not os.path.exists(file_path) or (os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(file_path)):
+        save(from_csv(pd.read_csv(csv_path)), file_path)
+    return pd.read_parquet(file_path, columns=columns)
+
+# distinct authors of each chunk (both sides)
+def get_chunks_authors(table):
+    return table[['chunk_id', 'author']].drop_duplicates()
+
+'''
+    Percentage of the authors of a chunk that contributed to both sides (Jaccard index of the left and right authors):
+    |left & right| / |left | right|. Only chunks with authors in both sides are considered.
+    weights: weighted variants (keys of WEIGHTS) added as self_conflict_perc_{weight} columns. Each author has a weight in
+    each side (e.g., lines modified in the side) and the weighted index is sum(min(left, right)) / sum(max(left, right)).
+    The authors are encoded as integer ids (category codes) and all chunks are computed at once with np.bincount.
+    The chunks are in the order of their first row in the table.
+'''
+WEIGHTS = {'modified': ['modified'], 'deleted': ['deleted'], 'lines': ['modified', 'deleted']}
+
+def get_self_conflict_perc(table, weights=()):
+    # the chunks keep the order of the table
+    chunks, chunk_ids = pd.factorize(table['chunk_id'].to_numpy())
+    authors = table['author'].cat.codes.to_numpy().astype(np.int64)
+    sides = table['side'].cat.codes.to_numpy()
+    # one pair for each author of each chunk
+    pairs, pair_index = np.unique(chunks * (authors.max(initial=0) + 1) + authors, return_inverse=True)
+    pair_chunks = chunks[np.unique(pair_index, return_index=True)[1]]
+    side_weights = {'': [np.ones(len(table))]}
+    for weight in weights:
+        side_weights[weight] = [table[column].to_numpy(dtype=np.float64) for column in WEIGHTS[weight]]
+    mins, maxs = {}, {}
+    for weight, values in side_weights.items():
+        values = sum(values)
+        left, right = [np.bincount(pair_index[sides == side], weights=values[sides == side], minlength=len(pairs))
+            for side in range(len(SIDES))]
+        if weight == '':
+            # presence of the author in each side (an author is listed once in each side)
+            left, right = left > 0, right > 0
+            has_left = np.bincount(pair_chunks, weights=left, minlength=len(chunk_ids)) > 0
+            has_right = np.bincount(pair_chunks, weights=right, minlength=len(chunk_ids)) > 0
+        mins[weight] = np.bincount(pair_chunks, weights=np.minimum(left, right), minlength=len(chunk_ids))
+        maxs[weight] = np.bincount(pair_chunks, weights=np.maximum(left, right), minlength=len(chunk_ids))
+    both_sides = has_left & has_right
+    result = pd.DataFrame({'chunk_id': chunk_ids[both_sides], 'self_conflict_perc': mins[''][both_sides] / maxs[''][both_sides]})
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for weight in weights:
+            result[f'self_conflict_perc_{weight}'] = mins[weight][both_sides] / maxs[weight][both_sides]
+    return result
+
+if __name__ == '__main__':
+    print(f'Converting {CSV_PATH}...')
+    table = from_csv(pd.read_csv(CSV_PATH))
+    save(table)
+    print(f'{len(table)} rows ({table["chunk_id"].nunique()} chunks, {len(table["author"].cat.categories)} authors) saved to {PARQUET_PATH}.')
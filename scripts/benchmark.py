@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import subprocess
+import pathlib
+import pandas as pd
+
+'''
+    Benchmarks for the collectors using synthetic merge conflicts, so their performance can be measured without
+    the mined repositories and the conflicts database.
+        python benchmark.py generate --output ../benchmark --projects 3 --history 100 --divergence 10 --merges 5 --chunks 3
+    creates local git repositories with conflicting merges, the INITIAL_DATASET.csv rows of their chunks and a sqlite
+    database with the conflicts and solutions (used by database.py instead of the conflicts database).
+        python benchmark.py run --workdir ../benchmark --save results.json
+        python benchmark.py run --workdir ../benchmark --baseline results.json
+    executes the timed suites and compares them with a previous execution (regressions make the command fail).
+'''
+
+SCRIPTS_FOLDER = pathlib.Path(__file__).parent.absolute()
+AUTHORS = ['alice', 'bob', 'carol', 'dave', 'erin', 'frank']
+SUITES = ['collect_attributes', 'collect_attributes_db', 'collect_chunk_authors', 'difflame']
+
+class SyntheticRepo:
+    def __init__(self, path, files, lines, rng):
+        self.path = path
+        self.rng = rng
+        self.date = 1500000000
+        self.files = {f'src/File{i}.java': [f'    int field{j} = {j};' for j in range(lines)] for i in range(files)}
+        os.makedirs(path)
+        self.git('init', '-q', '-b', 'main')
+        self.git('config', 'merge.conflictstyle', 'merge')
+
+    def git(self, *args, author=None):
+        env = os.environ.copy()
+        if author is not None:
+            self.date += 3600
+            env.update({'GIT_AUTHOR_NAME': author, 'GIT_AUTHOR_EMAIL': f'{author}@example.com', 'GIT_AUTHOR_DATE': f'{self.date} +0000',
+                'GIT_COMMITTER_NAME': author, 'GIT_COMMITTER_EMAIL': f'{author}@example.com', 'GIT_COMMITTER_DATE': f'{self.date} +0000'})
+        return subprocess.check_output(['git'] + list(args), cwd=self.path, env=env, text=True, stderr=subprocess.STDOUT).strip()
+
+    def write(self, file_name, lines):
+        file_path = os.path.join(self.path, file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    def commit(self, message, author=None):
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', message, author=author or self.rng.choice(AUTHORS))
+        return self.git('rev-parse', 'HEAD')
+
+    def change_random_line(self, message):
+        file_name = self.rng.choice(sorted(self.files))
+        lines = self.files[file_name]
+        line = self.rng.randrange(len(lines))
+        lines[line] = f'    int field{line} = {self.rng.randrange(1000000)};'
+        self.write(file_name, lines)
+        return self.commit(message)
+
+    def create_history(self, commits):
+        for file_name, lines in self.files.items():
+            self.write(file_name, lines)
+        self.commit('add initial version')
+        for i in range(commits - 1):
+            self.change_random_line(f'update field ({i})')
+
+    # commits on a branch that do not conflict with the other branch
+    def add_branch_commits(self, side, merge, commits):
+        for i in range(commits):
+            self.write(f'src/{side}/Merge{merge}Change{i}.java', [f'class Merge{merge}Change{i} {{', f'    // {side} {i}', '}'])
+            self.commit(f'add feature {side} {merge}.{i}')
+
+    '''
+        Creates a merge with the given number of conflicting chunks in one file. Each side changes the same regions
+        of the file in one commit, besides other divergence-1 non conflicting commits.
+        The conflict is resolved keeping the left version.
+    '''
+    def create_conflicting_merge(self, merge, divergence, chunks, chunk_size):
+        base = self.git('rev-parse', 'HEAD')
+        file_name = sorted(self.files)[merge % len(self.files)]
+        base_lines = list(self.files[file_name])
+        gap = max(1, (len(base_lines) - 2) // chunks)
+        regions = [(2 + i * gap, min(2 + i * gap + chunk_size, 2 + (i + 1) * gap - 2)) for i in range(chunks)]
+        sides = {}
+        for side in ['left', 'right']:
+            self.git('checkout', '-q', base)
+            self.git('checkout', '-q', '-B', f'{side}{merge}')
+            lines = list(base_lines)
+            for start, end in regions:
+                for line in range(start, max(end, start + 1)):
+                    lines[line] = f'    int field{line} = {self.rng.randrange(1000000)}; // {side}'
+            self.write(file_name, lines)
+            self.commit(f'change {file_name} on {side} {merge}')
+            self.add_branch_commits(side, merge, divergence - 1)
+            sides[side] = (self.git('rev-parse', 'HEAD'), lines)
+        left_sha, left_lines = sides['left']
+        right_sha = sides['right'][0]
+        self.git('checkout', '-q', left_sha)
+        try:
+            self.git('merge', '--no-ff', '-q', right_sha, author=self.rng.choice(AUTHORS))
+            raise ValueError(f'Merge {merge} of {self.path} did not conflict.')
+        except subprocess.CalledProcessError:
+            pass
+        with open(os.path.join(self.path, file_name)) as file:
+            conflicted_lines = file.read().split('\n')
+        self.write(file_name, left_lines)
+        sha = self.commit(f'Merge branch right{merge} into left{merge}')
+        self.git('checkout', '-q', '-B', 'main')
+        self.files[file_name] = left_lines
+        return base, left_sha, right_sha, sha, file_name, conflicted_lines
+
+# positions (1-based, as in the conflicts database) and contents of the chunks of a conflicted file
+def get_conflict_chunks(conflicted_lines):
+    chunks = []
+    for i, line in enumerate(conflicted_lines):
+        if line.startswith('<<<<<<<'):
+            start = i
+        elif line.startswith('======='):
+            separator = i
+        elif line.startswith('>>>>>>>'):
+            chunks.append({
+                'line_start': start + 1,
+                'line_separator': separator + 1,
+                'line_end': i + 1,
+                'conflict': conflicted_lines[start:i+1],
+                'solution': conflicted_lines[start+1:separator],
+            })
+    return chunks
+
+def create_database(database_path):
+    if os.path.exists(database_path):
+        os.remove(database_path)
+    conn = sqlite3.connect(database_path)
+    conn.execute('create table conflictingchunk (id integer primary key, beginline integer, endline integer, separatorline integer)')
+    conn.execute('create table conflictingcontent (id integer primary key, conflictingchunk_id integer, content text)')
+    conn.execute('create table solutioncontent (id integer primary key, conflictingchunk_id integer, content text)')
+    conn.execute('create index conflictingcontent_chunk on conflictingcontent (conflictingchunk_id)')
+    conn.execute('create index solutioncontent_chunk on solutioncontent (conflictingchunk_id)')
+    return conn
+
+def generate(arguments):
+    if os.path.exists(arguments.output):
+        shutil.rmtree(arguments.output)
+    output = os.path.abspath(arguments.output)
+    os.makedirs(f'{output}/data')
+    rng = random.Random(arguments.seed)
+    conn = create_database(f'{output}/conflicts.sqlite')
+    rows = []
+    for project_index in range(arguments.projects):
+        project = f'benchmark/project{project_index}'
+        repo_path = f'{output}/repos/{project}'
+        print(f'{time.ctime()} ### Generating {project}...', flush=True)
+        repo = SyntheticRepo(repo_path, arguments.files, arguments.lines, rng)
+        repo.create_history(arguments.history)
+        for merge in range(arguments.merges):
+            base, left_sha, right_sha, sha, file_name, conflicted_lines = repo.create_conflicting_merge(merge, arguments.divergence, arguments.chunks, arguments.chunk_size)
+            for chunk in get_conflict_chunks(conflicted_lines):
+                chunk_id = len(rows) + 1
+                conn.execute('insert into conflictingchunk values (?, ?, ?, ?)', (chunk_id, chunk['line_start'], chunk['line_end'], chunk['line_separator']))
+                conn.executemany('insert into conflictingcontent (conflictingchunk_id, content) values (?, ?)', [(chunk_id, line) for line in chunk['conflict']])
+                conn.executemany('insert into solutioncontent (conflictingchunk_id, content) values (?, ?)', [(chunk_id, line) for line in chunk['solution']])
+                rows.append({'chunk_id': chunk_id, 'developerdecision': 'Version 1', 'line_start': chunk['line_start'], 'line_end': chunk['line_end'],
+                    'line_separator': chunk['line_separator'], 'kind_conflict': 'Attribute', 'url': f'file://{repo_path}', 'project': project,
+                    'project_user': project.split('/')[0], 'project_name': project.split('/')[1], 'path': f'{project}/{file_name}',
+                    'file_name': os.path.basename(file_name), 'sha': sha, 'leftsha': left_sha, 'rightsha': right_sha, 'basesha': base})
+    conn.commit()
+    conn.close()
+    pd.DataFrame(rows).to_csv(f'{output}/data/INITIAL_DATASET.csv', index=False)
+    with open(f'{output}/benchmark.json', 'w') as file:
+        json.dump({'parameters': vars(arguments), 'chunks': len(rows), 'created': time.ctime()}, file, indent=2)
+    print(f'{len(rows)} conflicting chunks generated in {output}.')
+
+def get_environment(workdir):
+    env = os.environ.copy()
+    env.update({'CONFLICTS_DATA_PATH': f'{workdir}/data', 'CONFLICTS_REPOS_PATH': f'{workdir}/repos', 'CONFLICTS_DB_SQLITE': f'{workdir}/conflicts.sqlite'})
+    return env
+
+def run_script(workdir, script):
+    log_path = f'{workdir}/data/logs/benchmark-{script}.log'
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'w') as log:
+        result = subprocess.run([sys.executable, str(SCRIPTS_FOLDER / f'{script}.py'), '--restart'], cwd=workdir, env=get_environment(workdir), stdout=log, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f'{script} failed. Check {log_path}')
+    metrics_path = f'{workdir}/data/logs/{script}.metrics.json'
+    if os.path.exists(metrics_path):
+        with open(metrics_path) as file:
+            return json.load(file)['calls']
+    return {}
+
+# difflame is executed for each chunk as collect_chunk_authors does for empty sides (on the left version of the merge)
+def run_difflame(workdir):
+    df = pd.read_csv(f'{workdir}/data/INITIAL_DATASET.csv')
+    calls = 0
+    for _, row in df.iterrows():
+        repo_path = f"{workdir}/repos/{row['project']}"
+        subprocess.run(['git', 'checkout', '-q', row['leftsha']], cwd=repo_path, check=True)
+        file_path = row['path'].replace(f"{row['project']}/", '', 1)
+        subprocess.run([sys.executable, str(SCRIPTS_FOLDER / 'difflame.py'), row['basesha'], '-e', '--', file_path], cwd=repo_path, check=True, stdout=subprocess.DEVNULL)
+        calls += 1
+    return {'difflame': calls}
+
+def run_suite(workdir, suite):
+    if suite == 'difflame':
+        return run_difflame(workdir)
+    return run_script(workdir, suite)
+
+def run(arguments):
+    workdir = os.path.abspath(arguments.workdir)
+    with open(f'{workdir}/benchmark.json') as file:
+        benchmark = json.load(file)
+    results = {'benchmark': benchmark, 'executed': time.ctime(), 'suites': {}}
+    for suite in arguments.suites:
+        timings = []
+        for i in range(arguments.repeat):
+            start = time.time()
+            calls = run_suite(workdir, suite)
+            timings.append(time.time() - start)
+        results['suites'][suite] = {
+            'seconds': round(min(timings), 3),
+            'mean_seconds': round(sum(timings) / len(timings), 3),
+            'chunks_per_second': round(benchmark['chunks'] / min(timings), 2),
+            'calls': calls,
+        }
+        print(f"{suite}: {min(timings):.2f} seconds (best of {arguments.repeat}), {benchmark['chunks'] / min(timings):.1f} chunks/s, calls: {calls}", flush=True)
+    if arguments.save is not None:
+        with open(arguments.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if arguments.baseline is not None:
+        return compare(results, arguments.baseline, arguments.tolerance)
+    return True
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    if baseline['benchmark']['parameters'] != results['benchmark']['parameters']:
+        print('Warning: the baseline was generated with other benchmark parameters.')
+    regressions = 0
+    print(f'\nComparison with {baseline_path} ({baseline["executed"]}):')
+    for suite, result in results['suites'].items():
+        if suite not in baseline['suites']:
+            continue
+        previous = baseline['suites'][suite]['seconds']
+        ratio = result['seconds'] / previous if previous > 0 else 1
+        status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+        regressions += status == 'REGRESSION'
+        print(f"{suite}: {previous:.2f}s -> {result['seconds']:.2f}s ({(ratio - 1) * 100:+.1f}%) {status}")
+    return regressions == 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Generates synthetic merge conflicts and measures the performance of the collectors on them.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    generate_parser = subparsers.add_parser('generate', help='creates the repositories, the initial dataset and the conflicts database.')
+    generate_parser.add_argument('--output', default='../benchmark', help='folder of the benchmark (it is deleted if it exists).')
+    generate_parser.add_argument('--projects', type=int, default=2)
+    generate_parser.add_argument('--history', type=int, default=50, help='commits before the first merge of each project.')
+    generate_parser.add_argument('--divergence', type=int, default=5, help='commits on each side of a merge.')
+    generate_parser.add_argument('--merges', type=int, default=3, help='conflicting merges of each project.')
+    generate_parser.add_argument('--chunks', type=int, default=3, help='conflicting chunks of each merge.')
+    generate_parser.add_argument('--chunk-size', type=int, default=3, help='lines changed on each side of a chunk.')
+    generate_parser.add_argument('--files', type=int, default=5, help='java files of each project.')
+    generate_parser.add_argument('--lines', type=int, default=200, help='lines of each file.')
+    generate_parser.add_argument('--seed', type=int, default=0)
+    run_parser = subparsers.add_parser('run', help='executes the timed suites.')
+    run_parser.add_argument('--workdir', default='../benchmark', help='folder created by generate.')
+    run_parser.add_argument('--suites', nargs='+', default=SUITES, choices=SUITES)
+    run_parser.add_argument('--repeat', type=int, default=1, help='executions of each suite (the best time is reported).')
+    run_parser.add_argument('--save', help='saves the results to this json file.')
+    run_parser.add_argument('--baseline', help='results of a previous execution to compare with.')
+    run_parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown accepted before reporting a regression (default: 0.2, i.e., 20%%).')
+    arguments = parser.parse_args()
+    if arguments.command == 'generate':
+        generate(arguments)
+    elif not run(arguments):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,27 @@ CREDITS TO https://github.com/navicto/Discretization-MDLPC
 '''
 from __future__ import division
 __author__ = 'Victor Ruiz, vmr11@pitt.edu'
+import os
+import json
+import hashlib
 import numpy as np
 from math import log
 from sklearn.base import TransformerMixin
-
-def previous_item(a, val):
-    idx = np.where(a == val)[0][0] - 1
-    return a[idx]
+from joblib import Parallel, delayed
+try:
+    import information_theory
+except ImportError:  # imported as classifier.MDLP (from the scripts folder)
+    from classifier import information_theory
+
+# gains computed with vectorized operations may differ from the exact ones by rounding errors
+GAIN_TOLERANCE = 1e-9
+# cut points of the fits of this process (fit key -> cut points of each feature)
+CUTS_CACHE = {}
+# part of the fit keys, so the cut points cached before a change in the fitting algorithm are not reused
+CUTS_VERSION = 1
 
 class MDLP_Discretizer(TransformerMixin):
-    def __init__(self, features=None, raw_data_shape=None):
+    def __init__(self, features=None, raw_data_shape=None, n_jobs=1, use_cache=False, cache_path=None):
         '''
         initializes discretizer object:
             saves raw copy of data and creates self._data with only features to discretize and class
@@ -25,10 +36,17 @@ class MDLP_Discretizer(TransformerMixin):
         :param X: pandas dataframe with data to discretize
         :param class_label: name of the column containing class in input dataframe
         :param features: if !None, features that the user wants to discretize specifically
+        :param n_jobs: number of features processed in parallel by fit (see joblib.Parallel)
+        :param use_cache: if True, fit reuses the cut points of a previous fit with the same data (see get_fit_key)
+        :param cache_path: folder where the cut points of the fits are also saved (json files), so they are reused
+            by other processes
         :return:
         '''
         #Initialize descriptions of discretizatino bins
         self._bin_descriptions = {}
+        self._n_jobs = n_jobs
+        self._use_cache = use_cache or cache_path is not None
+        self._cache_path = cache_path
 
         #Create array with attr indices to discretize
         if features is None:  # Assume all columns are numeric and need to be discretized
@@ -52,7 +70,8 @@ class MDLP_Discretizer(TransformerMixin):
     def fit(self, X, y):
         self._data_raw = X  # copy of original input data
         self._class_labels = y.reshape(-1, 1)  # make sure class labels is a column vector
-        self._classes = np.unique(self._class_labels)
+        self._classes, self._class_codes = np.unique(self._class_labels, return_inverse=True)
+        self._class_codes = self._class_codes.reshape(-1)  # classes encoded as integers (indexes of self._classes)
 
 
         if len(self._col_idx) != self._data_raw.shape[1]:  # some columns will not be discretized
@@ -61,11 +80,18 @@ class MDLP_Discretizer(TransformerMixin):
         # initialize feature bins cut points
         self._cuts = {f: [] for f in self._col_idx}
 
-        # pre-compute all boundary points in dataset
-        self._boundaries = self.compute_boundary_points_all_features()
+        key = get_fit_key(X, y, self._col_idx) if self._use_cache else None
+        cuts = self.read_cache(key) if self._use_cache else None
+        if cuts is not None:
+            self._cuts.update(cuts)
+        else:
+            # pre-compute all boundary points in dataset
+            self._boundaries = self.compute_boundary_points_all_features()
 
-        # get cuts for all features
-        self.all_features_accepted_cutpoints()
+            # get cuts for all features
+            self.all_features_accepted_cutpoints()
+            if self._use_cache:
+                self.write_cache(key)
 
         #generate bin string descriptions
         self.generate_bin_descriptions()
@@ -74,6 +100,47 @@ class MDLP_Discretizer(TransformerMixin):
 
         return self
 
+    def read_cache(self, key):
+        '''
+        Cut points of a previous fit with the same key, from the cache of this process or from cache_path
+        :return: dictionary with the cut points of each feature, None if the fit is not cached
+        '''
+        if key not in CUTS_CACHE and self._cache_path is not None and os.path.exists(os.path.join(self._cache_path, f'{key}.json')):
+            CUTS_CACHE[key] = read_cuts(os.path.join(self._cache_path, f'{key}.json'))['cuts']
+        if key not in CUTS_CACHE:
+            return None
+        return {feature: list(cuts) for feature, cuts in CUTS_CACHE[key].items()}
+
+    def write_cache(self, key):
+        CUTS_CACHE[key] = {feature: list(cuts) for feature, cuts in self._cuts.items()}
+        if self._cache_path is not None:
+            os.makedirs(self._cache_path, exist_ok=True)
+            self.save_cuts(os.path.join(self._cache_path, f'{key}.json'))
+
+    def save_cuts(self, file_path):
+        '''
+        Saves the fitted cut points (and the features and classes) to a json file, so other data (e.g., a test set)
+        can be discretized with them later (see load_cuts)
+        '''
+        data = {'features': [int(feature) for feature in self._col_idx], 'classes': [str(label) for label in self._classes],
+            'cuts': {str(feature): [float(cut) for cut in cuts] for feature, cuts in self._cuts.items()}}
+        # written to a temporary file first, so a process reading the cache never finds a partial file
+        with open(f'{file_path}.tmp', 'w') as file:
+            json.dump(data, file)
+        os.replace(f'{file_path}.tmp', file_path)
+
+    @classmethod
+    def load_cuts(cls, file_path):
+        '''
+        Creates a fitted discretizer from the cut points saved by save_cuts
+        '''
+        data = read_cuts(file_path)
+        discretizer = cls(features=data['features'])
+        discretizer._classes = np.array(data['classes'], dtype=object)
+        discretizer._cuts = data['cuts']
+        discretizer.generate_bin_descriptions()
+        return discretizer
+
     def transform(self, X, inplace=False):
         if inplace:
             discretized = X
@@ -93,69 +160,30 @@ class MDLP_Discretizer(TransformerMixin):
         :param partition_index: index of the sample (dataframe partition) in the interval of interest
         :return: True/False, whether to accept the partition
         '''
-        #get dataframe only with desired attribute and class columns, and split by cut_point
-        left_mask = X <= cut_point
-        right_mask = X > cut_point
-
-        #compute information gain obtained when splitting data at cut_point
-        cut_point_gain = cut_point_information_gain_numpy(X, y, cut_point)
-        #compute delta term in MDLPC criterion
-        N = len(X) # number of examples in current partition
-        partition_entropy = entropy_numpy(y)
-        k = len(np.unique(y))
-        k_left = len(np.unique(y[left_mask]))
-        k_right = len(np.unique(y[right_mask]))
-        entropy_left = entropy_numpy(y[left_mask])  # entropy of partition
-        entropy_right = entropy_numpy(y[right_mask])
-        delta = log(3 ** k, 2) - (k * partition_entropy) + (k_left * entropy_left) + (k_right * entropy_right)
-
-        #to split or not to split
-        gain_threshold = (log(N - 1, 2) + delta) / N
-
-        if cut_point_gain > gain_threshold:
-            return True
-        else:
-            return False
+        left_counts, counts = self.candidates_class_counts(X, y, np.array([cut_point]))
+        left_counts = left_counts[0]
+        cut_point_gain = cut_point_information_gain_counts(left_counts, counts - left_counts)
+        return MDLPC_criterion_counts(left_counts, counts - left_counts, cut_point_gain)
 
     def feature_boundary_points(self, values):
         '''
         Given an attribute, find all potential cut_points (boundary points)
-        :param feature: feature of interest
-        :param partition_index: indices of rows for which feature value falls whithin interval of interest
+        :param values: values of the feature of interest (one for each example)
         :return: array with potential cut_points
         '''
-
-        missing_mask = np.isnan(values)
-        data_partition = np.concatenate([values[:, np.newaxis], self._class_labels], axis=1)
-        data_partition = data_partition[~missing_mask]
-        #sort data by values
-        data_partition = data_partition[data_partition[:, 0].argsort()]
-
-        #Get unique values in column
-        unique_vals = np.unique(data_partition[:, 0])  # each of this could be a bin boundary
-        #Find if when feature changes there are different class values
-        boundaries = []
-        for i in range(1, unique_vals.size):  # By definition first unique value cannot be a boundary
-            previous_val_idx = np.where(data_partition[:, 0] == unique_vals[i-1])[0]
-            current_val_idx = np.where(data_partition[:, 0] == unique_vals[i])[0]
-            merged_classes = np.union1d(data_partition[previous_val_idx, 1], data_partition[current_val_idx, 1])
-            if merged_classes.size > 1:
-                boundaries += [unique_vals[i]]
-        boundaries_offset = np.array([previous_item(unique_vals, var) for var in boundaries])
-        return (np.array(boundaries) + boundaries_offset) / 2
+        return boundary_points(values, self._class_codes)
 
     def compute_boundary_points_all_features(self):
         '''
         Computes all possible boundary points for each attribute in self._features (features to discretize)
+        The features are processed in parallel (self._n_jobs, see joblib.Parallel)
         :return:
         '''
-        def padded_cutpoints_array(arr, N):
-            cutpoints = self.feature_boundary_points(arr)
-            padding = np.array([np.nan] * (N - len(cutpoints)))
-            return np.concatenate([cutpoints, padding])
-
-        boundaries = np.empty(self._data_raw.shape)
-        boundaries[:, self._col_idx] = np.apply_along_axis(padded_cutpoints_array, 0, self._data_raw[:, self._col_idx], self._data_raw.shape[0])
+        features_boundaries = Parallel(n_jobs=self._n_jobs)(
+            delayed(boundary_points)(self._data_raw[:, attr], self._class_codes) for attr in self._col_idx)
+        boundaries = np.full(self._data_raw.shape, np.nan)
+        for attr, cutpoints in zip(self._col_idx, features_boundaries):
+            boundaries[:len(cutpoints), attr] = cutpoints
         mask = np.all(np.isnan(boundaries), axis=1)
         return boundaries[~mask]
 
@@ -171,6 +199,41 @@ class MDLP_Discretizer(TransformerMixin):
         mask = np.logical_and((self._boundaries[:, feature_idx] > range_min), (self._boundaries[:, feature_idx] < range_max))
         return np.unique(self._boundaries[:, feature_idx][mask])
 
+    def feature_boundaries(self, feature_idx):
+        '''
+        Candidate cut points of a feature (boundary points computed on the whole dataset), in ascending order
+        '''
+        boundaries = self._boundaries[:, feature_idx]
+        return np.unique(boundaries[~np.isnan(boundaries)])
+
+    def candidates_class_counts(self, X, y, candidates):
+        '''
+        Counts the examples of each class on the left (values <= cut point) of each candidate cut point, using the
+        cumulative class counts over the partition sorted by value
+        :param X: values of the feature in the partition (without missing values)
+        :param y: classes of the examples in the partition
+        :param candidates: candidate cut points
+        :return: left counts (candidates x classes) and counts of the whole partition (classes)
+        '''
+        classes, codes = np.unique(y, return_inverse=True)
+        order = np.argsort(X, kind='stable')
+        cumulative_counts = cumulative_class_counts(codes.reshape(-1)[order], len(classes))
+        left_counts = cumulative_counts[np.searchsorted(X[order], candidates, side='right')]
+        return left_counts, cumulative_counts[-1]
+
+    def evaluate_cut_points(self, X, y, feature_idx):
+        '''
+        Evaluates the information gain of all candidate cut points of a feature in a data partition at once
+        :return: best cut point (highest information gain, if many picks first), its left and right class counts
+        and its information gain. None if no candidates
+        '''
+        candidates = self.boundaries_in_partition(X, feature_idx=feature_idx)
+        if candidates.size == 0:
+            return None
+        left_counts, counts = self.candidates_class_counts(X, y, candidates)
+        best, gain = select_cut_point(left_counts, counts)
+        return candidates[best], left_counts[best], counts - left_counts[best], gain
+
     def best_cut_point(self, X, y, feature_idx):
         '''
         Selects the best cut point for a feature in a data partition based on information gain
@@ -178,63 +241,37 @@ class MDLP_Discretizer(TransformerMixin):
         :param feature: target attribute
         :return: value of cut point with highest information gain (if many, picks first). None if no candidates
         '''
-        candidates = self.boundaries_in_partition(X, feature_idx=feature_idx)
-        if candidates.size == 0:
+        best = self.evaluate_cut_points(X, y, feature_idx)
+        if best is None:
             return None
-        gains = [(cut, cut_point_information_gain_numpy(X, y, cut_point=cut)) for cut in candidates]
-        gains = sorted(gains, key=lambda x: x[1], reverse=True)
-
-        return gains[0][0] #return cut point
+        return best[0] #return cut point
 
     def single_feature_accepted_cutpoints(self, X, y, feature_idx):
         '''
         Computes the cuts for binning a feature according to the MDLP criterion
-        :param feature: attribute of interest
-        :param partition_index: index of examples in data partition for which cuts are required
+        :param X: values of the feature of interest
+        :param y: classes of the examples
+        :param feature_idx: index of the feature (column)
         :return: list of cuts for binning feature in partition covered by partition_index
         '''
-
-        #Delte missing data
-        mask = np.isnan(X)
-        X = X[~mask]
-        y = y[~mask]
-
-        #stop if constant or null feature values
-        if len(np.unique(X)) < 2:
-            return
-        #determine whether to cut and where
-        cut_candidate = self.best_cut_point(X, y, feature_idx)
-        if cut_candidate == None:
-            return
-        decision = self.MDLPC_criterion(X, y, feature_idx, cut_candidate)
-
-        # partition masks
-        left_mask = X <= cut_candidate
-        right_mask = X > cut_candidate
-
-        #apply decision
-        if not decision:
-            return  # if partition wasn't accepted, there's nothing else to do
-        if decision:
-            #now we have two new partitions that need to be examined
-            left_partition = X[left_mask]
-            right_partition = X[right_mask]
-            if (left_partition.size == 0) or (right_partition.size == 0):
-                return #extreme point selected, don't partition
-            self._cuts[feature_idx] += [cut_candidate]  # accept partition
-            self.single_feature_accepted_cutpoints(left_partition, y[left_mask], feature_idx)
-            self.single_feature_accepted_cutpoints(right_partition, y[right_mask], feature_idx)
-            #order cutpoints in ascending order
-            self._cuts[feature_idx] = sorted(self._cuts[feature_idx])
-            return
+        classes, codes = np.unique(y, return_inverse=True)
+        cuts = accepted_cutpoints(X, codes.reshape(-1), len(classes), self.feature_boundaries(feature_idx))
+        #order cutpoints in ascending order
+        self._cuts[feature_idx] = sorted(self._cuts[feature_idx] + cuts)
+        return self._cuts[feature_idx]
 
     def all_features_accepted_cutpoints(self):
         '''
         Computes cut points for all numeric features (the ones in self._features)
+        The features are processed in parallel (self._n_jobs, see joblib.Parallel); each feature has the same cuts
+        as when it is processed alone
         :return:
         '''
-        for attr in self._col_idx:
-            self.single_feature_accepted_cutpoints(X=self._data_raw[:, attr], y=self._class_labels, feature_idx=attr)
+        features_cuts = Parallel(n_jobs=self._n_jobs)(
+            delayed(accepted_cutpoints)(self._data_raw[:, attr], self._class_codes, len(self._classes), self.feature_boundaries(attr))
+            for attr in self._col_idx)
+        for attr, cuts in zip(self._col_idx, features_cuts):
+            self._cuts[attr] = cuts
         return
 
     def generate_bin_descriptions(self):
@@ -276,6 +313,169 @@ class MDLP_Discretizer(TransformerMixin):
                 data[:, attr] = discretized_col
         return data
 
+'''
+    Key of a fit: hash of the values of the discretized features, of the classes and of the features (column indices).
+    The cut points of a feature only depend on its values and on the classes, so fits with the same key have the same cuts.
+'''
+def get_fit_key(X, y, features):
+    features = sorted(int(feature) for feature in features)
+    key = hashlib.sha256()
+    key.update(json.dumps([CUTS_VERSION, features]).encode())
+    key.update(np.ascontiguousarray(np.asarray(X)[:, features], dtype=float).tobytes())
+    key.update('\0'.join(str(label) for label in np.asarray(y).reshape(-1)).encode())
+    return key.hexdigest()
+
+def read_cuts(file_path):
+    with open(file_path) as file:
+        data = json.load(file)
+    data['cuts'] = {int(feature): cuts for feature, cuts in data['cuts'].items()}
+    return data
+
+def MDLPC_criterion_counts(left_counts, right_counts, cut_point_gain):
+    '''
+    MDLPC criterion from the class counts of both sides of the cut point
+    :param left_counts: number of examples of each class on the left (values <= cut_point)
+    :param right_counts: number of examples of each class on the right
+    :param cut_point_gain: information gain of the cut point
+    :return: True/False, whether to accept the partition
+    '''
+    counts = left_counts + right_counts
+    #compute delta term in MDLPC criterion
+    N = int(counts.sum()) # number of examples in current partition
+    partition_entropy = entropy_counts(counts)
+    k = int(np.count_nonzero(counts))
+    k_left = int(np.count_nonzero(left_counts))
+    k_right = int(np.count_nonzero(right_counts))
+    entropy_left = entropy_counts(left_counts)  # entropy of partition
+    entropy_right = entropy_counts(right_counts)
+    delta = log(3 ** k, 2) - (k * partition_entropy) + (k_left * entropy_left) + (k_right * entropy_right)
+
+    #to split or not to split
+    gain_threshold = (log(N - 1, 2) + delta) / N
+
+    if cut_point_gain > gain_threshold:
+        return True
+    else:
+        return False
+
+def boundary_points(values, class_codes):
+    '''
+    Boundary points of a feature: the midpoints between two consecutive unique values when the examples of both
+    values have more than one class. The data is sorted once (by value and class), and each run of equal values is
+    described by its first and last class, so all transitions are checked in a single pass.
+    :param values: values of the feature (one for each example, missing values are ignored)
+    :param class_codes: class of each example (integer codes)
+    :return: array with potential cut_points
+    '''
+    values = np.asarray(values, dtype=float)
+    missing_mask = np.isnan(values)
+    values, classes = values[~missing_mask], class_codes[~missing_mask]
+    if values.size == 0:
+        return np.array([])
+    order = np.lexsort((classes, values))
+    values, classes = values[order], classes[order]
+    # runs of equal values
+    run_starts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+    run_ends = np.concatenate([run_starts[1:], [values.size]]) - 1
+    unique_vals = values[run_starts]
+    first_class, last_class = classes[run_starts], classes[run_ends]
+    # the union of the classes of two consecutive values has more than one class if any of them has more than one
+    # class or if their (single) classes are different
+    mixed = first_class != last_class
+    boundaries = mixed[1:] | mixed[:-1] | (first_class[1:] != first_class[:-1])
+    return (unique_vals[1:][boundaries] + unique_vals[:-1][boundaries]) / 2
+
+def cumulative_class_counts(class_codes, n_classes):
+    '''
+    Cumulative number of examples of each class: row i has the counts of the first i examples
+    '''
+    cumulative_counts = np.zeros((len(class_codes) + 1, n_classes), dtype=np.int64)
+    cumulative_counts[1:] = np.cumsum(np.eye(n_classes, dtype=np.int64)[class_codes], axis=0)
+    return cumulative_counts
+
+def select_cut_point(left_counts, counts):
+    '''
+    Selects the candidate cut point with the highest information gain (if many, picks first)
+    :param left_counts: class counts on the left of each candidate (candidates x classes)
+    :param counts: class counts of the partition
+    :return: index of the candidate and its information gain
+    '''
+    gains = information_gains(left_counts, counts - left_counts)
+    # the gains close to the highest one are computed again as cut_point_information_gain_numpy does,
+    # so ties are broken in the same way (first candidate with the highest gain)
+    best = np.flatnonzero(gains >= gains.max() - GAIN_TOLERANCE)
+    best_gains = [cut_point_information_gain_counts(left_counts[i], counts - left_counts[i]) for i in best]
+    return best[int(np.argmax(best_gains))], max(best_gains)
+
+def accepted_cutpoints(values, class_codes, n_classes, boundaries):
+    '''
+    Computes the cuts of a feature according to the MDLP criterion.
+    The examples are sorted by value once, so each partition is a range of the sorted examples, and the partitions
+    still to be examined are kept in a stack (instead of recursive calls with copies of the partitions)
+    :param values: values of the feature (missing values are ignored)
+    :param class_codes: class of each example (integer codes)
+    :param n_classes: number of classes
+    :param boundaries: candidate cut points of the feature, in ascending order
+    :return: list of cuts in ascending order
+    '''
+    values = np.asarray(values, dtype=float)
+    mask = ~np.isnan(values)
+    order = np.argsort(values[mask], kind='stable')
+    values = values[mask][order]
+    cumulative_counts = cumulative_class_counts(class_codes[mask][order], n_classes)
+    cuts = []
+    partitions = [(0, len(values))]
+    while partitions:
+        start, end = partitions.pop()
+        #stop if constant or null feature values
+        if end - start < 2 or values[start] == values[end - 1]:
+            continue
+        candidates = boundaries[np.searchsorted(boundaries, values[start], side='right'):np.searchsorted(boundaries, values[end - 1], side='left')]
+        if candidates.size == 0:
+            continue
+        splits = start + np.searchsorted(values[start:end], candidates, side='right')
+        left_counts = cumulative_counts[splits] - cumulative_counts[start]
+        counts = cumulative_counts[end] - cumulative_counts[start]
+        best, cut_point_gain = select_cut_point(left_counts, counts)
+        if not MDLPC_criterion_counts(left_counts[best], counts - left_counts[best], cut_point_gain):
+            continue
+        cuts.append(candidates[best])
+        partitions.append((splits[best], end))
+        partitions.append((start, splits[best]))
+    return sorted(cuts)
+
+def entropy_counts(counts, base=2):
+    '''
+    Computes the entropy of a set of labels from the number of examples of each class
+    (same operations, in the same order, as entropy_numpy)
+    :param counts: number of examples of each class (classes in ascending order)
+    :return: value of entropy
+    '''
+    N = counts.sum()
+    ent = 0  # initialize entropy
+    for count in counts[counts > 0]:
+        proportion = count / N
+        ent -= proportion * log(proportion, base)
+    return ent
+
+def cut_point_information_gain_counts(left_counts, right_counts):
+    '''
+    Information gain of a cut point from the class counts of both sides (same value as cut_point_information_gain_numpy)
+    '''
+    (N_left, N_right) = (left_counts.sum(), right_counts.sum())
+    N = N_left + N_right
+    return entropy_counts(left_counts + right_counts) - (N_left / N) * entropy_counts(left_counts) - \
+        (N_right / N) * entropy_counts(right_counts)
+
+def information_gains(left_counts, right_counts):
+    '''
+    Information gain of each cut point from the class counts of both sides (rows: cut points, columns: classes)
+    '''
+    N_left, N_right = left_counts.sum(axis=1), right_counts.sum(axis=1)
+    N = N_left + N_right
+    return information_theory.entropies(left_counts + right_counts) - (N_left / N) * information_theory.entropies(left_counts) - \
+        (N_right / N) * information_theory.entropies(right_counts)
+
 def entropy_numpy(data_classes, base=2):
     '''
     Computes the entropy of a set of labels (class instantiations)
@@ -283,18 +483,8 @@ def entropy_numpy(data_classes, base=2):
     :param data_classes: Series with labels of examples in a dataset
     :return: value of entropy
     '''
-    classes = np.unique(data_classes)
-    N = len(data_classes)
-    ent = 0  # initialize entropy
-
-    # iterate over classes
-    for c in classes:
-        partition = data_classes[data_classes == c]  # data with class = c
-        proportion = len(partition) / N
-        #update entropy
-        ent -= proportion * log(proportion, base)
-
-    return ent
+    class_codes, classes = information_theory.encode(np.asarray(data_classes).reshape(-1))
+    return entropy_counts(information_theory.class_counts(class_codes, len(classes)), base)
 
 def cut_point_information_gain_numpy(X, y, cut_point):
     '''
@@ -0,0 +1,214 @@
+import os
+import glob
+import time
+import argparse
+from math import log
+import numpy as np
+import pandas as pd
+import configs
+from MDLP import MDLP_Discretizer
+
+'''
+    Benchmark of the MDLP discretization on the training datasets of the projects (../../data/projects).
+    Each step of MDLP_Discretizer (boundary points, and the cut points found by fit) is compared with the reference
+    implementation (https://github.com/navicto/Discretization-MDLPC), which is kept in this file: the results must be
+    identical and the times of both are reported.
+        python MDLP_benchmark.py --projects 10
+        python MDLP_benchmark.py --synthetic 20000    (random dataset, when the projects datasets are not available)
+'''
+NON_FEATURES_COLUMNS = ['developerdecision', 'chunk_id', 'line_start', 'line_end', 'line_separator', 'kind_conflict', 'url', 'project',
+    'project_user', 'project_name', 'path', 'file_name', 'sha', 'leftsha', 'rightsha', 'basesha']
+NUMERICS = ['int8', 'int16', 'int32', 'int64', 'float16', 'float32', 'float64']
+
+def reference_previous_item(a, val):
+    idx = np.where(a == val)[0][0] - 1
+    return a[idx]
+
+def reference_boundary_points(values, class_labels):
+    missing_mask = np.isnan(values)
+    data_partition = np.concatenate([values[:, np.newaxis], class_labels], axis=1)
+    data_partition = data_partition[~missing_mask]
+    data_partition = data_partition[data_partition[:, 0].argsort()]
+    unique_vals = np.unique(data_partition[:, 0])
+    boundaries = []
+    for i in range(1, unique_vals.size):
+        previous_val_idx = np.where(data_partition[:, 0] == unique_vals[i-1])[0]
+        current_val_idx = np.where(data_partition[:, 0] == unique_vals[i])[0]
+        merged_classes = np.union1d(data_partition[previous_val_idx, 1], data_partition[current_val_idx, 1])
+        if merged_classes.size > 1:
+            boundaries += [unique_vals[i]]
+    boundaries_offset = np.array([reference_previous_item(unique_vals, var) for var in boundaries])
+    return (np.array(boundaries) + boundaries_offset) / 2
+
+def reference_entropy(data_classes, base=2):
+    classes = np.unique(data_classes)
+    N = len(data_classes)
+    ent = 0
+    for c in classes:
+        partition = data_classes[data_classes == c]
+        proportion = len(partition) / N
+        ent -= proportion * log(proportion, base)
+    return ent
+
+def reference_information_gain(X, y, cut_point):
+    entropy_full = reference_entropy(y)
+    data_left_mask = X <= cut_point
+    data_right_mask = X > cut_point
+    (N, N_left, N_right) = (len(X), data_left_mask.sum(), data_right_mask.sum())
+    return entropy_full - (N_left / N) * reference_entropy(y[data_left_mask]) - \
+        (N_right / N) * reference_entropy(y[data_right_mask])
+
+# cut points of the reference implementation (MDLP_Discretizer.fit)
+class ReferenceMDLP:
+    def __init__(self, features):
+        self._col_idx = features
+
+    def fit(self, X, y):
+        self._class_labels = y.reshape(-1, 1)
+        self._cuts = {f: [] for f in self._col_idx}
+        boundaries = np.full(X.shape, np.nan)
+        for f in self._col_idx:
+            cutpoints = reference_boundary_points(X[:, f], self._class_labels)
+            boundaries[:len(cutpoints), f] = cutpoints
+        self._boundaries = boundaries[~np.all(np.isnan(boundaries), axis=1)]
+        for f in self._col_idx:
+            self.single_feature_accepted_cutpoints(X[:, f], self._class_labels, f)
+        return self
+
+    def MDLPC_criterion(self, X, y, cut_point):
+        left_mask = X <= cut_point
+        right_mask = X > cut_point
+        cut_point_gain = reference_information_gain(X, y, cut_point)
+        N = len(X)
+        partition_entropy = reference_entropy(y)
+        k = len(np.unique(y))
+        k_left = len(np.unique(y[left_mask]))
+        k_right = len(np.unique(y[right_mask]))
+        entropy_left = reference_entropy(y[left_mask])
+        entropy_right = reference_entropy(y[right_mask])
+        delta = log(3 ** k, 2) - (k * partition_entropy) + (k_left * entropy_left) + (k_right * entropy_right)
+        gain_threshold = (log(N - 1, 2) + delta) / N
+        return cut_point_gain > gain_threshold
+
+    def best_cut_point(self, X, y, feature_idx):
+        range_min, range_max = (X.min(), X.max())
+        mask = np.logical_and((self._boundaries[:, feature_idx] > range_min), (self._boundaries[:, feature_idx] < range_max))
+        candidates = np.unique(self._boundaries[:, feature_idx][mask])
+        if candidates.size == 0:
+            return None
+        gains = [(cut, reference_information_gain(X, y, cut_point=cut)) for cut in candidates]
+        gains = sorted(gains, key=lambda x: x[1], reverse=True)
+        return gains[0][0]
+
+    def single_feature_accepted_cutpoints(self, X, y, feature_idx):
+        mask = np.isnan(X)
+        X = X[~mask]
+        y = y[~mask]
+        if len(np.unique(X)) < 2:
+            return
+        cut_candidate = self.best_cut_point(X, y, feature_idx)
+        if cut_candidate is None or not self.MDLPC_criterion(X, y, cut_candidate):
+            return
+        left_mask = X <= cut_candidate
+        right_mask = X > cut_candidate
+        if X[left_mask].size == 0 or X[right_mask].size == 0:
+            return
+        self._cuts[feature_idx] += [cut_candidate]
+        self.single_feature_accepted_cutpoints(X[left_mask], y[left_mask], feature_idx)
+        self.single_feature_accepted_cutpoints(X[right_mask], y[right_mask], feature_idx)
+        self._cuts[feature_idx] = sorted(self._cuts[feature_idx])
+
+def benchmark_boundary_points(X, y):
+    discretizer = MDLP_Discretizer(features=range(X.shape[1]))
+    discretizer._class_labels = y.reshape(-1, 1)
+    discretizer._classes, discretizer._class_codes = np.unique(y, return_inverse=True)
+    reference_time, current_time, different = 0, 0, []
+    for feature in range(X.shape[1]):
+        start = time.perf_counter()
+        expected = reference_boundary_points(X[:, feature], y.reshape(-1, 1))
+        reference_time += time.perf_counter() - start
+        start = time.perf_counter()
+        result = discretizer.feature_boundary_points(X[:, feature])
+        current_time += time.perf_counter() - start
+        if not np.array_equal(np.asarray(expected, dtype=float), result):
+            different.append(feature)
+    return reference_time, current_time, different
+
+def benchmark_fit(X, y):
+    features = list(range(X.shape[1]))
+    start = time.perf_counter()
+    expected = ReferenceMDLP(features).fit(X, y)._cuts
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    result = MDLP_Discretizer(features=features).fit(X, y)._cuts
+    current_time = time.perf_counter() - start
+    different = [feature for feature in features if list(expected[feature]) != list(result[feature])]
+    return reference_time, current_time, different
+
+SUITES = {'boundary_points': benchmark_boundary_points, 'fit': benchmark_fit}
+
+# numeric features (as in classifier_utils.get_mdlp_discretization) and classes of a training dataset
+def get_features(df):
+    X = df.drop(columns=[column for column in NON_FEATURES_COLUMNS if column in df.columns])
+    X = X.select_dtypes(include=NUMERICS)
+    return X.columns, X.to_numpy(dtype=float), df['developerdecision'].to_numpy()
+
+def read_dataset(file_path):
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path)
+    if file_path.endswith('.parquet'):
+        return pd.read_parquet(file_path)
+    return pd.read_feather(file_path)
+
+# training datasets of the projects: csv files or partitions of projects/training (see scripts/storage.py)
+def get_datasets(projects):
+    files = sorted(glob.glob(f'{configs.PROJECTS_DATA}/*-training.csv'))
+    for file_format in ['parquet', 'feather']:
+        files += sorted(glob.glob(f'{configs.PROJECTS_DATA}/training.{file_format}/project=*/part-0.{file_format}'))
+    for file_path in files[:projects]:
+        yield os.path.relpath(file_path, configs.PROJECTS_DATA), read_dataset(file_path)
+
+def get_synthetic_dataset(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'developerdecision': rng.choice(['Version 1', 'Version 2', 'Combination', 'ConcatenationV1V2'], rows)})
+    for feature in range(10):
+        values = rng.zipf(1.5 + feature / 10, rows).astype(float)
+        values[rng.random(rows) < 0.05] = np.nan
+        df[f'feature{feature}'] = values
+    # features correlated with the class
+    df['lines'] = np.where(df['developerdecision'] == 'Version 1', rng.integers(0, 50, rows), rng.integers(30, 500, rows))
+    df['ratio'] = rng.random(rows) + (df['developerdecision'] == 'Combination')
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the MDLP discretization with its reference implementation.')
+    parser.add_argument('--projects', type=int, default=None, help='number of projects used (all by default).')
+    parser.add_argument('--synthetic', type=int, default=None, help='uses a random dataset with this number of rows.')
+    parser.add_argument('--suites', nargs='+', choices=list(SUITES), default=list(SUITES), help='steps compared.')
+    arguments = parser.parse_args()
+    datasets = [('synthetic', get_synthetic_dataset(arguments.synthetic))] if arguments.synthetic else get_datasets(arguments.projects)
+
+    totals = {suite: [0, 0] for suite in arguments.suites}
+    failed = False
+    processed = 0
+    for name, df in datasets:
+        processed += 1
+        columns, X, y = get_features(df)
+        for suite in arguments.suites:
+            reference_time, current_time, different = SUITES[suite](X, y)
+            totals[suite][0] += reference_time
+            totals[suite][1] += current_time
+            print(f'{name} ({X.shape[0]} rows, {X.shape[1]} features) {suite}: reference {reference_time:.3f}s, current {current_time:.3f}s', flush=True)
+            if len(different) > 0:
+                failed = True
+                print(f'    different results for the features: {list(columns[different])}')
+    if processed == 0:
+        print(f'No training datasets found in {configs.PROJECTS_DATA}.')
+        return
+    for suite, (reference_time, current_time) in totals.items():
+        print(f'Total {suite}: reference {reference_time:.3f}s, current {current_time:.3f}s ({reference_time / max(current_time, 1e-9):.1f}x)')
+    if failed:
+        raise SystemExit('The results are different from the reference implementation.')
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,20 @@
 import pandas as pd
+import os
 import math
-from math import log2
+import urllib.parse
 from sklearn.model_selection import cross_val_score, GridSearchCV, validation_curve
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.impute import SimpleImputer
 from sklearn.feature_selection import RFECV, SelectFromModel
 import numpy as np
+from scipy.sparse import csr_matrix, hstack
 from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.model_selection import cross_val_predict
 from matplotlib import pyplot as plt
 import configs
 from MDLP import MDLP_Discretizer
+import information_theory
 from IPython import display
 
 class ProjectResults:
@@ -139,13 +142,16 @@ class IgnoreAttributes:
             project = project.replace("/", "__")
             projects_data_path = configs.PROJECTS_DATA
             project_dataset = f"{projects_data_path}/{project}-training.csv"
-            df = pd.read_csv(project_dataset)
+            df = read_dataset(project_dataset, with_authors=False)
+            # the author columns may be in a separate authors file (see load_project_authors)
+            project_authors = load_project_authors(project_dataset)
+            columns = list(df.columns) + ([] if project_authors is None else list(project_authors[2]))
             if attributes_group == 'authorship' or attributes_group == 'all':
                 self.ignored_columns.append('self_conflict_perc')
                 
                 # use an heuristic to identify column names related to the authors involved in the conflict
                 # none of the other column names have '.' or '@', which most of the author' columns have
-                for column in list(df.columns):
+                for column in columns:
                     if '.' in column or '@' in column:
                         self.ignored_columns.append(column)
             
@@ -157,7 +163,7 @@ class IgnoreAttributes:
                 'Interface declaration', 'Synchronized statement', 'Throw statement', 'Switch statement', 'Catch clause',
                 'Try statement', 'Annotation declaration', 'For statement', 'Enum declaration', 'Enum signature', 'Assert statement',
                 'Static initializer', 'If statement', 'Method declaration', 'Continue statement', 'Import', 'Blank']
-                for column in list(df.columns):
+                for column in columns:
                     for constructor in all_possible_constructors:
                         if constructor in column:
                             self.ignored_columns.append(column)
@@ -226,7 +232,7 @@ def get_projects_class_distribution(projects, normalized=True, drop_na=True, inc
             project_dataset_path = f"../../data/projects/{project_name}-training.csv"
         else:
             project_dataset_path = f"../../data/projects/{project_name}-test.csv"
-        df = pd.read_csv(project_dataset_path)
+        df = read_dataset(project_dataset_path)
         results.append(get_project_class_distribution(df, project_name, normalized, drop_na))
     if include_overall:
             project_name = 'Overall'
@@ -234,7 +240,7 @@ def get_projects_class_distribution(projects, normalized=True, drop_na=True, inc
                 dataset_path = f"../../data/dataset-training.csv"
             else:
                 dataset_path = f"../../data/dataset-test.csv"
-            df = pd.read_csv(dataset_path)
+            df = read_dataset(dataset_path)
             results.append(get_project_class_distribution(df, project_name, normalized, drop_na))
     results = pd.concat(results, ignore_index=True)
     return results
@@ -277,7 +283,7 @@ def get_average_tree_depth(estimator, projects, non_features_columns):
         for project in projects:
             proj = project.replace("/", "__")
             proj_dataset = f"../../data/projects/{proj}-training.csv"
-            df_proj = pd.read_csv(proj_dataset)
+            df_proj = read_dataset(proj_dataset)
             df_clean = df_proj.dropna()
             if len(df_clean) >= 10:
                 y = df_clean["developerdecision"].copy()
@@ -409,6 +415,81 @@ def compare_models_medals(models, models_names, projects, non_features_columns):
 
     return results, all_results
 
+def read_file(file_path):
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path)
+    if file_path.endswith('.parquet'):
+        return pd.read_parquet(file_path)
+    return pd.read_feather(file_path)
+
+'''
+    Reads a dataset generated by the scripts, which can be stored in csv, parquet or feather files (see scripts/storage.py).
+    The file of the format in configs.STORAGE_FORMAT is used first.
+    In the parquet and feather formats the project files are partitions of the training/test files of the projects folder
+    (e.g., the rows of projects/owner__name-training.csv are in projects/training.parquet/project=owner%2Fname).
+    with_authors: the author columns saved by process_projects_dataset.py --sparse-authors in a npz file next to the project
+    file (see load_project_authors) are appended as dense columns, so the project file has the same columns in both cases.
+    Only callers that load the authors file themselves (e.g., evaluate_project, as a sparse matrix) use with_authors=False.
+'''
+def read_dataset(dataset_path, with_authors=True):
+    df = read_dataset_file(dataset_path)
+    project_authors = load_project_authors(dataset_path) if with_authors else None
+    if project_authors is not None:
+        df = set_project_authors(df, project_authors)
+    return df
+
+def read_dataset_file(dataset_path):
+    base_path = os.path.splitext(dataset_path)[0]
+    folder, file_name = os.path.split(base_path)
+    project, _, split = file_name.rpartition('-')
+    project = project.replace('__', '/')
+    formats = ['csv', 'parquet', 'feather']
+    for file_format in [configs.STORAGE_FORMAT] + [other for other in formats if other != configs.STORAGE_FORMAT]:
+        if os.path.isfile(f'{base_path}.{file_format}'):
+            return read_file(f'{base_path}.{file_format}')
+        partition_file = f"{folder}/{split}.{file_format}/project={urllib.parse.quote(project, safe='')}/part-0.{file_format}"
+        if os.path.exists(partition_file):
+            df = read_file(partition_file)
+            df['project'] = project
+            return df
+    return pd.read_csv(dataset_path)
+
+'''
+    Reads the author columns of a project file generated by process_projects_dataset.py --sparse-authors,
+    which are saved as a CSR matrix in a npz file next to the project file.
+    Returns None if the project file does not have an authors file (the author columns are in the csv file).
+'''
+def load_project_authors(project_dataset):
+    authors_file = project_dataset.replace('.csv', '-authors.npz')
+    if not os.path.exists(authors_file):
+        return None
+    arrays = np.load(authors_file)
+    matrix = csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']))
+    rows = pd.Series(np.arange(len(arrays['chunk_ids'])), index=arrays['chunk_ids'])
+    return matrix, rows, list(arrays['authors'])
+
+# author columns of the chunks (rows of the authors matrix in the order of chunk_ids)
+def get_chunks_authors_rows(chunk_ids, project_authors):
+    matrix, rows, authors = project_authors
+    return matrix[rows.loc[chunk_ids.astype('int64')].values]
+
+# appends the author columns of the chunks to the features, keeping the result as a sparse matrix
+def add_project_authors(X, chunk_ids, project_authors):
+    return hstack([csr_matrix(X.to_numpy(dtype=float)), get_chunks_authors_rows(chunk_ids, project_authors)], format='csr')
+
+# appends the author columns of the chunks to df as dense columns (int64, as the author columns read from a csv file)
+def set_project_authors(df, project_authors):
+    authors_rows = get_chunks_authors_rows(df['chunk_id'], project_authors)
+    df_authors = pd.DataFrame(authors_rows.toarray().astype(np.int64), index=df.index, columns=project_authors[2])
+    return pd.concat([df, df_authors], axis=1)
+
+# removes the given columns from the author columns
+def drop_project_authors(project_authors, columns):
+    matrix, rows, authors = project_authors
+    columns = set(columns)
+    kept = [index for index, author in enumerate(authors) if author not in columns]
+    return matrix[:, kept], rows, [authors[index] for index in kept]
+
 def replace_na_values(df):
     imp_constant = SimpleImputer(missing_values=np.nan, strategy='constant', fill_value=-1)
     df_constant = pd.DataFrame(imp_constant.fit_transform(df),
@@ -428,9 +509,11 @@ def evaluate_project(project, non_features_columns, algorithm, projects_data_pat
     project_dataset = f"{projects_data_path}/{project}-training.csv"
     if not training:
         project_dataset_test = f"{projects_data_path}/{project}-test.csv"
-        df_test = pd.read_csv(project_dataset_test)
+        df_test = read_dataset(project_dataset_test, with_authors=False)
+        project_authors_test = load_project_authors(project_dataset_test)
 
-    df = pd.read_csv(project_dataset)
+    df = read_dataset(project_dataset, with_authors=False)
+    project_authors = load_project_authors(project_dataset)
     if replace_na:
         df = replace_na_values(df)
     if drop_na:
@@ -442,8 +525,8 @@ def evaluate_project(project, non_features_columns, algorithm, projects_data_pat
     if ablation:
         if ablation_mode == 'add':
             chunk_attributes = IgnoreAttributes('all', project).ignored_columns
-            include_attributes = IgnoreAttributes(ablation_group, project).ignored_columns
-            ignored_attributes = list(set(chunk_attributes) - set(include_attributes))
+            include_attributes = IgnoreAttributes(ablation_group, project)
+            ignored_attributes = list(set(chunk_attributes) - set(include_attributes.ignored_columns))
         elif ablation_mode == 'file_only':
             chunk_attributes = IgnoreAttributes('all', project).ignored_columns
             merge_attributes = IgnoreAttributes('merge', project).ignored_columns
@@ -458,7 +541,12 @@ def evaluate_project(project, non_features_columns, algorithm, projects_data_pat
             ignored_attributes = list(set(file_attributes).union(set(merge_attributes)))
         else:
             ignored_attributes = IgnoreAttributes(ablation_group, project).ignored_columns
-        df_clean = df_clean.drop(columns=ignored_attributes)
+        # the ignored author columns of an authors file are removed from the authors matrix
+        df_clean = df_clean.drop(columns=[column for column in ignored_attributes if column in df_clean.columns])
+        if project_authors is not None:
+            project_authors = drop_project_authors(project_authors, ignored_attributes)
+            if not training:
+                project_authors_test = drop_project_authors(project_authors_test, ignored_attributes)
         # print(df_clean.columns)
         # print(ignored_attributes.ignored_columns)
     # print(len(df_clean.columns))
@@ -470,16 +558,23 @@ def evaluate_project(project, non_features_columns, algorithm, projects_data_pat
     conf_matrix = []
     if len(df_clean) >= 10:
         y_train = df_clean["developerdecision"].copy()
+        chunk_ids = df_clean['chunk_id']
         df_clean = df_clean.drop(columns=['developerdecision'])
         df_clean = df_clean.drop(columns=non_features_columns)
         features = list(df_clean.columns)
         X_train = df_clean[features]
+        if project_authors is not None:
+            X_train = add_project_authors(X_train, chunk_ids, project_authors)
 
         if not training:
             y = df_test_clean['developerdecision'].copy()
+            test_chunk_ids = df_test_clean['chunk_id']
             df_test_clean = df_test_clean.drop(columns=['developerdecision'])
             df_test_clean = df_test_clean.drop(columns=non_features_columns)
             X_test = df_test_clean[features]
+            if project_authors is not None:
+                # both files of a project have the same author columns
+                X_test = add_project_authors(X_test, test_chunk_ids, project_authors_test)
 
             algorithm.fit(X_train, y_train)
             y_pred = algorithm.predict(X_test)
@@ -706,7 +801,7 @@ def grid_search_all(projects, estimator, parameters, non_features_columns):
 def grid_search(project, estimator, parameters, non_features_columns):
     proj = project.replace("/", "__")
     proj_dataset = f"../../data/projects/{proj}-training.csv"
-    df_proj = pd.read_csv(proj_dataset)
+    df_proj = read_dataset(proj_dataset)
     df_clean = df_proj.dropna()
     # print(f"Length of df_clean: {len(df_clean)}")
     if len(df_clean) >= 10:
@@ -734,7 +829,7 @@ def get_validation_curve_all(projects, estimator, param_name, param_range, non_f
     for project in projects:
         proj = project.replace("/", "__")
         proj_dataset = f"../../data/projects/{proj}-training.csv"
-        df_proj = pd.read_csv(proj_dataset)
+        df_proj = read_dataset(proj_dataset)
         df_clean = df_proj.dropna()
         # print(f"Length of df_clean: {len(df_clean)}\n")
         if len(df_clean) >= 10:
@@ -781,7 +876,7 @@ def get_validation_curve_all(projects, estimator, param_name, param_range, non_f
 def plot_validation_curve(project, estimator, param_name, param_range, non_features_columns, ax):
     proj = project.replace("/", "__")
     proj_dataset = f"../../data/projects/{proj}-training.csv"
-    df_proj = pd.read_csv(proj_dataset)
+    df_proj = read_dataset(proj_dataset)
     df_clean = df_proj.dropna()
     if len(df_clean) >= 10:
         # majority_class = get_majority_class_percentage(df_clean, 'developerdecision')
@@ -848,7 +943,7 @@ def projects_feature_selection(projects, non_features_columns, algorithm, featur
     for project in projects:
         project = project.replace("/", "__")
         project_dataset = f"{configs.PROJECTS_DATA}/{project}-training.csv"
-        df = pd.read_csv(project_dataset)
+        df = read_dataset(project_dataset)
         df_clean = df.dropna()
         
         if len(df_clean) >= 10:
@@ -921,31 +1016,15 @@ def get_overall_feature_selection(df):
     result = pd.DataFrame(rows, columns=df.columns)
     return result
 
+# entropy, information gain: see information_theory.py
 def entropy(df, attrib, y_attrib):
-    data = df[[attrib, y_attrib]]
-    classes = data[y_attrib].value_counts()\
-        .reset_index(name='count')\
-        .rename(columns={"index": "class_name"})
-    total = classes['count'].sum()
-    classes['percentage'] = classes['count'] / total
-    classes['entropy'] = classes.apply(lambda row: \
-                             -1 * row['percentage'] * log2(row['percentage']), axis = 1)
-    return classes.sum()['entropy']
+    return information_theory.entropy(df[y_attrib])
 
 def information_gain(df, attrib, y_attrib):
-    data = df[[attrib, y_attrib]]
-    ent_initial = entropy(data, attrib, y_attrib)
-    data_split = data.groupby([attrib])\
-      .apply(lambda df_x: pd.Series({'percentage': df_x.shape[0] / data.shape[0],
-                                     'entropy': entropy(df_x, attrib, y_attrib)}))
-    data_split['weighted_entropy'] = data_split['percentage'] * data_split['entropy']
-    ent_final = data_split['weighted_entropy'].sum()
-    return ent_initial - ent_final
+    return information_theory.information_gain(df[y_attrib], df[attrib])
 
 def get_information_gain(y_attrib, attrib):
-    dict = {'attrib': attrib, 'y_attrib': y_attrib}
-    df = pd.DataFrame(dict)
-    return information_gain(df, 'attrib', 'y_attrib')
+    return information_theory.information_gain(y_attrib, attrib)
 
 '''
     Applies MDLP discretization to numeric values.
@@ -964,7 +1043,8 @@ def get_mdlp_discretization(X, y):
             not_numeric_features.append(numeric_feature)
     numeric_features_names = list(set(numeric_features_names) - set(not_numeric_features))
     numeric_features = [X_orig.columns.get_loc(col) for col in numeric_features_names] # columns indexes
-    discretizer = MDLP_Discretizer(features=numeric_features)
+    # the cut points are cached (see MDLP_Discretizer), so the analyses of the same training data reuse the fit
+    discretizer = MDLP_Discretizer(features=numeric_features, cache_path=configs.MDLP_CACHE_PATH)
     discretizer.fit(X, y)
     X_discretized = discretizer.transform(X)
     return pd.DataFrame(X_discretized, columns=X_orig.columns)
@@ -975,7 +1055,6 @@ def get_mdlp_discretization(X, y):
     if n is zero we dont select any feature
 '''
 def IGAR(n, X, y):
-    features = {}
     selected_features = []
     information_gains = []
     if n != 0:
@@ -984,10 +1063,8 @@ def IGAR(n, X, y):
         X_discretized = get_mdlp_discretization(X, y)
     else:
         X_discretized = X
-    for column in X_discretized.columns:
-        feature = X_discretized[column]
-        information_gain = get_information_gain(list(y), list(feature))
-        features[column] = information_gain
+    # information gains of all attributes at once (the classes are encoded once)
+    features = dict(zip(X_discretized.columns, information_theory.information_gains(X_discretized, y).tolist()))
 
     # order the attributes according to descending information gain
     for name, ig in sorted(features.items(), key=lambda x: x[1], reverse=True):
@@ -1028,7 +1105,7 @@ def IGAR_tuning(prediction_algorithm, projects, non_features_columns, min_n, max
         for project in projects:
             project = project.replace("/", "__")
             project_dataset = f"{configs.PROJECTS_DATA}/{project}-training.csv"
-            df = pd.read_csv(project_dataset)
+            df = read_dataset(project_dataset)
             df_clean = df.dropna()
             
             scores = {}
@@ -1167,7 +1244,7 @@ def get_attribute_selection_ranking(attributes_stats, method):
 '''
 def get_all_attributes_names(non_features_columns):
     project_dataset = f"{configs.DATA_PATH}/dataset-training.csv"
-    df = pd.read_csv(project_dataset)
+    df = read_dataset(project_dataset)
     df = df.drop(columns=['developerdecision'])
     df = df.drop(columns=non_features_columns)
     return list(df.columns)
@@ -1190,7 +1267,7 @@ def get_attributes_importance(projects, non_features_columns):
     for project in projects:
         project = project.replace("/", "__")
         project_dataset = f"{configs.PROJECTS_DATA}/{project}-training.csv"
-        df = pd.read_csv(project_dataset)
+        df = read_dataset(project_dataset)
         df_clean = df.dropna()
         
         if len(df_clean) >= 10:
@@ -1247,7 +1324,7 @@ def get_developers_attribute_importance(projects, non_features_columns):
     for project in projects:
         project = project.replace("/", "__")
         project_dataset = f"{configs.PROJECTS_DATA}/{project}-training.csv"
-        df = pd.read_csv(project_dataset)
+        df = read_dataset(project_dataset)
         df_clean = df.dropna()
         
         if len(df_clean) >= 10:
@@ -1308,7 +1385,7 @@ def get_constructs_attribute_importance(projects, non_features_columns):
     for project in projects:
         project = project.replace("/", "__")
         project_dataset = f"{configs.PROJECTS_DATA}/{project}-training.csv"
-        df = pd.read_csv(project_dataset)
+        df = read_dataset(project_dataset)
         df_clean = df.dropna()
         
         if len(df_clean) >= 10:
@@ -1375,7 +1452,7 @@ def get_constructs_information_gain(projects, non_features_columns):
     for project in projects:
         project = project.replace("/", "__")
         project_dataset = f"{configs.PROJECTS_DATA}/{project}-training.csv"
-        df = pd.read_csv(project_dataset)
+        df = read_dataset(project_dataset)
         df_clean = df.dropna()
         
         if len(df_clean) >= 10:
@@ -1501,7 +1578,7 @@ def get_rules_of_interest(threshold, lift, attribute, df_confidence, df_count):
 
 def get_discretized_selected_df(projects):
     dataset_path = f'{configs.DATA_PATH}/dataset-training_log2.csv'
-    df = pd.read_csv(dataset_path)
+    df = read_dataset(dataset_path)
     df_clean = df.dropna()
     used_project = []
     # filter only projects that were used in the experiment
@@ -1542,7 +1619,7 @@ def get_project_attributes_importance(project, non_features_columns):
     attributes = []
     project = project.replace("/", "__")
     project_dataset = f"{configs.PROJECTS_DATA}/{project}-training.csv"
-    df = pd.read_csv(project_dataset)
+    df = read_dataset(project_dataset)
     df_clean = df.dropna()
     
     if len(df_clean) >= 10:
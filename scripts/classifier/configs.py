@@ -1,3 +1,9 @@
+import os
+
 DATA_PATH = '../../data'
 PROJECTS_DATA = f'{DATA_PATH}/projects'
+# cut points of the MDLP fits (see MDLP.py)
+MDLP_CACHE_PATH = f'{DATA_PATH}/mdlp_cache'
 
+# format of the datasets generated by the scripts: csv, parquet or feather (see scripts/storage.py)
+STORAGE_FORMAT = os.environ.get('CONFLICTS_STORAGE_FORMAT', 'csv')
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+'''
+    Entropy and information gain kernels shared by the MDLP discretization (MDLP.py), the IGAR feature selection
+    (classifier_utils.py) and the exploratory analysis (exploratory_analysis/utils.py).
+    The labels are encoded as integers once (encode) and all measures are computed from class counts and contingency
+    tables built with np.bincount, for many features at once. Entropies are in bits.
+    Missing values have code -1: examples with a missing class are not counted, and examples with a missing feature value
+    are counted in the dataset size but in no partition (as pandas groupby does).
+'''
+
+def encode(values):
+    '''
+    Integer codes of the values (indexes of the unique values in ascending order), -1 for missing values
+    :return: codes and unique values
+    '''
+    codes, uniques = pd.factorize(pd.Series(values) if isinstance(values, list) else values, sort=True)
+    return codes.astype(np.int64), uniques
+
+def encode_columns(X):
+    '''
+    Integer codes of each column of X (dataframe or 2D array)
+    :return: matrix of codes (examples x columns) and number of unique values of each column
+    '''
+    columns = [X.iloc[:, i] for i in range(X.shape[1])] if isinstance(X, pd.DataFrame) else list(np.asarray(X).T)
+    codes = np.empty((X.shape[0], len(columns)), dtype=np.int64)
+    n_values = np.zeros(len(columns), dtype=np.int64)
+    for i, column in enumerate(columns):
+        codes[:, i], uniques = encode(column)
+        n_values[i] = len(uniques)
+    return codes, n_values
+
+def class_counts(class_codes, n_classes):
+    '''
+    Number of examples of each class (missing classes are ignored)
+    '''
+    return np.bincount(class_codes[class_codes >= 0], minlength=n_classes)
+
+def entropies(counts):
+    '''
+    Entropy of each row of class counts (the last axis has the classes), 0 for rows without examples
+    '''
+    counts = np.asarray(counts)
+    N = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proportions = counts / N
+        terms = np.where(counts > 0, proportions * np.log2(proportions), 0)
+    return -terms.sum(axis=-1)
+
+def entropy(labels):
+    '''
+    Entropy of a set of labels
+    '''
+    class_codes, classes = encode(labels)
+    return float(entropies(class_counts(class_codes, len(classes))))
+
+def contingency_tables(feature_codes, n_values, class_codes, n_classes):
+    '''
+    Contingency tables of many features with the class, built with a single np.bincount: the tables of all features
+    are stacked, so the rows of feature i are offsets[i]:offsets[i + 1]
+    :param feature_codes: matrix of codes of the features (examples x features)
+    :param n_values: number of unique values of each feature
+    :return: tables (values of all features x classes), offsets of the features and number of examples of each value
+        (including the examples with a missing class)
+    '''
+    n_values = np.asarray(n_values, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(n_values)])
+    valid = feature_codes >= 0
+    rows = (feature_codes + offsets[:-1])[valid]
+    classes = np.broadcast_to(class_codes[:, np.newaxis], feature_codes.shape)[valid]
+    labeled = classes >= 0
+    tables = np.bincount(rows[labeled] * n_classes + classes[labeled], minlength=offsets[-1] * n_classes)
+    value_sizes = np.bincount(rows, minlength=offsets[-1])
+    return tables.reshape(offsets[-1], n_classes), offsets, value_sizes
+
+def conditional_entropies(feature_codes, n_values, class_codes, n_classes):
+    '''
+    Entropy of the class given each feature: the entropies of the partitions of the feature values weighted by their size
+    '''
+    tables, offsets, value_sizes = contingency_tables(feature_codes, n_values, class_codes, n_classes)
+    weighted = value_sizes / len(class_codes) * entropies(tables)
+    feature_of_value = np.repeat(np.arange(len(n_values)), n_values)
+    return np.bincount(feature_of_value, weights=weighted, minlength=len(n_values))
+
+def information_gains(X, y):
+    '''
+    Information gain of each column of X (dataframe or 2D array of discrete values) about the classes y
+    :return: array with the information gain of each column
+    '''
+    class_codes, classes = encode(y)
+    feature_codes, n_values = encode_columns(X)
+    class_entropy = entropies(class_counts(class_codes, len(classes)))
+    return class_entropy - conditional_entropies(feature_codes, n_values, class_codes, len(classes))
+
+def information_gain(y, feature):
+    '''
+    Information gain of a feature (discrete values) about the classes y
+    '''
+    return float(information_gains(pd.DataFrame({'feature': feature}), y)[0])
+
+def value_entropies(feature, y):
+    '''
+    Entropy of the classes y for each value of a feature
+    :return: Series indexed by the values of the feature (missing values are ignored)
+    '''
+    feature_codes, values = encode(feature)
+    class_codes, classes = encode(y)
+    tables, _, _ = contingency_tables(feature_codes.reshape(-1, 1), [len(values)], class_codes, len(classes))
+    return pd.Series(entropies(tables), index=values)
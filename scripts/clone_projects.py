@@ -1,36 +1,129 @@
 # -*- coding: UTF-8 -*-
 import os
 import time
+import shutil
+import argparse
 import subprocess
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 import configs
+import shard
+import storage
+import telemetry
 
+'''
+    Clones each project of the dataset once, using a bounded pool of parallel clones.
+    --partial uses partial clones (--filter=blob:none), so file contents are only downloaded when they are checked out.
+    --no-checkout does not populate the working tree (the collectors checkout the commits they need).
+    --alternates clones the projects that have the same name as another project (usually forks) using the
+    objects of the first one (git alternates), so the shared history is stored only once. Since projects with the
+    same name are not always related, a clone only keeps the alternates if it has a root commit of its reference.
+'''
+def get_projects(df):
+    projects = df.groupby('project', sort=False, observed=True).agg(url=('url', 'first'), project_name=('project_name', 'first'), chunks=('project', 'size'))
+    return projects.reset_index()
 
-def clone_projects():
+def get_folder(project):
+    return os.path.join(configs.REPOS_PATH, project)
+
+def get_clone_command(url, folder, arguments, reference=None):
+    options = ['git clone']
+    if arguments.partial:
+        options.append('--filter=blob:none')
+    if arguments.no_checkout:
+        options.append('--no-checkout')
+    if reference is not None:
+        options.append(f'--reference-if-able {reference}')
+    options.extend([url, folder])
+    return ' '.join(options)
+
+def clone_project(project, url, arguments, reference=None):
+    # the commands of each clone (in its thread) are traced with its project
+    telemetry.set_context(project)
+    folder = get_folder(project)
+    # clones into a temporary folder, so an interrupted clone is not taken as a cloned project
+    partial_folder = f'{folder}.cloning'
+    if os.path.exists(partial_folder):
+        shutil.rmtree(partial_folder)
+    os.makedirs(os.path.dirname(partial_folder), exist_ok=True)
+    start = time.time()
+    if execute_command(get_clone_command(url, partial_folder, arguments, reference)):
+        if reference is not None and uses_alternates(partial_folder) and len(get_root_commits(partial_folder) & get_root_commits(reference)) == 0:
+            print(f'{project} does not share history with {reference}, its objects are copied from the reference.', flush=True)
+            dissociate(partial_folder)
+        os.rename(partial_folder, folder)
+        print('{} ### Cloned {} in {:.1f} seconds.'.format(time.ctime(), project, time.time() - start), flush=True)
+        return True
+    if os.path.exists(partial_folder):
+        shutil.rmtree(partial_folder)
+    return False
+
+def uses_alternates(folder):
+    return os.path.exists(os.path.join(folder, '.git', 'objects', 'info', 'alternates'))
+
+# commits without parents of a repository, which identify its history (forks have the root commits of their parent)
+def get_root_commits(folder):
+    output = get_command_output(f'git -C {folder} rev-list --max-parents=0 --all')
+    return set() if output is None else set(output.split())
+
+# copies the objects used from the reference and removes the alternates (as git clone --dissociate does)
+def dissociate(folder):
+    if execute_command(f'git -C {folder} repack -a -d'):
+        os.remove(os.path.join(folder, '.git', 'objects', 'info', 'alternates'))
+
+def clone_all(projects, arguments, references={}):
+    results = []
+    with ThreadPoolExecutor(max_workers=arguments.jobs) as executor:
+        futures = [executor.submit(clone_project, project['project'], project['url'], arguments, references.get(project['project']))
+            for _, project in projects.iterrows()]
+        for future in futures:
+            results.append(future.result())
+    return sum(results)
+
+def clone_projects(arguments):
     if(not os.path.exists(configs.REPOS_PATH)):
         os.mkdir(configs.REPOS_PATH)
-    current_index = 0
-    df = pd.read_csv(configs.INITIAL_DATASET_PATH, header=0)
-    print('Starting the clone process...')
-    for index, row in df.iterrows():
-        current_index +=1
-        status = (current_index / len(df)) * 100
-        print('{} ### {:.1f}% of rows processed. Processing project: {}'.format(time.ctime(), status, row['project']))
-        folder = os.path.join(configs.REPOS_PATH, row['project'])
-        if(not os.path.exists(folder)):
-            command = 'git clone {} {}'.format(row['url'], folder)
-            execute_command(command)
+    df = shard.filter_dataset(storage.read(configs.INITIAL_DATASET_PATH, columns=['project', 'url', 'project_name']), arguments)
+    projects = get_projects(df)
+    missing = projects[[not os.path.exists(get_folder(project)) for project in projects['project']]]
+    print('Starting the clone process... {} projects, {} already cloned.'.format(len(projects), len(projects) - len(missing)), flush=True)
+
+    references = {}
+    if arguments.alternates:
+        # the project with more chunks of each name is cloned first and used as reference for the others
+        leaders = projects.sort_values('chunks', ascending=False, kind='stable').drop_duplicates('project_name')
+        for _, project in projects.iterrows():
+            leader = leaders[leaders['project_name'] == project['project_name']].iloc[0]['project']
+            if leader != project['project']:
+                references[project['project']] = os.path.abspath(get_folder(leader))
+        first_round = missing[~missing['project'].isin(references)]
+        second_round = missing[missing['project'].isin(references)]
+        cloned = clone_all(first_round, arguments) + clone_all(second_round, arguments, references)
+    else:
+        cloned = clone_all(missing, arguments)
+    print('{} ### Finished. {} of {} projects cloned.'.format(time.ctime(), cloned, len(missing)), flush=True)
+    telemetry.metrics.export()
 
 def execute_command(command):
-    executed = False
+    return get_command_output(command) is not None
+
+# output of a command, None if it fails
+@telemetry.timed('git')
+def get_command_output(command):
     try:
         my_env = os.environ.copy()
-        result = subprocess.check_output([command], stderr=subprocess.STDOUT, text=True, shell=True, env=my_env)
-        executed = True
+        return subprocess.check_output([command], stderr=subprocess.STDOUT, text=True, shell=True, env=my_env)
     except subprocess.CalledProcessError as e:
         print("command '{}' return with error (code {}): {}".format(e.cmd, e.returncode, e.output), flush=True)
-    return executed
-    
+        return None
+
+def get_arguments():
+    parser = argparse.ArgumentParser(description='Clones the projects of the initial dataset into the repos folder.')
+    parser.add_argument('--jobs', type=int, default=4, help='maximum number of parallel clones.')
+    parser.add_argument('--partial', action='store_true', help='partial clones (--filter=blob:none): file contents are downloaded on demand.')
+    parser.add_argument('--no-checkout', action='store_true', help='does not checkout the working tree after cloning.')
+    parser.add_argument('--alternates', action='store_true', help='projects with the same name (forks) share the objects of the first one cloned, if they have the same root commit.')
+    shard.add_shard_arguments(parser)
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    clone_projects()
-    
\ No newline at end of file
+    clone_projects(get_arguments())
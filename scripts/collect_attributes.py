@@ -1,12 +1,12 @@
-import pandas as pd
 import configs
 import subprocess
 import os
-import time
-import sys
 import pathlib
-import sys
 from datetime import datetime
+from journal import Journal, get_resume_arguments
+import shard
+import telemetry
+import storage
 
 # Keywords count in commit messages: fix, bug, feature, improve, document, refactor, update, add, remove, use, delete, and change.
 def get_keywords_frequency(parent1, parent2, base_commit):
@@ -99,6 +99,7 @@ def get_conclusion_delay(parent1SHA, parent2SHA):
     
 
 
+@telemetry.timed('git')
 def execute_command(command):
     try:
         my_env = os.environ.copy()
@@ -123,89 +124,59 @@ def check_commits_consistency(commits):
             return False
     return True
 
-def write_failed_chunks(failed):
-    with open('failed_chunks.txt', 'w') as file:
-        for failed_chunk in failed:
-            file.write(f"{failed_chunk[0]}:{failed_chunk[1]}\n")
-
-def load_existent_data():
-    df = pd.read_csv(f'{configs.DATA_PATH}/collected_attributes1.csv', encoding="utf-8")
-    collected_commits = set()
-    extracted_data = []
-    failed_chunks = []
-    for index, row in df.iterrows():
-        extracted_data.append(row.tolist())
-        collected_commits.add(f"{row['project']}-{row['sha']}")
-
-    with open('failed_chunks.txt', 'r') as file:
-        for line in file:
-            if line != '':
-                chunk_id, failure = line.strip().split(':')
-                failed_chunks.append([chunk_id, failure])
-    return collected_commits, extracted_data, failed_chunks
-
-def main(arguments):
-    chunk_start = 0
-    collected_commits = set()
-    extracted_data = []
-    failed_chunks = []
-
-    if len(arguments) == 2:
-        try:
-            chunk_start = int(arguments[1])
-            collected_commits, extracted_data, failed_chunks = load_existent_data()
-        except:
-            print('Invalid arguments. The only argument accepted is the chunk id to start the process from.')
-            exit()
-
-    df = pd.read_csv(configs.INITIAL_DATASET_PATH, encoding="utf-8")
+def main():
+    arguments = get_resume_arguments('Collects attributes from the merge commits of the conflicting chunks.', sharded=True)
+    # progress is checkpointed in a journal, so an interrupted collection resumes from where it stopped
+    journal = Journal(shard.get_journal_name('collect_attributes', arguments), arguments.restart)
+    df = shard.filter_dataset(storage.read(configs.INITIAL_DATASET_PATH), arguments)
     starting_folder = pathlib.Path(__file__).parent.absolute()
-    print(f'Starting the collection process for {len(df)} chunks... Starting from chunk_id {chunk_start}')
-    current_index = len(extracted_data)
+    print(f'Starting the collection process for {len(df)} chunks... {len(journal.records)} items already collected in the journal {journal.path}')
     columns = ['chunk_id', 'sha', 'project', 'left_lines_added', 'left_lines_removed', 'right_lines_added', 'right_lines_removed', 'conclusion_delay']
     columns.extend(['keyword_fix', 'keyword_bug', 'keyword_feature', 'keyword_improve', 'keyword_document', 'keyword_refactor', 'keyword_update'])
     columns.extend(['keyword_add', 'keyword_remove', 'keyword_use', 'keyword_delete', 'keyword_change'])
-    save_every = 50
 
+    progress = telemetry.Progress(len(df))
     for index, row in df.iterrows():
-        current_index +=1
-        status = (current_index / len(df)) * 100
-        if row['chunk_id'] > chunk_start:
-            print(f"{time.ctime()} ### {status:.1f}% of chunks processed. Processing chunk {row['chunk_id']} for project: {row['project']}", flush=True)
-            commit_index = f"{row['project']}-{row['sha']}"
-            if(commit_index not in collected_commits): # since these attributes are related to the commit and not to the chunk, we only collect it if the merge commit (sha) is not already collected
-                data = []
-                data.append(row['chunk_id'])
-                data.append(row['sha'])
-                data.append(row['project'])
-                project_folder = f"{configs.REPOS_PATH}/{row['project']}"
-                if os.path.exists(project_folder):
-                    os.chdir(project_folder)
-                    if not check_commits_consistency([row['sha'], row['leftsha'], row['rightsha'], row['basesha']]):
-                        failed_chunks.append([row['chunk_id'], 'BAD_COMMIT'])
-                    else:
-                        config_limits()
-                        left_insertions, left_deletions = get_number_changed_lines(row['sha'], row['leftsha'])
-                        right_insertions, right_deletions = get_number_changed_lines(row['sha'], row['rightsha'])
-                        # print(f'left insertions: {left_insertions}  / left deletions: {left_deletions} / right insertions: {right_insertions}  /right deletions: {right_deletions}')
-                        conclusion_delay = get_conclusion_delay(row['leftsha'], row['rightsha'])
-                        keywords_frequency = get_keywords_frequency(row['leftsha'], row['rightsha'], row['basesha'])
-                        # print(f'conclusion delay: {conclusion_delay} | keywords frequency: {keywords_frequency}')
-                        data.extend([left_insertions, left_deletions, right_insertions, right_deletions,conclusion_delay])
-                        for keyword, frequency in keywords_frequency.items():
-                            data.append(frequency)
-                        collected_commits.add(commit_index)
-                        extracted_data.append(data)
-                    os.chdir(starting_folder)
+        commit_index = f"{row['project']}-{row['sha']}"
+        # since these attributes are related to the commit and not to the chunk, we only collect it if the merge commit (sha) is not already collected
+        if not journal.is_done(commit_index) and journal.should_process(row['chunk_id'], arguments.retry):
+            telemetry.set_context(row['project'], row['chunk_id'])
+            data = []
+            data.append(row['chunk_id'])
+            data.append(row['sha'])
+            data.append(row['project'])
+            project_folder = f"{configs.REPOS_PATH}/{row['project']}"
+            if os.path.exists(project_folder):
+                os.chdir(project_folder)
+                if not check_commits_consistency([row['sha'], row['leftsha'], row['rightsha'], row['basesha']]):
+                    journal.add_failure(row['chunk_id'], 'BAD_COMMIT')
                 else:
-                    failed_chunks.append([row['chunk_id'], 'REPO_NOT_AVAILABLE'])
-            if current_index % save_every == 0:
-                print('Saving data collected so far...')
-                pd.DataFrame(extracted_data, columns = columns).to_csv(f'{configs.DATA_PATH}/collected_attributes1.csv', index=False)
-                write_failed_chunks(failed_chunks)
+                    config_limits()
+                    left_insertions, left_deletions = get_number_changed_lines(row['sha'], row['leftsha'])
+                    right_insertions, right_deletions = get_number_changed_lines(row['sha'], row['rightsha'])
+                    # print(f'left insertions: {left_insertions}  / left deletions: {left_deletions} / right insertions: {right_insertions}  /right deletions: {right_deletions}')
+                    conclusion_delay = get_conclusion_delay(row['leftsha'], row['rightsha'])
+                    keywords_frequency = get_keywords_frequency(row['leftsha'], row['rightsha'], row['basesha'])
+                    # print(f'conclusion delay: {conclusion_delay} | keywords frequency: {keywords_frequency}')
+                    data.extend([left_insertions, left_deletions, right_insertions, right_deletions,conclusion_delay])
+                    for keyword, frequency in keywords_frequency.items():
+                        data.append(frequency)
+                    journal.add_done(commit_index, data)
+                    journal.clear(row['chunk_id'])
+                os.chdir(starting_folder)
+            else:
+                journal.add_failure(row['chunk_id'], 'REPO_NOT_AVAILABLE')
+            progress.update(row['project'])
+        else:
+            progress.skip()
+    progress.finish()
     os.chdir(starting_folder)
+    journal.close()
+    journal.print_summary()
 
-    pd.DataFrame(extracted_data, columns = columns).to_csv(f'{configs.DATA_PATH}/collected_attributes1.csv', index=False)
-    write_failed_chunks(failed_chunks)
+    print('Exporting collected data...')
+    journal.compact(columns, shard.get_output_path(f'{configs.DATA_PATH}/collected_attributes1.csv', arguments))
+    journal.write_failures(shard.get_output_path('failed_chunks.txt', arguments))
+    shard.write_done_marker('collect_attributes.py', arguments, len(df), journal)
 
-main(sys.argv)
\ No newline at end of file
+main()
\ No newline at end of file
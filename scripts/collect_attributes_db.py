@@ -10,6 +10,10 @@ import pathlib
 import os
 import subprocess
 import glob
+from journal import Journal, get_resume_arguments
+import shard
+import telemetry
+import storage
 
 def getCyclomaticComplexity(lines):
     ifs = whiles = fors = cases = logicalOperators = 0
@@ -30,9 +34,6 @@ def getCyclomaticComplexity(lines):
 def getFileSize(lines):
     return len(lines)
 
-def getChunkContent(chunkId):
-    return database.get_conflict(chunkId)
-
 # chunk size relative to the file size
 def getChunkRelativeSize(chunkSize, fileSize):
     if fileSize!= 0:
@@ -80,6 +81,7 @@ def merge(left_sha, right_sha, path):
         return True
     return False
 
+@telemetry.timed('git')
 def execute_command(command, path):
     try:
         my_env = os.environ.copy()
@@ -131,19 +133,14 @@ def get_chunk_relative_size(chunk_side_code, other_side_chunk_code):
         return len(chunk_side_code)/(len(chunk_side_code)+len(other_side_chunk_code))
     return 0
 
-def write_failed_chunks(failed):
-    with open(f'{configs.LOGS_PATH}/collect_attributes_db_failed.txt', 'w') as file:
-        for failed_chunk in failed:
-            file.write(f"{failed_chunk[0]}:{failed_chunk[1]}\n")
-
-def write_file(collected_data, project_df, failed_chunks):
-    write_failed_chunks(failed_chunks)
+def write_file(journal, project_df, arguments):
+    journal.write_failures(shard.get_output_path(f'{configs.LOGS_PATH}/collect_attributes_db_failed.txt', arguments))
     columns = ['chunk_id','leftCC', 'rightCC', 'fileCC', 'fileSize', 'chunkAbsSize', 'chunkRelSize', 'chunkPosition']
     columns.extend(["chunk_left_abs_size", "chunk_left_rel_size", "chunk_right_abs_size", "chunk_right_rel_size"])
-    df2 = pd.DataFrame(collected_data, columns = columns)
+    df2 = pd.DataFrame(journal.get_data(), columns = columns)
     result_df = pd.merge(project_df,df2, on='chunk_id')
-    result_file = f"{configs.DATA_PATH}/collected_attributes2.csv"
-    result_df.to_csv(result_file, index=False)   
+    result_file = shard.get_output_path(f"{configs.DATA_PATH}/collected_attributes2.csv", arguments)
+    storage.write(result_df, result_file)
 
 def delete_locks(path):
     fileList = glob.glob(f'{path}/**/.git/index.lock', recursive=True)
@@ -157,37 +154,47 @@ def delete_locks(path):
             pass
     return all_locks_deleted
 
-df = pd.read_csv(configs.INITIAL_DATASET_PATH)
 repos = {}
-data = []
-failed_chunks = []
+# progress is checkpointed in a journal, so an interrupted collection resumes from where it stopped
+arguments = get_resume_arguments('Collects attributes from the conflicting chunks using the conflicts database.', sharded=True)
+journal = Journal(shard.get_journal_name('collect_attributes_db', arguments), arguments.restart)
+df = shard.filter_dataset(storage.read(configs.INITIAL_DATASET_PATH), arguments)
 start_time = time.time()
-counter = 0
-chunk_count = 0
-print_every = 20
+progress = telemetry.Progress(len(df))
 
 starting_folder = pathlib.Path(__file__).parent.absolute()
 print("Processing start at %s" % (datetime.datetime.now()))
-grouped_df = df.groupby('project')
-if delete_locks(configs.REPOS_PATH):
+grouped_df = df.groupby('project', observed=True)
+# sharded workers only delete the locks of their own repos, since other workers may be using the same repos folder
+if arguments.shard is None:
+    locks_deleted = delete_locks(configs.REPOS_PATH)
+else:
+    locks_deleted = all([delete_locks(f'{configs.REPOS_PATH}/{project}') for project in df['project'].unique()])
+if locks_deleted:
     for group_name, df_group in grouped_df:
+        pending_chunks = [journal.should_process(chunk_id, arguments.retry) for chunk_id in df_group['chunk_id']]
+        progress.skip(len(df_group) - sum(pending_chunks))
+        df_group = df_group[pending_chunks]
+        if len(df_group) == 0:
+            continue
         print(f"{format(datetime.datetime.now())} ### Processing project {group_name}.", flush=True)
+        telemetry.set_context(group_name)
+        chunks_bundle = database.get_chunk_bundle(df_group['chunk_id']) # positions and contents of all project chunks in one query
         for index, row in df_group.iterrows():
-            chunk_count+=1
+            telemetry.set_context(group_name, row['chunk_id'])
             project_folder = f"{configs.REPOS_PATH}/{row['project']}"
-            print(f"{format(datetime.datetime.now())} ### Processing chunk {row['chunk_id']} from project {group_name}.", flush=True)
             if os.path.exists(project_folder):
                 row2 = []
                 file_path = row['path'].replace(row['project']+'/', '', 1)
                 file_path = f"{project_folder}/{file_path}"
                 # os.chdir(project_folder)
                 if merge(row['leftsha'], row['rightsha'], project_folder):
-                    beginLine, endLine = database.get_conflict_position(row['chunk_id'])
+                    beginLine, endLine = chunks_bundle.get_conflict_position(row['chunk_id'])
                     sha = row['sha']
                     repoName = row['project']
                     fileContent = get_file_content(file_path)
                     if fileContent != []:
-                        chunkContent = getChunkContent(row['chunk_id'])
+                        chunkContent = chunks_bundle.get_conflict(row['chunk_id'])
                         fileSize = getFileSize(fileContent)
                         leftChunk = getLeftChunkCode(chunkContent)
                         rightChunk = getRightChunkCode(chunkContent)
@@ -203,39 +210,34 @@ if delete_locks(configs.REPOS_PATH):
                         right_chunk_absolute_size = len(rightChunk)
                         right_chunk_relative_size = get_chunk_relative_size(rightChunk, leftChunk)
 
-                        percentage = chunk_count/df.size
                         if chunkRelSize <= 1:
                             row2.append(row['chunk_id'])
                             row2.extend([leftCC, rightCC, fileCC, fileSize, chunkAbsSize, chunkRelSize, chunkPosition])
                             row2.extend([left_chunk_absolute_size, left_chunk_relative_size])
                             row2.extend([right_chunk_absolute_size, right_chunk_relative_size])
                         else:
-                            failed_chunks.append([row['chunk_id'], 'INCOSISTENT_MERGE_REPLAY'])
+                            journal.add_failure(row['chunk_id'], 'INCOSISTENT_MERGE_REPLAY')
                     else:
-                        failed_chunks.append([row['chunk_id'], 'INVALID_FILE'])
+                        journal.add_failure(row['chunk_id'], 'INVALID_FILE')
                     
                     #print('{} --- {:.2f}% done... Requests remaining: {}'.format(datetime.datetime.now(),percentage, requestsRemaining), end="\r")
                     # print("chunk_id: %d project: %s LeftCC: %d  RightCC: %d  FileCC: %d Chunk Absolute size: %d  Relative size: %.2f   fileSize: %.2f   #Position: %d  "% (row['chunk_id'], row['project'], leftCC, rightCC, fileCC, chunkAbsSize, chunkRelSize, fileSize, chunkPosition), flush=True)
                 else:
-                    failed_chunks.append([row['chunk_id'], 'CANT_MERGE'])
-                if(counter >= print_every):
-                    size = len(df)
-                    percentage = (chunk_count/size)*100
-                    intermediary_time = time.time() - start_time
-                    estimated = ((intermediary_time * 100)/percentage)/60/60
-                    print('{} --- {:.2f}% done... estimated time to finish: {:.2f} hours. {} of {} rows processed.'.format(datetime.datetime.now(),percentage, estimated, chunk_count, size), flush=True)
-                    counter = 0
-                counter = counter+1
+                    journal.add_failure(row['chunk_id'], 'CANT_MERGE')
                 if len(row2) > 0:
-                    data.append(row2)
+                    journal.add_done(row['chunk_id'], row2)
             else:
-                failed_chunks.append([row['chunk_id'], 'REPO_NOT_AVAILABLE'])
+                journal.add_failure(row['chunk_id'], 'REPO_NOT_AVAILABLE')
             os.chdir(starting_folder)
-        write_file(data, df, failed_chunks)
+            progress.update(group_name)
+progress.finish()
 
 
 elapsed_time = time.time() - start_time
 
 print()
 print("Processed in %d seconds. Exporting csv..." % (elapsed_time))
-write_file(data, df, failed_chunks)
+journal.close()
+journal.print_summary()
+write_file(journal, df, arguments)
+shard.write_done_marker('collect_attributes_db.py', arguments, len(df), journal)
@@ -1,13 +1,16 @@
-import pandas as pd
 import configs
 import subprocess
 import os
-import time
 import sys
 import pathlib
 from datetime import datetime
 import re
 import blame_parser
+from journal import Journal, get_resume_arguments
+import shard
+import telemetry
+import authors_table
+import storage
 
 starting_folder = ''
 
@@ -136,6 +139,7 @@ def get_empty_chunk_authors(merge_base_sha, line_start, line_end, file_path, pat
 
     return authors
 
+@telemetry.timed('git')
 def execute_command(command, path):
     try:
         my_env = os.environ.copy()
@@ -149,17 +153,19 @@ def execute_command(command, path):
     return ''
 
 def main():
-    df = pd.read_csv(configs.INITIAL_DATASET_PATH)
+    arguments = get_resume_arguments('Extracts the authors that contributed to each conflicting chunk.', sharded=True)
+    # progress is checkpointed in a journal, so an interrupted collection resumes from where it stopped
+    journal = Journal(shard.get_journal_name('collect_chunk_authors', arguments), arguments.restart)
+    df = shard.filter_dataset(storage.read(configs.INITIAL_DATASET_PATH), arguments)
     global starting_folder
     starting_folder = pathlib.Path(__file__).parent.absolute()
-    data = []
     columns = ["chunk_id", "left_size", "right_size", "authors_left", "authors_right"]
-    current_index = 0
-    save_every = 50
+    progress = telemetry.Progress(len(df))
     for index, row in df.iterrows():
-        current_index +=1
-        status = (current_index / len(df)) * 100
-        print(f"{time.ctime()} ### {status:.1f}% of chunks processed. Processing chunk {row['chunk_id']} for project: {row['project']}", flush=True)
+        if not journal.should_process(row['chunk_id'], arguments.retry):
+            progress.skip()
+            continue
+        telemetry.set_context(row['project'], row['chunk_id'])
         left_sha = row['leftsha']
         right_sha = row['rightsha']
         project = row['project']
@@ -180,10 +186,20 @@ def main():
                 left_size = line_separator - line_start - 1
                 right_size = line_end - line_separator - 1
                 authors_left_dict, authors_right_dict = get_chunks_author(file_path, line_start, line_end, line_separator, merge_base, project_folder)
-                data.append([row['chunk_id'], left_size, right_size, authors_left_dict, authors_right_dict])
+                journal.add_done(row['chunk_id'], [row['chunk_id'], left_size, right_size, authors_left_dict, authors_right_dict])
                 # input()
-        if current_index % save_every == 0:
-            pd.DataFrame(data, columns=columns).to_csv(f"{configs.DATA_PATH}/chunk_authors.csv", index=False)        
-    pd.DataFrame(data, columns=columns).to_csv(f"{configs.DATA_PATH}/chunk_authors.csv", index=False)
+            else:
+                journal.add_failure(row['chunk_id'], 'CANT_MERGE')
+        else:
+            journal.add_failure(row['chunk_id'], 'REPO_NOT_AVAILABLE')
+        progress.update(project)
+    progress.finish()
+    journal.close()
+    journal.print_summary()
+    journal.compact_csv(columns, shard.get_output_path(f"{configs.DATA_PATH}/chunk_authors.csv", arguments))
+    # the journal has the authors as dicts, so the long format table is built without parsing the csv again
+    authors_table.save(authors_table.from_records(journal.get_data()), shard.get_output_path(authors_table.PARQUET_PATH, arguments))
+    journal.write_failures(shard.get_output_path(f"{configs.LOGS_PATH}/collect_chunk_authors_failed.txt", arguments))
+    shard.write_done_marker('collect_chunk_authors.py', arguments, len(df), journal)
 
 main()
\ No newline at end of file
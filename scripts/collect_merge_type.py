@@ -2,10 +2,13 @@ import pandas as pd
 import configs
 import subprocess
 import os
-import time
 import re
+import incremental
+import telemetry
+import storage
 
 
+@telemetry.timed('git')
 def execute_command(command, path):
     try:
         my_env = os.environ.copy()
@@ -21,21 +24,23 @@ def get_commit_message(commit_SHA, path):
     command = f'git show -s --format=%B {commit_SHA}'
     return execute_command(command, path).strip()
 
-def write_failed_chunks(failed):
-    with open(f'{configs.LOGS_PATH}/merge_types_failed.txt', 'w') as file:
+def write_failed_chunks(failed, mode='w'):
+    with open(f'{configs.LOGS_PATH}/merge_types_failed.txt', mode) as file:
         for failed_chunk in failed:
             file.write(f"{failed_chunk[0]}:{failed_chunk[1]}\n")
 
 def main():
-    df = pd.read_csv(f"{configs.DATA_PATH}/macTool_output.csv")
+    arguments = incremental.get_arguments('Extracts the merge commit message and the multiple developers indicator of each chunk.')
+    output_path = f"{configs.DATA_PATH}/merge_types_data.csv"
+    df = storage.read(f"{configs.DATA_PATH}/macTool_output.csv")
+    if arguments.incremental:
+        df = incremental.get_new_rows(df, output_path)
     data = []
     chunks_failed = []
-    current_index = 0
+    progress = telemetry.Progress(len(df))
     branch_merge_pattern = re.compile(r"[m|M]erge[d]?(.*)( [b|B]ranch)?(.*) ((into (.*)|onto (.*)|from (.*) to (.*)))", re.IGNORECASE)
     for index, row in df.iterrows():
-        current_index +=1
-        status = (current_index / len(df)) * 100
-        print(f"{time.ctime()} ### {status:.1f}% of chunks processed. Processing chunk {row['chunk_id']} for project: {row['project']}", flush=True)
+        telemetry.set_context(row['project'], row['chunk_id'])
         chunk_id = row['chunk_id']
         project = row['project']
         project_folder = f"{configs.REPOS_PATH}/{project}"
@@ -55,9 +60,15 @@ def main():
                     data.append([chunk_id, row['project'], row['sha'][:10], devs1, devs2, merge_message[:255], has_multiple_devs_on_each_side])
         else:
             chunks_failed.append([chunk_id, "REPO_NOT_FOUND"])
-    
+        progress.update(project)
+    progress.finish()
+
     new_df = pd.DataFrame(data, columns=['chunk_id', 'project', 'merge_SHA', 'devs1', 'devs2', 'commit_message', 'has_multiple_devs_on_each_side'])
-    new_df.to_csv(f"{configs.DATA_PATH}/merge_types_data.csv", index=False)
-    write_failed_chunks(chunks_failed)
+    if arguments.incremental:
+        incremental.append_rows(new_df, output_path)
+        write_failed_chunks(chunks_failed, 'a')
+    else:
+        storage.write(new_df, output_path)
+        write_failed_chunks(chunks_failed)
 
 main()
\ No newline at end of file
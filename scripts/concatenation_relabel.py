@@ -1,10 +1,12 @@
 import database
-import pandas as pd
 import os
 import subprocess
-import time
 import configs
+from journal import Journal, get_resume_arguments
+import telemetry
+import storage
 
+@telemetry.timed('jvm')
 def execute_command(command):
     output = ''
     try:
@@ -69,20 +71,27 @@ def write_list_to_file(content, file_name):
 
 
 def main():
-    df = pd.read_csv(configs.INITIAL_DATASET_PATH, header=0)
+    arguments = get_resume_arguments('Relabels the chunks resolved with the Concatenation strategy.')
+    # progress is checkpointed in a journal, so an interrupted execution resumes from where it stopped
+    journal = Journal('concatenation_relabel', arguments.restart)
+    df = storage.read(configs.INITIAL_DATASET_PATH)
     count = 0
+    concatenation_chunks = df[df['developerdecision'] == 'Concatenation']['chunk_id']
+    pending_chunks = [chunk_id for chunk_id in concatenation_chunks if journal.should_process(chunk_id, arguments.retry)]
+    chunks_bundle = database.get_chunk_bundle(pending_chunks) # conflicts and solutions of all chunks in one query
     print('Analyzing...')
+    progress = telemetry.Progress(len(pending_chunks))
     for index, row in df.iterrows():
-        print(f"{time.ctime()} #### {(index/len(df) * 100):.2f}%")
-        if(row['developerdecision'] == 'Concatenation'):
+        if(row['developerdecision'] == 'Concatenation' and journal.should_process(row['chunk_id'], arguments.retry)):
+            telemetry.set_context(row['project'], row['chunk_id'])
             count+=1
             chunk_id = row['chunk_id']
             # print(chunk_id)
-            conflict = database.get_conflict(chunk_id)
+            conflict = chunks_bundle.get_conflict(chunk_id)
             v1 = get_v1(conflict)
             v2 = get_v2(conflict)
             context_before, context_after = get_context(conflict)
-            solution = database.get_solution(chunk_id)
+            solution = chunks_bundle.get_solution(chunk_id)
             
             # print_lines(conflict)
             # print('--------------------------')
@@ -100,12 +109,24 @@ def main():
             write_list_to_file(solution, 'solution')
             concatenation_type = execute_command('java -jar classifyConcatenation.jar v1 v2 context1 context2 solution')
             #print(f"{chunk_id}: {concatenation_type}")
-            df.at[index, 'developerdecision'] = concatenation_type.strip()
+            if concatenation_type.strip() != '':
+                journal.add_done(chunk_id, concatenation_type.strip())
+            else:
+                journal.add_failure(chunk_id, 'CLASSIFIER_ERROR')
             os.remove("v1")
             os.remove("v2")
             os.remove("context1")
             os.remove("context2")
             os.remove("solution")
-    df.to_csv(configs.LABELLED_DATASET_PATH, index=None)
+            progress.update(row['project'])
+    progress.finish()
+    journal.close()
+    journal.print_summary()
+
+    # chunks that could not be classified keep an empty decision
+    for index, row in df[df['developerdecision'] == 'Concatenation'].iterrows():
+        concatenation_type = journal.get_item(row['chunk_id'])
+        df.at[index, 'developerdecision'] = concatenation_type if concatenation_type is not None else ''
+    storage.write(df, configs.LABELLED_DATASET_PATH)
 
 main()
\ No newline at end of file
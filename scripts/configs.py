@@ -1,7 +1,10 @@
-DATA_PATH = '../data'
+import os
+
+# the data and repos folders can be changed with environment variables (e.g., to run the benchmarks on synthetic data)
+DATA_PATH = os.environ.get('CONFLICTS_DATA_PATH', '../data')
 INITIAL_DATASET_PATH = f'{DATA_PATH}/INITIAL_DATASET.csv'
 INITIAL_DATASET_PATH_TEST = f'{DATA_PATH}/INITIAL_DATASET_test.csv'
-REPOS_PATH = '../repos'
+REPOS_PATH = os.environ.get('CONFLICTS_REPOS_PATH', '../repos')
 MAC_TOOL_PATH = 'macTool.jar'
 MAC_TOOL_OUTPUT = f'{DATA_PATH}/macTool_output'
 MAC_TOOL_FILES = f'{DATA_PATH}/macTool_output.zip'
@@ -9,3 +12,5 @@ LABELLED_DATASET_PATH = f'{DATA_PATH}/LABELLED_DATASET.csv'
 SELECTED_PROJECTS_DATASET_PATH = f'{DATA_PATH}/SELECTED_LABELLED_DATASET.csv'
 DATASET_DOWNLOAD_LINK = {"https://drive.google.com/uc?export=download&confirm=iIXP&id=1OwMq81W2xajsHuG6HKBzZoL0Fp3_HL5d"}
 LOGS_PATH = f'{DATA_PATH}/logs'
+# format of the intermediate datasets: csv, parquet or feather (see storage.py)
+STORAGE_FORMAT = os.environ.get('CONFLICTS_STORAGE_FORMAT', 'csv')
@@ -1,11 +1,21 @@
+import os
+import json
+import sqlite3
 import psycopg2
+import numpy as np
+import telemetry
 
+# sqlite database with the same tables used instead of the conflicts database (e.g., the one generated by benchmark.py)
+SQLITE_PATH = os.environ.get('CONFLICTS_DB_SQLITE')
 
 def connect():
     conn = None
     cur = None
     try:
-        conn = psycopg2.connect(dbname='gleiph', user='heleno', password='heleno', port=32146, host='localhost')
+        if SQLITE_PATH is not None:
+            conn = sqlite3.connect(SQLITE_PATH)
+        else:
+            conn = psycopg2.connect(dbname='gleiph', user='heleno', password='heleno', port=32146, host='localhost')
         cur = conn.cursor()
     except (Exception, psycopg2.DatabaseError) as error:
         print(error)
@@ -22,6 +32,7 @@ def close(conn, cur):
         conn.close()
 
 
+@telemetry.timed('db')
 def get_conflict(chunk_id):
     conn, cur = connect()
     conflict = []
@@ -37,6 +48,7 @@ def get_conflict(chunk_id):
         close(conn, cur)
         return conflict
 
+@telemetry.timed('db')
 def get_conflict_position(chunk_id):
     conn, cur = connect()
     beginline = 0
@@ -53,6 +65,7 @@ def get_conflict_position(chunk_id):
         close(conn, cur)
         return beginline, endline
 
+@telemetry.timed('db')
 def get_solution(chunk_id):
     conn, cur = connect()
     solution = []
@@ -66,4 +79,120 @@ def get_solution(chunk_id):
         print(error)
     finally:
         close(conn, cur)
-        return solution
\ No newline at end of file
+        return solution
+
+'''
+    Stores the position, conflict and solution lines of many chunks using a compact layout:
+    all lines are kept in a single list and each chunk only keeps offsets into it.
+    For the chunk at index i (in chunk_ids order):
+        conflict lines = lines[offsets[2*i]:offsets[2*i+1]]
+        solution lines = lines[offsets[2*i+1]:offsets[2*i+2]]
+'''
+class ChunkBundle:
+    def __init__(self, chunk_ids, positions, lines, offsets):
+        self.chunk_ids = chunk_ids # sorted np.array of chunk ids
+        self.positions = positions # np.array with shape (n, 2): beginline, endline
+        self.lines = lines
+        self.offsets = offsets # np.array with 2*n+1 offsets into lines
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def __contains__(self, chunk_id):
+        return self.get_index(chunk_id) is not None
+
+    def get_index(self, chunk_id):
+        index = np.searchsorted(self.chunk_ids, chunk_id)
+        if index < len(self.chunk_ids) and self.chunk_ids[index] == chunk_id:
+            return index
+        return None
+
+    # same defaults as get_conflict_position, get_conflict and get_solution for unknown chunks
+    def get_conflict_position(self, chunk_id):
+        index = self.get_index(chunk_id)
+        if index is None:
+            return 0, 0
+        return int(self.positions[index, 0]), int(self.positions[index, 1])
+
+    def get_conflict(self, chunk_id):
+        index = self.get_index(chunk_id)
+        if index is None:
+            return []
+        return self.lines[self.offsets[2*index]:self.offsets[2*index+1]]
+
+    def get_solution(self, chunk_id):
+        index = self.get_index(chunk_id)
+        if index is None:
+            return []
+        return self.lines[self.offsets[2*index+1]:self.offsets[2*index+2]]
+
+
+# kind 0 = conflictingcontent, kind 1 = solutioncontent
+chunk_bundle_query = """select
+            cc.id,
+            cc.beginline,
+            cc.endline,
+            c.kind,
+            c.content
+        from
+            conflictingchunk cc
+        left join (
+            select conflictingchunk_id, 0 as kind, id, content from conflictingcontent where conflictingchunk_id = any(%(ids)s)
+            union all
+            select conflictingchunk_id, 1 as kind, id, content from solutioncontent where conflictingchunk_id = any(%(ids)s)
+        ) c on c.conflictingchunk_id = cc.id
+        where
+            cc.id = any(%(ids)s)
+        order by cc.id, c.kind, c.id
+       """
+sqlite_chunk_bundle_query = chunk_bundle_query.replace('= any(%(ids)s)', 'in (select value from json_each(:ids))')
+
+'''
+    Retrieves begin/end lines, conflict lines and solution lines of many chunks with a single ordered query.
+    Rows are streamed through a server side cursor, so only the compact ChunkBundle is kept in memory.
+'''
+@telemetry.timed('db')
+def get_chunk_bundle(chunk_ids, fetch_size=10000):
+    chunk_ids = sorted(set(int(chunk_id) for chunk_id in chunk_ids))
+    found_ids = []
+    positions = []
+    lines = []
+    offsets = [0]
+    current_kind = None
+
+    def close_chunk():
+        if current_kind == 0:
+            offsets.append(len(lines)) # the chunk has no solution lines
+        offsets.append(len(lines))
+
+    conn, cur = connect()
+    try:
+        if SQLITE_PATH is not None:
+            cur.execute(sqlite_chunk_bundle_query, {'ids': json.dumps(chunk_ids)})
+        else:
+            cur.close()
+            cur = conn.cursor(name='chunk_bundle') # server side cursor
+            cur.itersize = fetch_size
+            cur.execute(chunk_bundle_query, {'ids': chunk_ids})
+        for chunk_id, beginline, endline, kind, content in cur:
+            if len(found_ids) == 0 or chunk_id != found_ids[-1]:
+                if len(found_ids) > 0:
+                    close_chunk()
+                found_ids.append(chunk_id)
+                positions.append((beginline, endline))
+                current_kind = 0
+            if kind == 1 and current_kind == 0:
+                offsets.append(len(lines)) # end of the conflict lines
+                current_kind = 1
+            if content is not None:
+                lines.append(content)
+        if len(found_ids) > 0:
+            close_chunk()
+        cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(error)
+        found_ids, positions, lines, offsets = [], [], [], [0]
+    finally:
+        close(conn, cur)
+    positions = np.array(positions, dtype=np.int64).reshape(-1, 2)
+    return ChunkBundle(np.array(found_ids, dtype=np.int64), positions, lines, np.array(offsets, dtype=np.int64))
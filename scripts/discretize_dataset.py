@@ -1,8 +1,24 @@
+import os
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import exploratory_analysis.utils as utils
-import os
 from classifier.MDLP import MDLP_Discretizer
-
+import configs
+import storage
+
+'''
+    Discretizes the training and test files of each project and of the complete dataset with the log10, log2 and MDLP
+    discretizations. Each training/test file is read once and all discretizations are computed from it. The MDLP cut points
+    are learned on the training file and applied to the test file. The projects are processed in parallel (--jobs processes).
+'''
+DISCRETIZATIONS = ['log10', 'log2', 'mdlp']
+PROJECTS_PATH = f'{configs.DATA_PATH}/projects'
+NON_FEATURES_COLUMNS = ["chunk_id", "line_start", "line_end", "line_separator", "kind_conflict", "url", "project",
+    "project_user", "project_name", "path", "file_name", "sha", "leftsha", "rightsha", "basesha"]
+NUMERICS = ['int8', 'int16', 'int32', 'int64', 'float16', 'float32', 'float64']
 
 def add_remaining_columns(original_df, discretized_df):
     original_columns = original_df.columns
@@ -13,9 +29,9 @@ def add_remaining_columns(original_df, discretized_df):
             discretized_df[column] = original_df[column]
     return discretized_df
 
-def discretize_df(df, type='log10'):
-    numerics = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
-    numeric_columns = list(df.select_dtypes(include=numerics))
+# numeric attribute columns discretized with the log functions, and the rows of df with valid values
+def get_log_columns(df):
+    numeric_columns = list(df.select_dtypes(include=NUMERICS))
     not_attributes_columns = ['chunk_id', 'line_start', 'line_end', 'line_separator']
     float_columns = ['chunkRelSize','self_conflict_perc','chunk_left_rel_size', 'chunk_right_rel_size']
     numeric_columns = [elem for elem in numeric_columns if elem not in not_attributes_columns]
@@ -30,42 +46,82 @@ def discretize_df(df, type='log10'):
         if df[column].min() < 0:
             df = df[(df[column] >= 0) | (df[column].isna())]
     df = df[df['developerdecision']!='UnknownConcatenation']
+    return df, numeric_columns
+
+def discretize_df(df, numeric_columns, type='log10'):
     discretized_df = utils.get_discretized_df_new(df, numeric_columns, type)
-    
     discretized_df = add_remaining_columns(df, discretized_df)
     return discretized_df
 
-def get_mdlp_discretization(X, y):
-    X_orig = X.copy()
-    X = X.to_numpy()
-    y = y.to_numpy()
-    
-    numerics = ['int16', 'int32', 'int64', 'float16', 'float32', 'float64']
-    numeric_features_names = list(X_orig.select_dtypes(include=numerics)) # columns names
-    numeric_features = [X_orig.columns.get_loc(col) for col in numeric_features_names] # columns indexes
+# features and classes used by MDLP
+def get_mdlp_data(df):
+    df = df[df['developerdecision']!='UnknownConcatenation']
+    X = df.drop(columns=['developerdecision'] + NON_FEATURES_COLUMNS, errors='ignore')
+    return df, X, df["developerdecision"]
+
+# learns the MDLP cut points of the numeric features of the training file
+def fit_mdlp(df_training):
+    _, X, y = get_mdlp_data(df_training)
+    numeric_features_names = list(X.select_dtypes(include=NUMERICS)) # columns names
+    numeric_features = [X.columns.get_loc(col) for col in numeric_features_names] # columns indexes
     discretizer = MDLP_Discretizer(features=numeric_features)
-    discretizer.fit(X, y)
-    X_discretized = discretizer.transform(X)
-    return pd.DataFrame(X_discretized, columns=numeric_features_names)
-
-def discretize_mdlp(df):
-    non_features_columns = ["chunk_id", "line_start", "line_end", "line_separator", "kind_conflict", "url", "project"]
-    non_features_columns.extend(["project_user", "project_name", "path", "file_name", "sha", "leftsha", "rightsha", "basesha"])
-    df_discretized = df.copy()
-
-    # clean invalid values
-    df_discretized = df_discretized[df_discretized['developerdecision']!='UnknownConcatenation']
-    y = df_discretized["developerdecision"].copy()
-    df_discretized = df_discretized.drop(columns=['developerdecision'])
-    df_discretized = df_discretized.drop(columns=non_features_columns)
-    features = list(df_discretized.columns)
-
-    X = df_discretized[features]
-    
-    
-    discretized_df = get_mdlp_discretization(X,y)
-    discretized_df = add_remaining_columns(df, discretized_df)
-    return discretized_df
+    discretizer.fit(X.to_numpy(), y.to_numpy())
+    return discretizer, list(X.columns), numeric_features_names
+
+def discretize_mdlp(df, mdlp):
+    discretizer, features, numeric_features_names = mdlp
+    df, X, _ = get_mdlp_data(df)
+    X_discretized = discretizer.transform(X[features].to_numpy())
+    numeric_features = [features.index(col) for col in numeric_features_names]
+    discretized_df = pd.DataFrame(X_discretized[:, numeric_features], columns=numeric_features_names, index=X.index)
+    return add_remaining_columns(df, discretized_df)
+
+# discretizations of a training file and of its test file
+def discretize(df_training, df_test, discretizations):
+    results = {}
+    log_discretizations = [discretization for discretization in discretizations if discretization != 'mdlp']
+    for split, df in [('training', df_training), ('test', df_test)]:
+        if len(log_discretizations) > 0:
+            df_clean, numeric_columns = get_log_columns(df)
+            for discretization in log_discretizations:
+                results[(discretization, split)] = discretize_df(df_clean, numeric_columns, discretization)
+    if 'mdlp' in discretizations:
+        mdlp = fit_mdlp(df_training)
+        results[('mdlp', 'training')] = discretize_mdlp(df_training, mdlp)
+        results[('mdlp', 'test')] = discretize_mdlp(df_test, mdlp)
+    return results
+
+'''
+    Project file of a split. In the parquet and feather formats (see storage.py) it is a partition of projects/training or
+    projects/test, otherwise it is the file projects/{project_name}-{split}.csv.
+'''
+def read_project(project, split):
+    partitioned_file = f'{PROJECTS_PATH}/{split}.csv'
+    if storage.FORMAT != 'csv' and storage.exists(partitioned_file):
+        return storage.read(partitioned_file, partition=('project', project))
+    return storage.read(f"{PROJECTS_PATH}/{project.replace('/','__')}-{split}.csv")
+
+def discretize_project(project, discretizations):
+    start = time.time()
+    project_name = project.replace('/','__')
+    results = discretize(read_project(project, 'training'), read_project(project, 'test'), discretizations)
+    for (discretization, split), df in results.items():
+        storage.write(df, f'{PROJECTS_PATH}/discretized_{discretization}/{project_name}-{split}.csv')
+
+    # author columns saved apart by process_projects_dataset.py (--sparse-authors) are not discretized
+    for authors_file in [f'{project_name}-training-authors.npz', f'{project_name}-test-authors.npz']:
+        if os.path.exists(f'{PROJECTS_PATH}/{authors_file}'):
+            for discretization in discretizations:
+                shutil.copy(f'{PROJECTS_PATH}/{authors_file}', f'{PROJECTS_PATH}/discretized_{discretization}/{authors_file}')
+    return project, time.time() - start
+
+def discretize_dataset(discretizations):
+    start = time.time()
+    df_training = storage.read(f'{configs.DATA_PATH}/dataset-training.csv')
+    df_test = storage.read(f'{configs.DATA_PATH}/dataset-test.csv')
+    for (discretization, split), df in discretize(df_training, df_test, discretizations).items():
+        storage.write(df, f'{configs.DATA_PATH}/dataset-{split}_{discretization}.csv')
+    return 'complete dataset', time.time() - start
 
 def print_dataset_info(df):
     total_chunks = len(df)
@@ -73,57 +129,27 @@ def print_dataset_info(df):
     total_merges = len(pd.unique(df['sha']))
     print(f"The dataset has {total_merges} merges with {total_chunks} chunks from {total_projects} projects.")
 
-df_training = pd.read_csv("../data/dataset-training.csv")
-df_test = pd.read_csv("../data/dataset-test.csv")
-
-print_dataset_info(df_training)
-print_dataset_info(df_test)
-
-projects = list(df_training['project'].unique())
-if not os.path.exists('../data/projects/discretized_log10'):
-    os.mkdir('../data/projects/discretized_log10')
-
-if not os.path.exists('../data/projects/discretized_log2'):
-    os.mkdir('../data/projects/discretized_log2')
-
-if not os.path.exists('../data/projects/discretized_mdlp'):
-    os.mkdir('../data/projects/discretized_mdlp')
-
-for project in projects:
-    print(f'Processing project {project}')
-    project_name = project.replace('/','__')
-    df_project_training = pd.read_csv(f'../data/projects/{project_name}-training.csv')
-    df_project_test = pd.read_csv(f'../data/projects/{project_name}-test.csv')
-
-    df_project_training_log10 = discretize_df(df_project_training, 'log10')
-    df_project_training_log2 = discretize_df(df_project_training, 'log2')
-    df_project_training_mdlp = discretize_mdlp(df_project_training)
-
-    df_project_training_log10.to_csv(f'../data/projects/discretized_log10/{project_name}-training.csv', index=False)
-    df_project_training_log2.to_csv(f'../data/projects/discretized_log2/{project_name}-training.csv', index=False)
-    df_project_training_mdlp.to_csv(f'../data/projects/discretized_mdlp/{project_name}-training.csv', index=False)
-
-    df_project_test_log10 = discretize_df(df_project_test, 'log10')
-    df_project_test_log2 = discretize_df(df_project_test, 'log2')
-    df_project_test_mdlp = discretize_mdlp(df_project_test)
-
-    df_project_test_log10.to_csv(f'../data/projects/discretized_log10/{project_name}-test.csv', index=False)
-    df_project_test_log2.to_csv(f'../data/projects/discretized_log2/{project_name}-test.csv', index=False)
-    df_project_training_mdlp.to_csv(f'../data/projects/discretized_mdlp/{project_name}-test.csv', index=False)
-
-print('Processing complete dataset...')
-df_training_log10 = discretize_df(df_training, 'log10')
-df_training_log2 = discretize_df(df_training, 'log2')
-df_training_mdlp = discretize_mdlp(df_training)
-
-df_training_log10.to_csv(f'../data/dataset-training_log10.csv', index=False)
-df_training_log2.to_csv(f'../data/dataset-training_log2.csv', index=False)
-df_training_mdlp.to_csv(f'../data/dataset-training_mdlp.csv', index=False)
-
-df_test_log10 = discretize_df(df_test, 'log10')
-df_test_log2 = discretize_df(df_test, 'log2')
-df_test_mdlp = discretize_mdlp(df_test)
-
-df_test_log10.to_csv(f'../data/dataset-test_log10.csv', index=False)
-df_test_log2.to_csv(f'../data/dataset-test_log2.csv', index=False)
-df_test_mdlp.to_csv(f'../data/dataset-test_mdlp.csv', index=False)
+def main():
+    parser = argparse.ArgumentParser(description='Discretizes the training and test files of the projects and of the complete dataset.')
+    parser.add_argument('--discretizations', nargs='+', choices=DISCRETIZATIONS, default=DISCRETIZATIONS, help='discretizations computed.')
+    parser.add_argument('--jobs', type=int, default=4, help='number of parallel processes.')
+    arguments = parser.parse_args()
+
+    df_training = storage.read(f'{configs.DATA_PATH}/dataset-training.csv', columns=['project', 'sha'])
+    print_dataset_info(df_training)
+    print_dataset_info(storage.read(f'{configs.DATA_PATH}/dataset-test.csv', columns=['project', 'sha']))
+    projects = list(df_training['project'].unique())
+    for discretization in arguments.discretizations:
+        os.makedirs(f'{PROJECTS_PATH}/discretized_{discretization}', exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=arguments.jobs) as executor:
+        # the complete dataset is the largest task, so it starts first
+        futures = [executor.submit(discretize_dataset, arguments.discretizations)]
+        futures.extend(executor.submit(discretize_project, project, arguments.discretizations) for project in projects)
+        for future in futures:
+            name, duration = future.result()
+            print(f'Processed {name} in {duration:.1f} seconds.', flush=True)
+    print('Finished.')
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-from graphviz import Source
-
-temp = """
+# the data pipeline: each chain is written as inputs -> script -> outputs.
+# pipeline.py reads the stages of the pipeline from this graph.
+scripts_graph = """
 digraph mygraph {
   graph [fontname = "helvetica"];
   node [shape=box, style=filled, fillcolor=white, fontname = "helvetica"];
@@ -60,5 +60,7 @@ digraph mygraph {
     "Two csv files (training/test) for each repo" [fillcolor=gray97, shape=folder]
 }
 """
-s = Source(temp, filename="scripts_graph", format="svg")
-s.view()
+if __name__ == "__main__":
+    from graphviz import Source
+    s = Source(scripts_graph, filename="scripts_graph", format="svg")
+    s.view()
@@ -3,8 +3,12 @@ import configs
 import subprocess
 import os
 import sys
-import time
+from journal import Journal, get_resume_arguments
+import shard
+import telemetry
+import storage
 
+@telemetry.timed('jvm')
 def execute_command(command):
     executed = False
     try:
@@ -15,40 +19,91 @@ def execute_command(command):
         print("command '{}' return with error (code {}): {}".format(e.cmd, e.returncode, e.output), flush=True)
     return executed
 
+def get_project_file(project_name):
+    return f"{configs.MAC_TOOL_OUTPUT}/{project_name}-general.csv"
+
+macTool_outputs = {}
 def get_macTool_ouput(project_name, sha):
-    project_file = f"{configs.MAC_TOOL_OUTPUT}/{project_name}-general.csv"
+    project_file = get_project_file(project_name)
     if(os.path.exists(project_file)):
-        macTool_output = pd.read_csv(project_file, delimiter=",")
+        if project_name not in macTool_outputs: # each project file is read only once
+            macTool_outputs[project_name] = pd.read_csv(project_file, delimiter=",")
+        macTool_output = macTool_outputs[project_name]
         commit = macTool_output[macTool_output['Hash'] == sha]
         return commit
     else:
         return []
 
-def main():
-    mac_tool_command = f'java -jar {configs.MAC_TOOL_PATH} {configs.INITIAL_DATASET_PATH} {configs.REPOS_PATH} {configs.MAC_TOOL_OUTPUT}'
+'''
+    Executes the macTool only for the projects that have merges to be processed.
+    If all merges must be processed, the macTool is executed with the whole initial dataset.
+'''
+def run_macTool(pending_projects, arguments):
+    dataset_path = configs.INITIAL_DATASET_PATH
+    initial_dataset = storage.read(configs.INITIAL_DATASET_PATH)
+    projects_dataset = initial_dataset[initial_dataset['project'].isin(pending_projects)]
+    if len(projects_dataset) == 0:
+        return
+    # the macTool reads csv files, so a dataset stored in another format (see storage.py) is also written as csv
+    if len(projects_dataset) < len(initial_dataset) or not os.path.exists(dataset_path):
+        dataset_path = shard.get_output_path(f'{configs.LOGS_PATH}/execute_mac_tool_input.csv', arguments)
+        projects_dataset.to_csv(dataset_path, index=False)
+    mac_tool_command = f'java -jar {configs.MAC_TOOL_PATH} {dataset_path} {configs.REPOS_PATH} {configs.MAC_TOOL_OUTPUT}'
     execute_command(mac_tool_command)
-    labelled_dataset = pd.read_csv(configs.LABELLED_DATASET_PATH)
+
+def main():
+    arguments = get_resume_arguments('Executes the macTool and extracts its attributes for each conflicting chunk.', sharded=True)
+    # results are checkpointed in a journal (one item per merge), so an interrupted execution resumes from where it stopped
+    journal = Journal(shard.get_journal_name('execute_mac_tool', arguments), arguments.restart)
+    labelled_dataset = shard.filter_dataset(storage.read(configs.LABELLED_DATASET_PATH), arguments)
+    labelled_dataset['merge_key'] = labelled_dataset['project'].astype(str) + '-' + labelled_dataset['sha'].astype(str)
+
+    pending_projects = set()
+    for index, row in labelled_dataset.iterrows():
+        if journal.should_process(row['merge_key'], arguments.retry):
+            # the macTool is executed again for retried merges or for merges that are not in the output of their project
+            # (e.g., new merges of an incremental refresh, see incremental.py)
+            if journal.contains(row['merge_key']) or len(get_macTool_ouput(row['project_name'], row['sha'])) == 0:
+                pending_projects.add(row['project'])
+    run_macTool(pending_projects, arguments)
+    # the output files of the pending projects were written again
+    macTool_outputs.clear()
 
     columns = ["chunk_id", "project", "Branching time", "Merge isolation time", "Devs 1", "Devs 2", "Different devs", "Same devs",	"Devs intersection", "Commits 1", "Commits 2", "Changed files 1", "Changed files 2", "Changed files intersection"]
-    current_index = 0
-    dataset = []
+    progress = telemetry.Progress(len(labelled_dataset))
     for index, row in labelled_dataset.iterrows():
-        data = []
-        current_index +=1
-        status = (current_index / len(labelled_dataset)) * 100
-        print(f"{time.ctime()} ### {status:.1f}% of chunks processed. Processing chunk {row['chunk_id']} for project: {row['project']}")
+        if not journal.should_process(row['merge_key'], arguments.retry):
+            progress.skip()
+            continue
+        telemetry.set_context(row['project'], row['chunk_id'])
         sha = row['sha']
-        chunk_id = row['chunk_id']
         commit = get_macTool_ouput(row['project_name'], sha)
-        data.append(chunk_id)
-        data.append(row['project'])
         if len(commit) == 1:
+            data = []
             for column in columns:
                 if column != 'chunk_id' and column != 'project':
                     data.append(commit.iloc[0][column])
+            journal.add_done(row['merge_key'], data)
+        elif not os.path.exists(get_project_file(row['project_name'])):
+            journal.add_failure(row['merge_key'], 'MAC_TOOL_OUTPUT_NOT_FOUND')
+        else:
+            journal.add_failure(row['merge_key'], 'MERGE_NOT_FOUND')
+        progress.update(row['project'])
+    progress.finish()
+    journal.close()
+    journal.print_summary()
+
+    dataset = []
+    for index, row in labelled_dataset.iterrows():
+        data = [row['chunk_id'], row['project']]
+        merge_data = journal.get_item(row['merge_key'])
+        if merge_data is not None:
+            data.extend(merge_data)
         else:
             data.extend([None] * (len(columns)-2))
         dataset.append(data)
-    pd.DataFrame(dataset, columns = columns).to_csv(f'{configs.DATA_PATH}/macTool_output.csv', index=False)
+    storage.write(pd.DataFrame(dataset, columns = columns), shard.get_output_path(f'{configs.DATA_PATH}/macTool_output.csv', arguments))
+    journal.write_failures(shard.get_output_path(f'{configs.LOGS_PATH}/execute_mac_tool_failed.txt', arguments))
+    shard.write_done_marker('execute_mac_tool.py', arguments, len(labelled_dataset), journal)
 
-main()
\ No newline at end of file
+main()
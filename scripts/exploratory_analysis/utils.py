@@ -1,5 +1,12 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
+try:
+    from classifier import information_theory  # imported from the scripts folder (e.g., by discretize_dataset.py)
+except ImportError:  # imported by the notebooks of this folder
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'classifier'))
+    import information_theory
 
 def get_df_count(dataframe, precedent, consequent):
     df_count = pd.crosstab(dataframe[precedent], dataframe[consequent])
@@ -98,45 +105,85 @@ def get_discretized_df(df, columns):
                         ordered=True)
     return discretized, labels
 
+'''
+    Log discretization of numerical columns: each value is rounded and replaced by the rounded logarithm of it (bin).
+    Missing values and -1 (not collected) are replaced by -2, and values that round to 0 are replaced by -1.
+    base: base of the logarithm (e.g., 10 or 2). Whole columns (or blocks of columns) are discretized at once.
+'''
+MISSING_BIN = -2
+ZERO_BIN = -1
+
+def get_log(values, base):
+    if base == 10:
+        return np.log10(values)
+    if base == 2:
+        return np.log2(values)
+    return np.log(values) / np.log(base)
+
+def discretize_log(values, base=10):
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values) | (values == -1)
+    rounded = np.where(missing, 1, np.round(values))
+    if (rounded < 0).any():
+        raise ValueError('Negative values other than -1 can not be log discretized')
+    with np.errstate(divide='ignore'):
+        bins = np.round(get_log(rounded, base))
+    bins = np.where(missing, MISSING_BIN, np.where(rounded == 0, ZERO_BIN, bins))
+    return bins.astype(np.int64)
+
 def get_log2_discretized_value(value):
-    if np.isnan(value) or value == -1:
-        return int(-2)
-    value = round(value)
-    if value == 0:
-        return int(-1)
-    else:
-        return int(np.round(np.log2(value)))
+    return int(discretize_log(value, 2))
 
 def get_log10_discretized_value(value):
-    if np.isnan(value) or value == -1:
-        return int(-2)
-    value = round(value)
-    if value == 0:
-        return int(-1)
-    else:
-        return int(np.round(np.log10(value)))
+    return int(discretize_log(value, 10))
+
+# base of the logarithm from its name (log10, log2, ...) or number
+def get_log_base(base):
+    if isinstance(base, str):
+        if not base.startswith('log') or not base[3:].replace('.', '', 1).isdigit() or float(base[3:]) <= 1:
+            raise ValueError('No discretization type set. Valid values are: log10, log2 or log{base}')
+        return float(base[3:])
+    return base
+
+# smallest positive integer discretized into bin or into a greater bin
+def get_first_value(bin, base):
+    candidates = np.arange(max(1, int(np.floor(base ** (bin - 0.5))) - 1), int(np.ceil(base ** (bin - 0.5))) + 2)
+    return int(candidates[discretize_log(candidates, base) >= bin][0])
+
+'''
+    Inverse of the log discretization: range of the (rounded) values of a bin, e.g., 1 -> (4, 31) for base 10.
+    The limits are found with discretize_log, so they agree with it for any base.
+'''
+def get_log_bin_range(bin, base=10):
+    if bin == MISSING_BIN:
+        return None
+    if bin == ZERO_BIN:
+        return (0, 0)
+    return (get_first_value(bin, base), get_first_value(bin + 1, base) - 1)
+
+def get_log_bin_labels(bins, base=10):
+    labels = {}
+    for bin in sorted(set(bins)):
+        limits = get_log_bin_range(bin, get_log_base(base))
+        if limits is None:
+            labels[bin] = 'Missing'
+        elif limits[0] == limits[1]:
+            labels[bin] = str(limits[0])
+        else:
+            labels[bin] = f'{limits[0]}-{limits[1]}'
+    return labels
 
 # returns a discretized dataframe for numerical (integer) columns
 def get_discretized_df_new(df, columns, base='log10'):
     discretized = df[['chunk_id', 'developerdecision']].copy()
-    for column in columns:
-        if base == 'log2':
-            discretized[column] = df[column].map(get_log2_discretized_value)
-        elif base == 'log10':
-            discretized[column] = df[column].map(get_log10_discretized_value)
-        else:
-            raise ValueError('No discretization type set. Valid values are: log10 or log2')
-    return discretized
+    bins = discretize_log(df[columns].to_numpy(dtype=np.float64, na_value=np.nan), get_log_base(base))
+    return pd.concat([discretized, pd.DataFrame(bins, columns=columns, index=df.index)], axis=1)
 
 # returns the entropy of the classes of the column developerdecision 
 # for each value of a column
 def entropy(column, df):
-    df_label_attrib = df[['developerdecision',column]]
-    
-    attr_entropy = df_label_attrib.groupby(column)\
-        .apply(lambda x: x.value_counts(normalize=True)\
-                .map(lambda x: -1 * x * np.log2(x))\
-                .sum())\
+    attr_entropy = information_theory.value_entropies(df[column], df['developerdecision'])\
+        .rename_axis(column)\
         .to_frame(name="entropy")
-    
+
     return attr_entropy
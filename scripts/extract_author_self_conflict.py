@@ -1,31 +1,16 @@
-import pandas as pd
-import time
+import argparse
+import configs
+import authors_table
+import storage
 
-def get_self_conflict_perc(authors_left, authors_right):
-    authors_left = eval(authors_left)
-    authors_right = eval(authors_right)
-    left = set()
-    right = set()
-    for author in authors_left:
-        left.add(author)
-    for author in authors_right:
-        right.add(author)
-    return len(left.intersection(right)) / len(left.union(right))
+parser = argparse.ArgumentParser(description='Computes the percentage of the authors of each chunk that contributed to both sides.')
+parser.add_argument('--weights', nargs='*', choices=list(authors_table.WEIGHTS), default=[],
+    help='weighted variants by the lines of each author (self_conflict_perc_{weight} columns).')
+arguments = parser.parse_args()
 
-df = pd.read_csv("../data/chunk_authors.csv")
-selected = df[(df['authors_left'] != '{}') & (df['authors_right'] != '{}')]
-data = []
-current_index = 0
-print(f'Starting the process for {len(selected)} chunks...')
-for index,row in selected.iterrows():
-    current_index +=1
-    status = (current_index / len(selected)) * 100
-    print(f"{time.ctime()} ### {status:.1f}% of chunks processed. Processing chunk {row['chunk_id']}.")
-    perc = get_self_conflict_perc(row['authors_left'], row['authors_right'])
-    chunk_id = row['chunk_id']
-    data.append([chunk_id, perc])
-
-columns = ['chunk_id', "self_conflict_perc"]
-pd.DataFrame(data, columns=columns).to_csv("../data/authors_self_conflicts.csv", index=False)
-    
-    
\ No newline at end of file
+columns = ['chunk_id', 'side', 'author'] + sorted({column for weight in arguments.weights for column in authors_table.WEIGHTS[weight]})
+table = authors_table.read_authors(columns=columns)
+print(f'Starting the process for {table["chunk_id"].nunique()} chunks...')
+df = authors_table.get_self_conflict_perc(table, arguments.weights)
+print(f'Finished. Self conflict percentage computed for {len(df)} chunks.')
+storage.write(df, f"{configs.DATA_PATH}/authors_self_conflicts.csv")
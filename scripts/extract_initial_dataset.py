@@ -1,5 +1,8 @@
 import database
 import pandas as pd
+import configs
+import incremental
+import storage
 
 query = """select 
             cc.id as chunk_id,
@@ -33,10 +36,17 @@ query = """select
        """
 
 def main():
+    arguments = incremental.get_arguments('Extracts the conflicting chunks from the conflicts database.')
     conn, cur = database.connect()
     dat = pd.read_sql_query(query, conn)
-    print(dat.head())
-    dat.to_csv('../data/INITIAL_DATASET.csv', index=None)
     database.close(conn,cur)
+    if arguments.incremental and storage.exists(configs.INITIAL_DATASET_PATH):
+        # only chunks that are not in the current dataset are appended to it
+        new_chunks = incremental.get_new_rows(dat, configs.INITIAL_DATASET_PATH)
+        print(f'{len(new_chunks)} new chunks found in {new_chunks["project"].nunique()} projects.')
+        incremental.append_rows(new_chunks, configs.INITIAL_DATASET_PATH)
+    else:
+        print(dat.head())
+        storage.write(dat, configs.INITIAL_DATASET_PATH)
 
 main()
\ No newline at end of file
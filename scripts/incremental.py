@@ -0,0 +1,51 @@
+import os
+import argparse
+import pandas as pd
+import storage
+
+'''
+    Helpers for the incremental refresh of the dataset (--incremental).
+    In incremental mode a script only processes the chunks of its input that are not in its output yet,
+    and appends them to the output instead of generating it again.
+'''
+def get_arguments(description=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--incremental', action='store_true', help='only process the chunks that are not in the output yet and append them to it.')
+    return parser.parse_args()
+
+def get_existing_ids(output_path, key='chunk_id'):
+    if not storage.exists(output_path):
+        return set()
+    return set(storage.read(output_path, columns=[key])[key])
+
+# rows of df whose key is not in any of the output files
+def get_new_rows(df, output_paths, key='chunk_id'):
+    if isinstance(output_paths, str):
+        output_paths = [output_paths]
+    existing_ids = set()
+    for output_path in output_paths:
+        existing_ids.update(get_existing_ids(output_path, key))
+    return df[~df[key].isin(existing_ids)]
+
+'''
+    Appends the rows to a dataset file (see storage.py), keeping the column order of the file.
+    If the rows have columns that are not in the file (e.g., a new language construct), the file is generated
+    again with the new columns, which are filled with fill_value for the existing rows.
+    Parquet and feather files are always generated again.
+'''
+def append_rows(df, output_path, fill_value=None):
+    if not storage.exists(output_path):
+        storage.write(df, output_path)
+        return
+    if len(df) == 0:
+        return
+    columns = storage.read_columns(output_path)
+    new_columns = [column for column in df.columns if column not in columns]
+    df = df.reindex(columns=columns + new_columns, fill_value=fill_value)
+    if len(new_columns) > 0 or storage.FORMAT != 'csv' or not os.path.exists(output_path):
+        existing = storage.read(output_path)
+        for column in new_columns:
+            existing[column] = fill_value
+        storage.write(pd.concat([existing, df], ignore_index=True), output_path)
+    else:
+        df.to_csv(output_path, mode='a', header=False, index=False)
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import argparse
+import pandas as pd
+import configs
+import shard
+import storage
+
+'''
+    Append-only journal used by the collection scripts to checkpoint their progress.
+    Each line is a JSON record for one collected item (chunk or merge commit):
+        {"key": "123", "status": "done", "data": [...]}
+        {"key": "456", "status": "failed", "reason": "BAD_COMMIT"}
+    The latest record of a key overrides the previous ones. Records are flushed after each write,
+    but fsync is only called every fsync_every records (or fsync_interval seconds) to keep the cost low.
+    The final csv files are generated only once (compact_csv), at the end of the collection.
+    Keys are chunk ids or merge commits (project-sha). Collection scripts use should_process to skip the keys
+    already collected and to retry only the failures with the given reasons.
+'''
+class Journal:
+    def __init__(self, name, restart=False, fsync_every=50, fsync_interval=10):
+        if not os.path.exists(configs.LOGS_PATH):
+            os.makedirs(configs.LOGS_PATH)
+        self.path = f'{configs.LOGS_PATH}/{name}.journal'
+        if restart and os.path.exists(self.path):
+            os.remove(self.path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.records = {}
+        self.load()
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.pending_sync = 0
+        self.last_sync = time.time()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as file:
+            content = file.read()
+        for line in content.split('\n'):
+            try:
+                self.set_record(json.loads(line))
+            except ValueError:
+                pass # empty line or record truncated by a crash
+        if content != '' and not content.endswith('\n'):
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write('\n') # new records must not be appended to a truncated one
+
+    def set_record(self, record):
+        if record['status'] == 'cleared':
+            self.records.pop(record['key'], None)
+        else:
+            self.records[record['key']] = record
+
+    def append(self, record):
+        self.set_record(record)
+        self.file.write(json.dumps(record, default=to_json_value) + '\n')
+        self.file.flush()
+        self.pending_sync += 1
+        if self.pending_sync >= self.fsync_every or time.time() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def add_done(self, key, data):
+        self.append({'key': str(key), 'status': 'done', 'data': data})
+
+    def add_failure(self, key, reason):
+        self.append({'key': str(key), 'status': 'failed', 'reason': reason})
+
+    # forgets a previous failure of a key (e.g., a chunk retried successfully under another key)
+    def clear(self, key):
+        if self.contains(key):
+            self.append({'key': str(key), 'status': 'cleared'})
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending_sync = 0
+        self.last_sync = time.time()
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+    def contains(self, key):
+        return str(key) in self.records
+
+    def is_done(self, key):
+        record = self.records.get(str(key))
+        return record is not None and record['status'] == 'done'
+
+    def get_item(self, key):
+        record = self.records.get(str(key))
+        if record is not None and record['status'] == 'done':
+            return record['data']
+        return None
+
+    def get_failure(self, key):
+        record = self.records.get(str(key))
+        if record is not None and record['status'] == 'failed':
+            return record['reason']
+        return None
+
+    # retry_reasons: failure reasons that should be processed again ('ALL' retries every failure)
+    def should_process(self, key, retry_reasons=[]):
+        record = self.records.get(str(key))
+        if record is None:
+            return True
+        if record['status'] == 'failed':
+            return 'ALL' in retry_reasons or record['reason'] in retry_reasons
+        return False
+
+    def get_data(self):
+        return [record['data'] for record in self.records.values() if record['status'] == 'done']
+
+    def get_failures(self):
+        return [[record['key'], record['reason']] for record in self.records.values() if record['status'] == 'failed']
+
+    def get_failure_counts(self):
+        counts = {}
+        for _, reason in self.get_failures():
+            counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+    def print_summary(self):
+        print(f'Journal {self.path}: {len(self.get_data())} items collected, {len(self.get_failures())} failures {self.get_failure_counts()}', flush=True)
+
+    def compact_csv(self, columns, csv_path):
+        df = pd.DataFrame(self.get_data(), columns=columns)
+        df.to_csv(csv_path, index=False)
+        return df
+
+    # same as compact_csv, but in the format of the intermediate datasets (see storage.py)
+    def compact(self, columns, path):
+        df = pd.DataFrame(self.get_data(), columns=columns)
+        storage.write(df, path)
+        return df
+
+    def write_failures(self, file_path):
+        with open(file_path, 'w') as file:
+            for key, reason in self.get_failures():
+                file.write(f"{key}:{reason}\n")
+
+'''
+    Command line arguments shared by the collection scripts to control how they resume from their journals:
+        --retry REASON  processes again the items that failed with REASON (e.g., BAD_COMMIT, CANT_MERGE or ALL)
+        --restart       discards the journal and processes everything again
+        --shard N       only processes the projects assigned to worker N in the shards manifest (sharded collectors, see shard.py)
+'''
+def get_resume_arguments(description=None, sharded=False):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--retry', action='append', default=[], help='failure reason to retry (e.g. BAD_COMMIT, CANT_MERGE, or ALL for every failure). Can be repeated or comma separated.')
+    parser.add_argument('--restart', action='store_true', help='discard the journal and process everything again.')
+    if sharded:
+        shard.add_shard_arguments(parser)
+    arguments = parser.parse_args()
+    arguments.retry = [reason.strip() for value in arguments.retry for reason in value.split(',') if reason.strip() != '']
+    return arguments
+
+# numpy values (e.g., values from a pandas row) are not json serializable
+def to_json_value(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,274 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import pathlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import configs
+import storage
+from draw_scripts_graph import scripts_graph
+
+# Executes the scripts from the data pipeline described in draw_scripts_graph.py.
+# A stage (script) is only executed again if its code or one of its inputs changed since its last successful execution.
+# Stages that do not depend on each other are executed in parallel.
+
+SCRIPTS_FOLDER = pathlib.Path(__file__).parent.absolute()
+STATE_PATH = f'{configs.LOGS_PATH}/pipeline_state.json'
+TIMINGS_PATH = f'{configs.LOGS_PATH}/pipeline_timings.csv'
+
+# graph nodes that are not csv files stored in configs.DATA_PATH
+NODES_PATHS = {
+    'Repos folder': configs.REPOS_PATH,
+    'Two csv files for each analyzed repo': configs.MAC_TOOL_OUTPUT,
+    'Two csv files (training/test) for each repo': f'{configs.DATA_PATH}/projects',
+}
+# nodes that cannot be hashed (changes on them must be handled using --force)
+EXTERNAL_NODES = ['Conflicts database']
+# stages that accept --incremental (the other collection stages resume from their journals and only process new chunks)
+INCREMENTAL_STAGES = ['extract_initial_dataset.py', 'collect_merge_type.py', 'assemble_dataset.py', 'select_projects.py',
+    'transform_boolean_attributes.py', 'process_projects_dataset.py']
+
+class Stage:
+    def __init__(self, script):
+        self.script = script
+        self.inputs = []
+        self.outputs = []
+        self.dependencies = set()
+
+    def add_nodes(self, nodes, destination):
+        for node in nodes:
+            if node not in destination:
+                destination.append(node)
+
+'''
+    Reads the stages from the graph. Each line with the format {inputs} -> script.py -> {outputs} declares a stage.
+'''
+def parse_stages(graph):
+    stages = {}
+    for line in graph.split('\n'):
+        if '->' not in line:
+            continue
+        parts = [re.findall(r'"([^"]+)"', part) for part in line.split('->')]
+        for i in range(1, len(parts)-1):
+            for script in parts[i]:
+                if script.endswith('.py'):
+                    stage = stages.setdefault(script, Stage(script))
+                    stage.add_nodes(parts[i-1], stage.inputs)
+                    stage.add_nodes(parts[i+1], stage.outputs)
+    for stage in stages.values():
+        for other in stages.values():
+            if other != stage and set(stage.inputs).intersection(other.outputs):
+                stage.dependencies.add(other.script)
+    return stages
+
+def get_node_path(node):
+    if node in NODES_PATHS:
+        return NODES_PATHS[node]
+    if node in EXTERNAL_NODES or not node.endswith('.csv'):
+        return None
+    # the datasets may be stored in another format (see storage.py)
+    return storage.find_path(f'{configs.DATA_PATH}/{node}')
+
+def hash_file(file_path, digest):
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+
+# inside git repositories only the refs are considered, since the collectors change the working tree of the repos
+def hash_git_refs(repo_path, digest):
+    git_folder = os.path.join(repo_path, '.git')
+    packed_refs = os.path.join(git_folder, 'packed-refs')
+    if os.path.isfile(packed_refs):
+        hash_file(packed_refs, digest)
+    for root, dirs, files in os.walk(os.path.join(git_folder, 'refs')):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_path = os.path.join(root, file_name)
+            digest.update(os.path.relpath(file_path, repo_path).encode())
+            hash_file(file_path, digest)
+
+def hash_path(path, digest):
+    if os.path.isfile(path):
+        hash_file(path, digest)
+    elif os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            if '.git' in dirs:
+                digest.update(os.path.relpath(root, path).encode())
+                hash_git_refs(root, digest)
+                dirs[:] = []
+                continue
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                digest.update(os.path.relpath(file_path, path).encode())
+                hash_file(file_path, digest)
+    else:
+        digest.update(b'<missing>')
+
+# returns the script and the local modules imported by it (recursively)
+def get_code_files(script, visited=None):
+    if visited is None:
+        visited = []
+    script_path = SCRIPTS_FOLDER / script
+    if script in visited or not script_path.exists():
+        return visited
+    visited.append(script)
+    with open(script_path, encoding='utf-8') as file:
+        for line in file:
+            match = re.match(r'\s*(?:import|from)\s+([\w\.]+)', line)
+            if match:
+                module = match.group(1).replace('.', '/')
+                get_code_files(f'{module}.py', visited)
+    return visited
+
+def get_stage_hash(stage):
+    digest = hashlib.sha256()
+    for code_file in sorted(get_code_files(stage.script)):
+        digest.update(code_file.encode())
+        hash_file(SCRIPTS_FOLDER / code_file, digest)
+    for node in sorted(stage.inputs):
+        digest.update(node.encode())
+        node_path = get_node_path(node)
+        if node_path is not None:
+            hash_path(node_path, digest)
+    return digest.hexdigest()
+
+def outputs_exist(stage):
+    for node in stage.outputs:
+        node_path = get_node_path(node)
+        if node_path is not None and not os.path.exists(node_path):
+            return False
+    return True
+
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH) as file:
+            return json.load(file)
+    return {}
+
+def save_state(state):
+    with open(STATE_PATH, 'w') as file:
+        json.dump(state, file, indent=2, sort_keys=True)
+
+def write_timing(script, status, started, elapsed):
+    new_file = not os.path.exists(TIMINGS_PATH)
+    with open(TIMINGS_PATH, 'a') as file:
+        if new_file:
+            file.write('stage,status,started,elapsed_seconds\n')
+        file.write(f'{script},{status},{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started))},{elapsed:.2f}\n')
+
+def run_stage(stage, arguments):
+    log_path = f'{configs.LOGS_PATH}/{stage.script.replace(".py", "")}.log'
+    with open(log_path, 'a') as log:
+        result = subprocess.run([sys.executable, stage.script] + arguments, cwd=SCRIPTS_FOLDER, stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode == 0
+
+# selects the requested stages and every stage they depend on
+def select_stages(stages, targets):
+    if len(targets) == 0:
+        return set(stages)
+    selected = set()
+    pending = list(targets)
+    while len(pending) > 0:
+        script = pending.pop()
+        if script not in stages:
+            raise ValueError(f'Unknown stage {script}. Valid stages are: {", ".join(sorted(stages))}')
+        if script not in selected:
+            selected.add(script)
+            pending.extend(stages[script].dependencies)
+    return selected
+
+def run_pipeline(targets=[], jobs=3, force=[], dry_run=False, arguments={}):
+    if not os.path.exists(configs.LOGS_PATH):
+        os.makedirs(configs.LOGS_PATH)
+    stages = parse_stages(scripts_graph)
+    selected = select_stages(stages, targets)
+    state = load_state()
+    finished = set()
+    executed = set()
+    failed = set()
+    running = {}
+    pipeline_start = time.time()
+
+    def is_stale(stage, stage_hash):
+        if 'all' in force or stage.script in force or not outputs_exist(stage):
+            return True
+        if dry_run and len(stage.dependencies.intersection(executed)) > 0:
+            return True
+        return state.get(stage.script, {}).get('hash') != stage_hash
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            pending_before = len(selected - finished - failed)
+            for script in sorted(selected - finished - failed - set(running)):
+                stage = stages[script]
+                dependencies = stage.dependencies.intersection(selected)
+                if len(dependencies.intersection(failed)) > 0:
+                    print(f'{time.ctime()} ### Skipping {script}: an upstream stage failed.', flush=True)
+                    failed.add(script)
+                elif dependencies.issubset(finished):
+                    stage_hash = get_stage_hash(stage)
+                    if not is_stale(stage, stage_hash):
+                        print(f'{time.ctime()} ### {script} is up to date.', flush=True)
+                        finished.add(script)
+                    elif dry_run:
+                        print(f'{time.ctime()} ### {script} would be executed.', flush=True)
+                        finished.add(script)
+                        executed.add(script)
+                    else:
+                        print(f'{time.ctime()} ### Starting {script}.', flush=True)
+                        future = executor.submit(run_stage, stage, arguments.get(script, []))
+                        running[script] = (future, stage_hash, time.time())
+            if len(running) == 0:
+                pending = selected - finished - failed
+                if len(pending) == 0:
+                    break
+                if len(pending) == pending_before:
+                    # nothing was started, finished or skipped in this pass, so the pending stages wait for each other
+                    stuck = ', '.join(f'{script} (waits for {", ".join(sorted(stages[script].dependencies.intersection(pending)))})' for script in sorted(pending))
+                    raise ValueError(f'The dependencies of these stages can never be satisfied (cycle in the scripts graph?): {stuck}')
+                continue
+            done, _ = wait([future for future, _, _ in running.values()], return_when=FIRST_COMPLETED)
+            for script in [script for script, (future, _, _) in running.items() if future in done]:
+                future, stage_hash, started = running.pop(script)
+                elapsed = time.time() - started
+                if future.result():
+                    print(f'{time.ctime()} ### {script} finished in {elapsed:.1f} seconds.', flush=True)
+                    # inputs are hashed before the execution, so changes made to them during the execution are detected in the next run
+                    state[script] = {'hash': stage_hash, 'elapsed_seconds': round(elapsed, 2), 'finished': time.ctime()}
+                    save_state(state)
+                    write_timing(script, 'finished', started, elapsed)
+                    finished.add(script)
+                    executed.add(script)
+                else:
+                    print(f'{time.ctime()} ### {script} failed after {elapsed:.1f} seconds. Check {configs.LOGS_PATH} for its output.', flush=True)
+                    write_timing(script, 'failed', started, elapsed)
+                    failed.add(script)
+
+    action = 'would be executed' if dry_run else 'executed'
+    print(f'Pipeline finished in {time.time() - pipeline_start:.1f} seconds. {len(executed)} stages {action}, {len(finished) - len(executed)} up to date, {len(failed)} failed.')
+    return len(failed) == 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the stages of the data pipeline, skipping the ones whose inputs and code did not change.')
+    parser.add_argument('stages', nargs='*', help='stages to run (together with the stages they depend on). Default: all stages.')
+    parser.add_argument('--jobs', type=int, default=3, help='maximum number of stages executed in parallel.')
+    parser.add_argument('--force', action='append', default=[], help='stage to execute even if it is up to date (use "all" for every stage). Can be repeated.')
+    parser.add_argument('--dry-run', action='store_true', help='only shows which stages would be executed.')
+    parser.add_argument('--incremental', action='store_true', help='extracts the new chunks from the conflicts database and only processes them (up to process_projects_dataset.py by default).')
+    args = parser.parse_args()
+    arguments = {}
+    if args.incremental:
+        arguments = {script: ['--incremental'] for script in INCREMENTAL_STAGES}
+        args.force.append('extract_initial_dataset.py')
+        if len(args.stages) == 0:
+            args.stages = ['process_projects_dataset.py']
+    if not run_pipeline(args.stages, args.jobs, args.force, args.dry_run, arguments):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
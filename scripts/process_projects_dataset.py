@@ -2,70 +2,177 @@ import pandas as pd
 import configs
 import os
 import math
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import scipy.sparse
+import incremental
+import authors_table
+import storage
 
 RANDOM_SEED = 19052021
 
-def get_project_authors(df_projects, df_authors, project):
-    project_chunks = df_projects[df_projects['project'] == project]
-    project_chunks_id = list(project_chunks['chunk_id'].unique())
-    chunk_authors = df_authors[df_authors['chunk_id'].isin( project_chunks_id)]
-    authors = set()
-    for index, chunk in chunk_authors.iterrows():
-        chunk_authors = get_chunk_authors(chunk['authors_left'], chunk['authors_right'])
-        authors.update(chunk_authors)
-    return list(authors)
+'''
+    Builds the author membership of all chunks as a sparse CSR matrix (chunks x authors) from the authors table (see authors_table.py).
+    Returns the matrix, the row of each chunk_id and the authors of the columns (sorted by name).
+    The last row of the matrix is empty and is used for the chunks without authors.
+'''
+def get_authors_matrix(table):
+    pairs = authors_table.get_chunks_authors(table)
+    # the columns have the stripped names of the authors, so names that only differ in spaces are the same column
+    names = pairs['author'].cat.categories.str.strip()
+    pairs = pd.DataFrame({'chunk_id': pairs['chunk_id'].values, 'author': names[pairs['author'].cat.codes.values]}).drop_duplicates()
+    chunk_rows, chunk_ids = pd.factorize(pairs['chunk_id'])
+    authors = pairs['author'].astype('category')
+    authors = authors.cat.reorder_categories(sorted(authors.cat.categories))
+    matrix = scipy.sparse.csr_matrix((np.ones(len(pairs), dtype=np.int8), (chunk_rows, authors.cat.codes.values)),
+        shape=(len(chunk_ids) + 1, len(authors.cat.categories)))
+    rows = pd.Series(np.arange(len(chunk_ids)), index=chunk_ids)
+    return matrix, rows, np.array(authors.cat.categories, dtype=object)
 
-def get_chunk_authors(authors_left, authors_right):
-    authors = set()
-    authors_left = eval(authors_left)
-    authors_right = eval(authors_right)
-    authors.update(authors_left.keys())
-    authors.update(authors_right.keys())
-    return list(authors)
+def get_chunks_matrix(chunk_ids, authors_matrix):
+    matrix, rows, authors = authors_matrix
+    return matrix[rows.reindex(chunk_ids, fill_value=matrix.shape[0] - 1).values]
 
-def set_chunks_authors(df, all_authors, df_authors):
-    for author in all_authors:
-        df[author] = 0
-        
-    for index, row in df.iterrows():
-        row_authors = df_authors[df_authors['chunk_id'] == row['chunk_id']]
-        if len(row_authors) > 0:
-            row_authors = row_authors.iloc[0]
-            authors = get_chunk_authors(row_authors['authors_left'], row_authors['authors_right'])
-            for author in authors:
-                df.loc[index, author.strip()] = 1
-    return df
+# columns of the authors that participated in at least one chunk of the project
+def get_project_authors(project_chunks, authors_matrix):
+    return np.unique(get_chunks_matrix(project_chunks['chunk_id'], authors_matrix).indices)
 
+def get_chunks_authors(df, project_authors, authors_matrix):
+    return get_chunks_matrix(df['chunk_id'], authors_matrix)[:, project_authors]
 
-df = pd.read_csv(f"{configs.DATA_PATH}/selected_dataset_2.csv")
-df_authors = pd.read_csv(f"{configs.DATA_PATH}/chunk_authors.csv")
-projects_dataset_path = f"{configs.DATA_PATH}/projects"
-if not os.path.exists(projects_dataset_path):
-    os.mkdir(projects_dataset_path)
+def set_chunks_authors(df, project_authors, authors_matrix):
+    matrix = get_chunks_authors(df, project_authors, authors_matrix)
+    authors = authors_matrix[2][project_authors]
+    df_chunks_authors = pd.DataFrame(matrix.toarray(), index=df.index, columns=authors)
+    return pd.concat([df, df_chunks_authors], axis=1)
 
-projects = list(df['project'].unique())
-chunks_training = []
-chunks_test = []
-print('Starting...')
-for index,project in enumerate(projects):
-    print(f'Processing project {project}.')
-    project_chunks = df[df['project'] == project]
-    project_authors = get_project_authors(df, df_authors, project)
+'''
+    Saves the author columns of a project file as a CSR matrix in a npz file, together with
+    the chunk ids (rows, in the same order of the project file) and the authors (columns).
+'''
+def save_chunks_authors(df, project_authors, authors_matrix, file_path):
+    matrix = get_chunks_authors(df, project_authors, authors_matrix)
+    np.savez_compressed(file_path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape),
+        chunk_ids=df['chunk_id'].values, authors=np.array(authors_matrix[2][project_authors], dtype=str))
+
+# 80% of the chunks for training/validation and 20% for test
+def split_chunks(project_chunks):
     total_chunks = len(project_chunks)
     training_size = math.ceil(total_chunks * 0.8)
     project_chunks_training = project_chunks.sample(n=training_size, random_state=RANDOM_SEED)
-    chunks_training.append(project_chunks_training.copy())
     project_chunks_test = project_chunks.drop(project_chunks_training.index)
-    chunks_test.append(project_chunks_test.copy())
-    project_chunks_training = set_chunks_authors(project_chunks_training, project_authors, df_authors)
-    project_chunks_test = set_chunks_authors(project_chunks_test, project_authors, df_authors)
-    project_name = project.replace("/","__")
-    project_chunks_training.to_csv(f"{projects_dataset_path}/{project_name}-training.csv", index=False)
-    project_chunks_test.to_csv(f"{projects_dataset_path}/{project_name}-test.csv", index=False)
-print("Finished.")
-chunks_training = pd.concat(chunks_training)
-chunks_test = pd.concat(chunks_test)
-chunks_training.to_csv(f"{configs.DATA_PATH}/dataset-training.csv", index=False)
-chunks_test.to_csv(f"{configs.DATA_PATH}/dataset-test.csv", index=False)
+    return project_chunks_training, project_chunks_test
+
+'''
+    Chunks of the project that are in a project file, in the same order of the file.
+    In the parquet and feather formats (see storage.py) the project files are partitions of projects/training and projects/test.
+'''
+def get_existing_chunks(project_chunks, project_file, project, partitioned_file=None):
+    if partitioned_file is not None:
+        if not storage.exists(partitioned_file):
+            return project_chunks.iloc[0:0]
+        existing_ids = storage.read(partitioned_file, columns=['chunk_id'], partition=('project', project))['chunk_id']
+    elif os.path.exists(project_file):
+        existing_ids = pd.read_csv(project_file, usecols=['chunk_id'])['chunk_id']
+    else:
+        return project_chunks.iloc[0:0]
+    existing_ids = existing_ids[existing_ids.isin(project_chunks['chunk_id'])]
+    chunks_index = pd.Series(project_chunks.index, index=project_chunks['chunk_id'])
+    return project_chunks.loc[chunks_index.loc[existing_ids].values]
+
+'''
+    Writes the file of a project (training or test), with the author columns of the chunks of the project
+    in the file or, with sparse_authors, in a npz file next to it.
+    partitioned_file: in the parquet and feather formats the file is the partition of the project in this dataset.
+'''
+def write_project_file(project_file_chunks, project_file, project_authors, authors_matrix, sparse_authors, partitioned_file=None):
+    authors_file = project_file.replace('.csv', '-authors.npz')
+    if sparse_authors:
+        save_chunks_authors(project_file_chunks, project_authors, authors_matrix, authors_file)
+    else:
+        project_file_chunks = set_chunks_authors(project_file_chunks, project_authors, authors_matrix)
+        # the author columns are in the csv file, so an authors file from a previous sparse execution is outdated
+        if os.path.exists(authors_file):
+            os.remove(authors_file)
+    if partitioned_file is not None:
+        storage.write(project_file_chunks, partitioned_file, partition_by='project')
+    else:
+        project_file_chunks.to_csv(project_file, index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Splits the dataset of each project into training and test parts.')
+    parser.add_argument('--incremental', action='store_true', help='only process the chunks that are not in the output yet and append them to it.')
+    parser.add_argument('--sparse-authors', action='store_true', help='saves the author columns of each project file to a separate npz file (CSR matrix) instead of the csv file.')
+    parser.add_argument('--jobs', type=int, default=4, help='number of project files written in parallel.')
+    arguments = parser.parse_args()
+    df = storage.read(f"{configs.DATA_PATH}/selected_dataset_2.csv")
+    authors_matrix = get_authors_matrix(authors_table.read_authors(columns=['chunk_id', 'author']))
+    projects_dataset_path = f"{configs.DATA_PATH}/projects"
+    if not os.path.exists(projects_dataset_path):
+        os.mkdir(projects_dataset_path)
+    training_path = f"{configs.DATA_PATH}/dataset-training.csv"
+    test_path = f"{configs.DATA_PATH}/dataset-test.csv"
+    # in the parquet and feather formats the project files are partitions (by project) of a training and a test dataset,
+    # each partition is written with the author columns of its project
+    partitioned = storage.FORMAT != 'csv'
+    partitioned_files = {'training': f"{projects_dataset_path}/training.csv", 'test': f"{projects_dataset_path}/test.csv"}
+    # the chunks of each project are found once (the rows of a group keep the order of the dataset, so the split is the same)
+    project_groups = df.groupby('project', sort=False, observed=True)
 
+    if arguments.incremental:
+        # only projects with new chunks are processed again
+        new_chunks = incremental.get_new_rows(df, [training_path, test_path])
+        new_project_groups = new_chunks.groupby('project', sort=False, observed=True)
+        projects = list(new_project_groups.groups)
+        print(f'{len(new_chunks)} new chunks in {len(projects)} projects.')
+    else:
+        projects = list(project_groups.groups)
+    if partitioned and not arguments.incremental:
+        # in incremental mode only the partitions of the processed projects are replaced
+        for partitioned_file in partitioned_files.values():
+            storage.remove(storage.get_path(partitioned_file))
+    chunks_training = []
+    chunks_test = []
+    print('Starting...')
+    with ThreadPoolExecutor(max_workers=arguments.jobs) as executor:
+        writes = []
+        for index,project in enumerate(projects):
+            print(f'Processing project {project}.')
+            project_name = project.replace("/","__")
+            project_training_file = f"{projects_dataset_path}/{project_name}-training.csv"
+            project_test_file = f"{projects_dataset_path}/{project_name}-test.csv"
+            project_chunks = project_groups.get_group(project)
+            project_authors = get_project_authors(project_chunks, authors_matrix)
+            if arguments.incremental:
+                # existing chunks keep their split, only the new chunks are split (with the same seed)
+                new_project_chunks = new_project_groups.get_group(project)
+                new_chunks_training, new_chunks_test = split_chunks(new_project_chunks)
+                chunks_training.append(new_chunks_training.copy())
+                chunks_test.append(new_chunks_test.copy())
+                existing_training = get_existing_chunks(project_chunks, project_training_file, project, partitioned_files['training'] if partitioned else None)
+                existing_test = get_existing_chunks(project_chunks, project_test_file, project, partitioned_files['test'] if partitioned else None)
+                project_chunks_training = pd.concat([existing_training, new_chunks_training])
+                project_chunks_test = pd.concat([existing_test, new_chunks_test])
+            else:
+                project_chunks_training, project_chunks_test = split_chunks(project_chunks)
+                chunks_training.append(project_chunks_training.copy())
+                chunks_test.append(project_chunks_test.copy())
+            for split, project_file, project_file_chunks in [('training', project_training_file, project_chunks_training), ('test', project_test_file, project_chunks_test)]:
+                writes.append(executor.submit(write_project_file, project_file_chunks, project_file, project_authors,
+                    authors_matrix, arguments.sparse_authors, partitioned_files[split] if partitioned else None))
+        for write in writes:
+            write.result()
+    print("Finished.")
+    if len(projects) == 0:
+        return
+    chunks_training = pd.concat(chunks_training)
+    chunks_test = pd.concat(chunks_test)
+    if arguments.incremental:
+        incremental.append_rows(chunks_training, training_path, fill_value=0)
+        incremental.append_rows(chunks_test, test_path, fill_value=0)
+    else:
+        storage.write(chunks_training, training_path)
+        storage.write(chunks_test, test_path)
 
+main()
@@ -2,6 +2,9 @@ import pandas as pd
 import configs
 import os
 import subprocess
+import incremental
+import telemetry
+import storage
 
 # criteria do select projects: 
 #   at least 1000 chunks
@@ -15,6 +18,7 @@ def filter_intersection(selected_projects):
     projects_intersection = {}
     for project in projects:
         project_path = f'{configs.REPOS_PATH}/{project}'
+        telemetry.set_context(project)
         project_commits = set()
         if os.path.exists(project_path):
             command = 'git rev-list --all'
@@ -22,6 +26,7 @@ def filter_intersection(selected_projects):
             for commit in all_commits.split():
                 project_commits.add(commit)
             projects_commits[project] = project_commits
+    telemetry.set_context()
     data = []
     columns = ['project1', 'project2', 'intersection_perc']
     for project, commits in projects_commits.items():
@@ -64,6 +69,7 @@ def filter_projects_missing_data(selected_projects):
     return new_selected_projects            
     
 
+@telemetry.timed('git')
 def execute_command(command, path):
     try:
         my_env = os.environ.copy()
@@ -73,26 +79,34 @@ def execute_command(command, path):
         pass
     return ''
 
-projects = pd.read_csv(f'{configs.DATA_PATH}/number_conflicting_chunks.csv')
-selected_projects = list(projects[projects['chunks'] >= 1000]['project'])
-selected_projects = filter_intersection(selected_projects)
-selected_projects = filter_projects_missing_data(selected_projects)
-chunks = pd.read_csv(f'{configs.LABELLED_DATASET_PATH}')
-selected_chunks = []
-print('Processing labelled dataset....')
-for index, row in chunks.iterrows():
-    if row['project'] in selected_projects:
-        selected_chunks.append(row)
-selected_chunks = pd.DataFrame(selected_chunks, columns=chunks.columns)
-selected_chunks.to_csv(f'{configs.SELECTED_PROJECTS_DATASET_PATH}', index=False)
-print(f'File {configs.SELECTED_PROJECTS_DATASET_PATH} generated.')
+def select_chunks(input_path, output_path, selected_projects, append=False):
+    selected_chunks = storage.read_isin(input_path, 'project', selected_projects)
+    if append:
+        selected_chunks = incremental.get_new_rows(selected_chunks, output_path)
+        incremental.append_rows(selected_chunks, output_path)
+        print(f'{len(selected_chunks)} new chunks appended to {output_path}.')
+    else:
+        storage.write(selected_chunks, output_path)
+        print(f'File {output_path} generated.')
 
-chunks = pd.read_csv(f'{configs.DATA_PATH}/dataset.csv')
-selected_chunks = []
-print('Processing dataset....')
-for index, row in chunks.iterrows():
-    if row['project'] in selected_projects:
-        selected_chunks.append(row)
-selected_chunks = pd.DataFrame(selected_chunks, columns=chunks.columns)
-selected_chunks.to_csv(f'{configs.DATA_PATH}/selected_dataset.csv', index=False)
-print(f'File {configs.DATA_PATH}/selected_dataset.csv generated.')
\ No newline at end of file
+def main():
+    arguments = incremental.get_arguments('Selects the chunks from the projects that satisfy the selection criteria.')
+    if arguments.incremental and storage.exists(f'{configs.DATA_PATH}/selected_dataset.csv'):
+        # the projects selected in the last complete execution are kept, new projects require a complete execution
+        selected_projects = list(storage.read(f'{configs.DATA_PATH}/selected_dataset.csv', columns=['project'])['project'].unique())
+        append = True
+    else:
+        projects = pd.read_csv(f'{configs.DATA_PATH}/number_conflicting_chunks.csv')
+        selected_projects = list(projects[projects['chunks'] >= 1000]['project'])
+        selected_projects = filter_intersection(selected_projects)
+        selected_projects = filter_projects_missing_data(selected_projects)
+        append = False
+
+    print('Processing labelled dataset....')
+    select_chunks(f'{configs.LABELLED_DATASET_PATH}', f'{configs.SELECTED_PROJECTS_DATASET_PATH}', selected_projects, append)
+
+    print('Processing dataset....')
+    select_chunks(f'{configs.DATA_PATH}/dataset.csv', f'{configs.DATA_PATH}/selected_dataset.csv', selected_projects, append)
+    telemetry.metrics.export()
+
+main()
\ No newline at end of file
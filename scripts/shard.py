@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import heapq
+import hashlib
+import argparse
+import subprocess
+import pathlib
+import pandas as pd
+import configs
+import storage
+
+'''
+    Sharded execution of the collectors over several machines (workers).
+    1. plan: creates a manifest that assigns each project to a worker, balancing the number of chunks of INITIAL_DATASET.
+    2. each worker runs the collectors with --shard {worker}. Only the chunks of the projects assigned to the worker are
+       processed, and the partial outputs (csv files, failures and a done marker) are written to ../data/shards/worker{N}.
+    3. merge: after copying the worker folders back, checks that every worker finished with the same manifest and that
+       every chunk was either collected or failed, and then assembles the final csv files.
+    simulate runs the workers as local processes, which is useful to test the whole flow on a single machine.
+'''
+
+SCRIPTS_FOLDER = pathlib.Path(__file__).parent.absolute()
+SHARDS_PATH = f'{configs.DATA_PATH}/shards'
+MANIFEST_PATH = f'{SHARDS_PATH}/manifest.json'
+
+# key: how the output rows are matched to the chunks of the dataset ('chunk_id' or 'merge', i.e., project-sha)
+# format: format of the output if it is not the format of the intermediate datasets (see storage.py)
+SHARDED_SCRIPTS = {
+    'collect_attributes.py': {
+        'dataset': configs.INITIAL_DATASET_PATH,
+        'output': f'{configs.DATA_PATH}/collected_attributes1.csv',
+        'failures': 'failed_chunks.txt',
+        'key': 'merge',
+    },
+    'collect_attributes_db.py': {
+        'dataset': configs.INITIAL_DATASET_PATH,
+        'output': f'{configs.DATA_PATH}/collected_attributes2.csv',
+        'failures': f'{configs.LOGS_PATH}/collect_attributes_db_failed.txt',
+        'key': 'chunk_id',
+    },
+    'collect_chunk_authors.py': {
+        'dataset': configs.INITIAL_DATASET_PATH,
+        'output': f'{configs.DATA_PATH}/chunk_authors.csv',
+        'failures': f'{configs.LOGS_PATH}/collect_chunk_authors_failed.txt',
+        'key': 'chunk_id',
+        'format': 'csv',
+    },
+    'execute_mac_tool.py': {
+        'dataset': configs.LABELLED_DATASET_PATH,
+        'output': f'{configs.DATA_PATH}/macTool_output.csv',
+        'failures': f'{configs.LOGS_PATH}/execute_mac_tool_failed.txt',
+        'key': 'chunk_id',
+    },
+}
+
+def add_shard_arguments(parser):
+    parser.add_argument('--shard', type=int, default=None, help='index of the worker. Only the projects assigned to it in the manifest are processed.')
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help=f'manifest created by shard.py plan (default: {MANIFEST_PATH}).')
+
+'''
+    Assigns the projects to the workers, always giving the next biggest project (in number of chunks)
+    to the worker with fewer chunks.
+'''
+def plan_shards(dataset_path, workers):
+    df = storage.read(dataset_path, columns=['project'])
+    chunks_per_project = df['project'].value_counts()
+    projects = sorted(chunks_per_project.items(), key=lambda item: (-item[1], item[0]))
+    loads = [(0, worker) for worker in range(workers)]
+    assignments = {worker: {'projects': [], 'chunks': 0} for worker in range(workers)}
+    for project, chunks in projects:
+        load, worker = heapq.heappop(loads)
+        assignments[worker]['projects'].append(project)
+        assignments[worker]['chunks'] += int(chunks)
+        heapq.heappush(loads, (load + chunks, worker))
+    manifest = {
+        'workers': workers,
+        'dataset': dataset_path,
+        'chunks': len(df),
+        'created': time.ctime(),
+        'assignments': {str(worker): assignment for worker, assignment in assignments.items()},
+    }
+    manifest['id'] = get_manifest_id(manifest)
+    return manifest
+
+def get_manifest_id(manifest):
+    content = json.dumps(manifest['assignments'], sort_keys=True)
+    return hashlib.sha1(content.encode()).hexdigest()[:12]
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f'Manifest {manifest_path} not found. Create it with: python shard.py plan --workers N')
+    with open(manifest_path) as file:
+        return json.load(file)
+
+def get_worker_projects(manifest, worker):
+    if str(worker) not in manifest['assignments']:
+        raise ValueError(f"Worker {worker} is not in the manifest (workers: 0 to {manifest['workers']-1}).")
+    return manifest['assignments'][str(worker)]['projects']
+
+def get_worker_folder(worker):
+    folder = f'{SHARDS_PATH}/worker{worker}'
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+# keeps only the chunks of the projects assigned to the worker (all chunks if the script is not sharded)
+def filter_dataset(df, arguments):
+    if arguments.shard is None:
+        return df
+    projects = get_worker_projects(load_manifest(arguments.manifest), arguments.shard)
+    print(f'Shard {arguments.shard}: {len(projects)} projects assigned.', flush=True)
+    return df[df['project'].isin(projects)]
+
+def get_journal_name(name, arguments):
+    if arguments.shard is None:
+        return name
+    return f'{name}-shard{arguments.shard}'
+
+# partial outputs of a worker are written to its shard folder, using the same file names
+def get_output_path(path, arguments):
+    if arguments.shard is None:
+        return path
+    return f'{get_worker_folder(arguments.shard)}/{os.path.basename(path)}'
+
+def get_marker_path(worker, script):
+    return f'{SHARDS_PATH}/worker{worker}/{script.replace(".py", "")}.done'
+
+# written by the collectors at the end of a sharded execution, so the merge can check that the worker finished
+def write_done_marker(script, arguments, chunks, journal):
+    if arguments.shard is None:
+        return
+    manifest = load_manifest(arguments.manifest)
+    marker = {
+        'script': script,
+        'worker': arguments.shard,
+        'manifest': manifest['id'],
+        'chunks': chunks,
+        'collected': len(journal.get_data()),
+        'failures': journal.get_failure_counts(),
+        'finished': time.ctime(),
+    }
+    with open(get_marker_path(arguments.shard, script), 'w') as file:
+        json.dump(marker, file, indent=2)
+
+def read_failures(file_path):
+    failures = []
+    if os.path.exists(file_path):
+        with open(file_path) as file:
+            for line in file:
+                if line.strip() != '':
+                    failures.append(line.strip().rsplit(':', 1))
+    return failures
+
+def get_row_keys(df, key):
+    if key == 'merge':
+        return df['project'].astype(str) + '-' + df['sha'].astype(str)
+    return df['chunk_id'].astype(str)
+
+'''
+    Validates the partial outputs of all workers for a script and assembles its final csv and failures files.
+    Returns the list of problems found (nothing is written if there is any problem).
+'''
+def merge_script(script, manifest):
+    spec = SHARDED_SCRIPTS[script]
+    dataset = storage.read(spec['dataset'])
+    problems = []
+    outputs = []
+    failures = []
+    for worker in range(manifest['workers']):
+        projects = get_worker_projects(manifest, worker)
+        expected_chunks = int(dataset['project'].isin(projects).sum())
+        if expected_chunks == 0:
+            continue
+        marker_path = get_marker_path(worker, script)
+        if not os.path.exists(marker_path):
+            problems.append(f'worker {worker} did not finish ({marker_path} not found).')
+            continue
+        with open(marker_path) as file:
+            marker = json.load(file)
+        if marker['manifest'] != manifest['id']:
+            problems.append(f"worker {worker} used another manifest ({marker['manifest']} instead of {manifest['id']}).")
+        if marker['chunks'] != expected_chunks:
+            problems.append(f"worker {worker} processed {marker['chunks']} chunks, but {expected_chunks} are assigned to it.")
+        output_path = f'{SHARDS_PATH}/worker{worker}/{os.path.basename(spec["output"])}'
+        if storage.exists(output_path):
+            outputs.append(storage.read(output_path))
+        else:
+            problems.append(f'worker {worker} output {output_path} not found.')
+        failures.extend(read_failures(f'{SHARDS_PATH}/worker{worker}/{os.path.basename(spec["failures"])}'))
+    if len(problems) > 0:
+        return problems
+
+    if len(outputs) > 0:
+        output = pd.concat(outputs, ignore_index=True)
+    else:
+        output = pd.DataFrame()
+    if len(output) > 0:
+        output_keys = get_row_keys(output, spec['key'])
+        duplicated = output_keys[output_keys.duplicated()]
+        if len(duplicated) > 0:
+            problems.append(f'{len(duplicated)} rows collected by more than one worker (e.g., {duplicated.iloc[0]}).')
+        collected = set(output_keys)
+    else:
+        collected = set()
+    failed = set(key for key, _ in failures)
+    covered = get_row_keys(dataset, spec['key']).isin(collected) | dataset['chunk_id'].astype(str).isin(failed)
+    if spec['key'] == 'merge':
+        covered = covered | get_row_keys(dataset, 'merge').isin(failed)
+    if not covered.all():
+        missing = dataset.loc[~covered, 'chunk_id']
+        problems.append(f'{len(missing)} chunks were neither collected nor failed (e.g., chunk {missing.iloc[0]}).')
+    if len(problems) > 0:
+        return problems
+
+    storage.write(output, spec['output'], file_format=spec.get('format'))
+    with open(spec['failures'], 'w') as file:
+        for key, reason in failures:
+            file.write(f"{key}:{reason}\n")
+    print(f"{script}: {len(output)} rows merged into {storage.get_path(spec['output'], spec.get('format'))}, {len(failures)} failures.", flush=True)
+    return []
+
+def merge_shards(scripts, manifest_path=MANIFEST_PATH):
+    manifest = load_manifest(manifest_path)
+    valid = True
+    for script in scripts:
+        problems = merge_script(script, manifest)
+        for problem in problems:
+            print(f'{script}: {problem}', flush=True)
+        valid = valid and len(problems) == 0
+    return valid
+
+def print_status(manifest_path=MANIFEST_PATH):
+    manifest = load_manifest(manifest_path)
+    print(f"Manifest {manifest['id']} created on {manifest['created']}: {manifest['chunks']} chunks, {manifest['workers']} workers.")
+    for worker in range(manifest['workers']):
+        assignment = manifest['assignments'][str(worker)]
+        finished = [script for script in SHARDED_SCRIPTS if os.path.exists(get_marker_path(worker, script))]
+        print(f"worker {worker}: {len(assignment['projects'])} projects, {assignment['chunks']} chunks. Finished: {', '.join(finished) or '-'}")
+
+'''
+    Runs each script with one local process per worker and merges the results.
+    Workers share the repos folder, but never the same repository, since each project is assigned to a single worker.
+'''
+def simulate(scripts, manifest_path=MANIFEST_PATH, extra_arguments=[]):
+    manifest = load_manifest(manifest_path)
+    os.makedirs(configs.LOGS_PATH, exist_ok=True)
+    for script in scripts:
+        print(f'{time.ctime()} ### Running {script} with {manifest["workers"]} workers.', flush=True)
+        processes = []
+        for worker in range(manifest['workers']):
+            log = open(f'{configs.LOGS_PATH}/{script.replace(".py", "")}-shard{worker}.log', 'a')
+            command = [sys.executable, script, '--shard', str(worker), '--manifest', os.path.abspath(manifest_path)] + extra_arguments
+            processes.append((worker, log, subprocess.Popen(command, cwd=SCRIPTS_FOLDER, stdout=log, stderr=subprocess.STDOUT)))
+        for worker, log, process in processes:
+            process.wait()
+            log.close()
+            if process.returncode != 0:
+                print(f'{time.ctime()} ### Worker {worker} failed. Check {log.name}.', flush=True)
+    return merge_shards(scripts, manifest_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Splits the collection of attributes among several workers and merges their outputs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    plan_parser = subparsers.add_parser('plan', help='creates the manifest assigning the projects to the workers.')
+    plan_parser.add_argument('--workers', type=int, required=True)
+    plan_parser.add_argument('--dataset', default=configs.INITIAL_DATASET_PATH)
+    for command in ['merge', 'simulate']:
+        command_parser = subparsers.add_parser(command, help=f'{command} the sharded collection of the given scripts (default: all collectors).')
+        command_parser.add_argument('scripts', nargs='*', default=list(SHARDED_SCRIPTS))
+    subparsers.add_parser('status', help='shows the assignments and which workers finished.')
+    for command_parser in subparsers.choices.values():
+        command_parser.add_argument('--manifest', default=MANIFEST_PATH)
+    simulate_parser = subparsers.choices['simulate']
+    simulate_parser.add_argument('--workers', type=int, help='creates a new manifest with this number of workers before running.')
+    simulate_parser.add_argument('--restart', action='store_true', help='discards the journals of the workers.')
+    arguments = parser.parse_args()
+    for script in getattr(arguments, 'scripts', []):
+        if script not in SHARDED_SCRIPTS:
+            parser.error(f'{script} cannot be sharded. Valid scripts are: {", ".join(SHARDED_SCRIPTS)}')
+
+    if arguments.command == 'plan':
+        manifest = plan_shards(arguments.dataset, arguments.workers)
+        save_manifest(manifest, arguments.manifest)
+        for worker, assignment in manifest['assignments'].items():
+            print(f"worker {worker}: {len(assignment['projects'])} projects, {assignment['chunks']} chunks.")
+        print(f"Manifest {manifest['id']} saved to {arguments.manifest}")
+    elif arguments.command == 'status':
+        print_status(arguments.manifest)
+    elif arguments.command == 'merge':
+        if not merge_shards(arguments.scripts, arguments.manifest):
+            sys.exit(1)
+    else:
+        if arguments.workers is not None:
+            save_manifest(plan_shards(configs.INITIAL_DATASET_PATH, arguments.workers), arguments.manifest)
+        if not simulate(arguments.scripts, arguments.manifest, ['--restart'] if arguments.restart else []):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
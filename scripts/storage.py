@@ -0,0 +1,229 @@
+import os
+import shutil
+import argparse
+import urllib.parse
+import pandas as pd
+import pyarrow
+import pyarrow.compute
+import pyarrow.dataset
+import pyarrow.feather
+import pyarrow.ipc
+import pyarrow.parquet
+import configs
+
+'''
+    Storage of the intermediate datasets of the pipeline in csv (default), parquet or feather files.
+    The format is chosen with the environment variable CONFLICTS_STORAGE_FORMAT (see configs.py).
+    The scripts use the csv path of each dataset (e.g., ../data/dataset.csv). In the columnar formats it is stored in a file
+    with the same name and the extension of the format (../data/dataset.parquet), and reading an existing dataset uses
+    the file of the configured format or, if it does not exist, the file of another format (e.g., a csv file collected before).
+    In the columnar formats:
+        - the columns in SCHEMA are stored with their types (ids as int32, project/commit/file columns as categoricals)
+          and the other integer columns are downcast to the smallest type that holds their values
+        - files are memory-mapped and only the requested columns are read
+        - a dataset can be partitioned by project (one folder for each project, e.g., ../data/projects/training.parquet/project=owner%2Fname),
+          so the chunks of a project are read without reading the other projects. The partitions can have different columns:
+          reading the whole dataset returns the columns of all partitions
+'''
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+FORMAT = configs.STORAGE_FORMAT
+SCHEMA = {
+    'chunk_id': 'int32', 'line_start': 'int32', 'line_end': 'int32', 'line_separator': 'int32',
+    'project': 'category', 'project_user': 'category', 'project_name': 'category', 'url': 'category',
+    'sha': 'category', 'leftsha': 'category', 'rightsha': 'category', 'basesha': 'category',
+    'path': 'category', 'file_name': 'category',
+}
+PARTITION_FILE = 'part-0'
+# rows of each chunk of a csv file read by read_isin
+CSV_CHUNK_SIZE = 100000
+
+def get_path(path, file_format=None):
+    file_format = FORMAT if file_format is None else file_format
+    return os.path.splitext(path)[0] + FORMATS[file_format]
+
+# file of an existing dataset: the file of the configured format or, if it does not exist, the file of another format
+def find_path(path):
+    for file_format in [FORMAT] + [other for other in FORMATS if other != FORMAT]:
+        if os.path.exists(get_path(path, file_format)):
+            return get_path(path, file_format)
+    return get_path(path)
+
+def get_format(file_path):
+    return next(file_format for file_format, extension in FORMATS.items() if file_path.endswith(extension))
+
+def exists(path):
+    return os.path.exists(find_path(path))
+
+'''
+    Applies SCHEMA to the columns of df. Integer columns with missing values (which pandas reads as floats) are kept.
+    downcast=False only applies SCHEMA, so the files written at different times (e.g., partitions) have the same types.
+'''
+def apply_schema(df, downcast=True):
+    types = {}
+    for column, dtype in df.dtypes.items():
+        if column in SCHEMA:
+            if SCHEMA[column] == 'category' or not df[column].isna().any():
+                types[column] = SCHEMA[column]
+        elif downcast and pd.api.types.is_integer_dtype(dtype):
+            types[column] = pd.to_numeric(df[column], downcast='integer').dtype
+    return df.astype(types)
+
+def get_partition_folder(file_path, column, value):
+    return os.path.join(file_path, f"{column}={urllib.parse.quote(str(value), safe='')}")
+
+def remove(file_path):
+    if os.path.isdir(file_path):
+        shutil.rmtree(file_path)
+    elif os.path.exists(file_path):
+        os.remove(file_path)
+
+def write_file(df, file_path, file_format):
+    df = df.reset_index(drop=True)
+    if file_format == 'parquet':
+        df.to_parquet(file_path, index=False)
+    else:
+        df.to_feather(file_path)
+
+'''
+    Writes the dataset in the configured format.
+    partition_by: column used to partition a columnar dataset (the partitions of the values in df are replaced,
+    the other partitions are kept). Csv datasets are not partitioned.
+'''
+def write(df, path, partition_by=None, file_format=None):
+    file_format = FORMAT if file_format is None else file_format
+    if file_format == 'csv':
+        df.to_csv(path, index=False)
+        return
+    file_path = get_path(path, file_format)
+    if partition_by is None:
+        remove(file_path)
+        write_file(apply_schema(df), file_path, file_format)
+        return
+    if os.path.isfile(file_path):
+        os.remove(file_path)
+    df = apply_schema(df, downcast=False)
+    for value, partition in df.groupby(partition_by, observed=True, sort=False):
+        folder = get_partition_folder(file_path, partition_by, value)
+        remove(folder)
+        os.makedirs(folder)
+        write_file(partition.drop(columns=[partition_by]), os.path.join(folder, PARTITION_FILE + FORMATS[file_format]), file_format)
+
+'''
+    Reads a dataset, only with the given columns (all columns by default).
+    partition: (column, value) to read only the rows of one partition of a partitioned dataset.
+'''
+def read(path, columns=None, partition=None):
+    file_path = find_path(path)
+    file_format = get_format(file_path)
+    if file_format == 'csv':
+        df = pd.read_csv(file_path, usecols=columns)
+        if partition is not None:
+            df = df[df[partition[0]] == partition[1]]
+        return df if columns is None else df[columns]
+    if os.path.isdir(file_path):
+        return read_partitioned(file_path, file_format, columns, partition)
+    if file_format == 'parquet':
+        return pd.read_parquet(file_path, columns=columns, memory_map=True)
+    return pyarrow.feather.read_table(file_path, columns=columns, memory_map=True).to_pandas()
+
+def unify_schemas(schemas):
+    # pyarrow >= 14 promotes the types that differ between the partitions (e.g., int64 in a partition and double,
+    # because of missing values, in another one)
+    if int(pyarrow.__version__.split('.')[0]) >= 14:
+        return pyarrow.unify_schemas(schemas, promote_options='permissive')
+    return pyarrow.unify_schemas(schemas)
+
+'''
+    Opens a partitioned dataset with the columns of all partitions (e.g., the project partitions have different author
+    columns), the columns missing from a partition are read as missing values.
+    Returns the dataset and the schemas of the partitions.
+'''
+def open_partitioned(file_path, file_format):
+    dataset = pyarrow.dataset.dataset(file_path, format='ipc' if file_format == 'feather' else file_format, partitioning='hive')
+    # dataset.schema has the columns of the first partition and the partitioning column
+    schemas = [dataset.schema] + [fragment.physical_schema for fragment in dataset.get_fragments()]
+    try:
+        schema = unify_schemas(schemas)
+    except pyarrow.ArrowTypeError as error:
+        raise ValueError(f'The partitions of {file_path} have incompatible columns: {error}')
+    dataset = pyarrow.dataset.dataset(file_path, format='ipc' if file_format == 'feather' else file_format, partitioning='hive', schema=schema)
+    return dataset, schemas
+
+'''
+    Empty dataframe of a partition that does not exist: it has the requested columns or, if all columns are requested,
+    the columns that all partitions have and the partitioning column (the columns of a single partition, e.g. authors,
+    are not included).
+'''
+def get_empty_partition(file_path, file_format, columns, partition_column):
+    dataset, schemas = open_partitioned(file_path, file_format)
+    if columns is None:
+        columns = [field.name for field in dataset.schema
+            if field.name == partition_column or all(field.name in schema.names for schema in schemas)]
+    return dataset.schema.empty_table().select(columns).to_pandas()
+
+def read_partitioned(file_path, file_format, columns, partition):
+    if partition is not None:
+        column, value = partition
+        partition_path = os.path.join(get_partition_folder(file_path, column, value), PARTITION_FILE + FORMATS[file_format])
+        if not os.path.exists(partition_path):
+            return get_empty_partition(file_path, file_format, columns, column)
+        partition_columns = None if columns is None else [other for other in columns if other != column]
+        if file_format == 'parquet':
+            df = pd.read_parquet(partition_path, columns=partition_columns, memory_map=True)
+        else:
+            df = pyarrow.feather.read_table(partition_path, columns=partition_columns, memory_map=True).to_pandas()
+        if columns is None or column in columns:
+            df[column] = value
+        return df if columns is None else df[columns]
+    dataset, _ = open_partitioned(file_path, file_format)
+    return dataset.to_table(columns=columns).to_pandas()
+
+'''
+    Reads the rows of a dataset whose column has one of the given values (e.g., the chunks of some projects).
+    Csv files are read in chunks of CSV_CHUNK_SIZE rows, so only the selected rows are kept in memory.
+    In the columnar formats the filter is pushed down to pyarrow, which skips the row groups/partitions without the values.
+'''
+def read_isin(path, column, values, columns=None):
+    file_path = find_path(path)
+    file_format = get_format(file_path)
+    values = list(values)
+    if file_format == 'csv':
+        usecols = None if columns is None else list(dict.fromkeys(columns + [column]))
+        chunks = [chunk[chunk[column].isin(values)] for chunk in pd.read_csv(file_path, usecols=usecols, chunksize=CSV_CHUNK_SIZE)]
+        df = pd.concat(chunks) if len(chunks) > 0 else pd.read_csv(file_path, usecols=usecols, nrows=0)
+        return df.reset_index(drop=True) if columns is None else df[columns].reset_index(drop=True)
+    if os.path.isdir(file_path):
+        dataset, _ = open_partitioned(file_path, file_format)
+    else:
+        dataset = pyarrow.dataset.dataset(file_path, format='ipc' if file_format == 'feather' else file_format)
+    if pyarrow.types.is_dictionary(dataset.schema.field(column).type):
+        # the categorical columns are compared by their values
+        values = pyarrow.array(values, type=dataset.schema.field(column).type.value_type)
+    df = dataset.to_table(columns=columns, filter=pyarrow.compute.field(column).isin(values)).to_pandas()
+    for categorical in df.select_dtypes('category'):
+        df[categorical] = df[categorical].cat.remove_unused_categories()
+    return df
+
+def read_columns(path):
+    file_path = find_path(path)
+    file_format = get_format(file_path)
+    if file_format == 'csv':
+        return list(pd.read_csv(file_path, nrows=0).columns)
+    if os.path.isdir(file_path):
+        return list(open_partitioned(file_path, file_format)[0].schema.names)
+    if file_format == 'parquet':
+        return list(pyarrow.parquet.read_schema(file_path).names)
+    return list(pyarrow.ipc.open_file(file_path).schema.names)
+
+def convert(path, file_format, partition_by=None):
+    write(read(path), path, partition_by, file_format)
+    return get_path(path, file_format)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converts datasets between the storage formats.')
+    parser.add_argument('datasets', nargs='+', help='csv paths of the datasets (e.g., ../data/dataset.csv).')
+    parser.add_argument('--format', choices=list(FORMATS), default=FORMAT, help='format of the new files.')
+    parser.add_argument('--partition-by', help='column used to partition the new files (columnar formats).')
+    arguments = parser.parse_args()
+    for dataset in arguments.datasets:
+        print(f'{find_path(dataset)} -> {convert(dataset, arguments.format, arguments.partition_by)}')
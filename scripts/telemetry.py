@@ -0,0 +1,339 @@
+import os
+import sys
+import time
+import json
+import argparse
+import functools
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+import configs
+
+'''
+    Progress and metrics shared by the scripts of the pipeline.
+    - Progress prints a progress line at most every PROGRESS_INTERVAL seconds, with the throughput and the ETA
+      estimated from a moving average of the last items processed.
+    - metrics counts the external calls (git, db, jvm) and their latencies (histograms), and the chunks processed per project.
+      They are exported every METRICS_INTERVAL seconds (and at the end) to {LOGS_PATH}/{script}.metrics.json and to
+      {LOGS_PATH}/{script}.prom (Prometheus text format).
+    External calls are measured by decorating the functions that execute them with @telemetry.timed(kind).
+    If the environment variable DEBUG_COMMANDS is set (e.g., DEBUG_COMMANDS=1), every call is also written to
+    {LOGS_PATH}/{script}.trace.jsonl with the command, its duration, its output size and the chunk being processed
+    (see set_context). python telemetry.py summarizes the traces (slowest command kinds, repos and chunks).
+'''
+
+DEBUG_COMMANDS = os.environ.get('DEBUG_COMMANDS', '') not in ['', '0']
+PROGRESS_INTERVAL = float(os.environ.get('PROGRESS_INTERVAL', 30))
+METRICS_INTERVAL = float(os.environ.get('METRICS_INTERVAL', 60))
+# absolute, since some collectors change the working directory to the repos
+LOGS_PATH = os.path.abspath(configs.LOGS_PATH)
+# upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, float('inf')]
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.sum, 4),
+            'mean_seconds': round(self.sum / self.count, 4) if self.count > 0 else 0,
+            'max_seconds': round(self.max, 4),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+class Metrics:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.last_export = self.started
+        self.counters = {}
+        self.errors = {}
+        self.latencies = {}
+        self.projects = {}
+        self.progress = {}
+
+    def observe_call(self, kind, seconds, failed=False):
+        self.counters[kind] = self.counters.get(kind, 0) + 1
+        if failed:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+        self.latencies.setdefault(kind, Histogram()).observe(seconds)
+
+    def observe_project(self, project, seconds, count=1):
+        chunks, elapsed = self.projects.get(project, (0, 0.0))
+        self.projects[project] = (chunks + count, elapsed + seconds)
+
+    def to_dict(self):
+        return {
+            'script': self.name,
+            'started': time.ctime(self.started),
+            'elapsed_seconds': round(time.time() - self.started, 2),
+            'progress': self.progress,
+            'calls': self.counters,
+            'errors': self.errors,
+            'latencies': {kind: histogram.to_dict() for kind, histogram in self.latencies.items()},
+            'projects': {project: {'chunks': chunks, 'seconds': round(elapsed, 2), 'chunks_per_second': round(chunks / elapsed, 3) if elapsed > 0 else None}
+                for project, (chunks, elapsed) in self.projects.items()},
+        }
+
+    def to_prometheus(self):
+        prefix = 'conflicts_pipeline'
+        labels = f'script="{self.name}"'
+        lines = [f'# TYPE {prefix}_calls_total counter']
+        for kind, count in self.counters.items():
+            lines.append(f'{prefix}_calls_total{{{labels},kind="{kind}"}} {count}')
+        lines.append(f'# TYPE {prefix}_call_errors_total counter')
+        for kind, count in self.errors.items():
+            lines.append(f'{prefix}_call_errors_total{{{labels},kind="{kind}"}} {count}')
+        lines.append(f'# TYPE {prefix}_call_seconds histogram')
+        for kind, histogram in self.latencies.items():
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                bound = '+Inf' if bound == float('inf') else bound
+                lines.append(f'{prefix}_call_seconds_bucket{{{labels},kind="{kind}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_call_seconds_sum{{{labels},kind="{kind}"}} {histogram.sum:.4f}')
+            lines.append(f'{prefix}_call_seconds_count{{{labels},kind="{kind}"}} {histogram.count}')
+        lines.append(f'# TYPE {prefix}_chunks_processed_total counter')
+        for project, (chunks, _) in self.projects.items():
+            lines.append(f'{prefix}_chunks_processed_total{{{labels},project="{project}"}} {chunks}')
+        for key in ['done', 'total', 'items_per_second', 'eta_seconds']:
+            if self.progress.get(key) is not None:
+                lines.append(f'{prefix}_progress_{key}{{{labels}}} {self.progress[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        self.last_export = time.time()
+        if not os.path.exists(LOGS_PATH):
+            os.makedirs(LOGS_PATH)
+        with open(f'{LOGS_PATH}/{self.name}.metrics.json', 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+        with open(f'{LOGS_PATH}/{self.name}.prom', 'w') as file:
+            file.write(self.to_prometheus())
+
+    def export_if_due(self):
+        if time.time() - self.last_export >= METRICS_INTERVAL:
+            self.export()
+
+metrics = Metrics(os.path.basename(sys.argv[0]).replace('.py', '') or 'python')
+
+class Tracer:
+    def __init__(self, name):
+        self.path = f'{LOGS_PATH}/{name}.trace.jsonl'
+        self.file = None
+        # each thread has its own context (e.g., the parallel clones of clone_projects.py)
+        self.local = threading.local()
+
+    @property
+    def context(self):
+        return getattr(self.local, 'context', {})
+
+    @context.setter
+    def context(self, context):
+        self.local.context = context
+
+    def write(self, record):
+        if self.file is None:
+            if not os.path.exists(LOGS_PATH):
+                os.makedirs(LOGS_PATH)
+            self.file = open(self.path, 'a', encoding='utf-8', buffering=1)
+        record.update(self.context)
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+tracer = Tracer(metrics.name)
+
+# project and chunk being processed, added to the trace of the calls made while processing it
+def set_context(project=None, chunk_id=None):
+    tracer.context = {'project': project, 'chunk_id': chunk_id}
+
+def get_output_size(result):
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+# the calls can be made by several threads
+calls_lock = threading.Lock()
+
+# decorator that counts the calls of a function that executes an external command or query, and measures their latencies
+def timed(kind):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            failed = True
+            result = None
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.time() - start
+                with calls_lock:
+                    metrics.observe_call(kind, elapsed, failed)
+                if DEBUG_COMMANDS:
+                    record = {
+                        'kind': kind,
+                        'function': function.__name__,
+                        'command': str(args[0])[:500] if len(args) > 0 else '',
+                        'cwd': str(args[1]) if kind == 'git' and len(args) > 1 else os.getcwd(),
+                        'duration_ms': round(elapsed * 1000, 3),
+                        'output_size': get_output_size(result),
+                        'failed': failed,
+                    }
+                    with calls_lock:
+                        tracer.write(record)
+        return wrapper
+    return decorator
+
+def format_duration(seconds):
+    if seconds is None:
+        return '?'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}h{(seconds % 3600) // 60:02d}m'
+    if seconds >= 60:
+        return f'{seconds // 60}m{seconds % 60:02d}s'
+    return f'{seconds}s'
+
+'''
+    Throttled progress of a loop over items (usually chunks).
+    update(project) must be called after each processed item, and skip() for the items that were not processed
+    (e.g., already collected), so they do not count in the throughput and in the ETA.
+'''
+class Progress:
+    def __init__(self, total, unit='chunks', print_interval=None, window=100):
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.print_interval = PROGRESS_INTERVAL if print_interval is None else print_interval
+        self.start = time.time()
+        self.last_update = self.start
+        self.last_print = self.start
+        self.window = deque([(self.start, 0)], maxlen=window)
+
+    def skip(self, count=1):
+        self.total -= count
+
+    def update(self, project=None, count=1):
+        now = time.time()
+        self.done += count
+        if project is not None:
+            metrics.observe_project(project, now - self.last_update, count)
+        self.last_update = now
+        self.window.append((now, self.done))
+        metrics.progress = self.get_status()
+        if now - self.last_print >= self.print_interval:
+            self.print_status(project)
+        metrics.export_if_due()
+
+    # items per second in the moving window
+    def get_rate(self):
+        (first_time, first_done), (last_time, last_done) = self.window[0], self.window[-1]
+        if last_time <= first_time:
+            return None
+        return (last_done - first_done) / (last_time - first_time)
+
+    def get_status(self):
+        rate = self.get_rate()
+        eta = (self.total - self.done) / rate if rate else None
+        return {
+            'done': self.done,
+            'total': self.total,
+            'items_per_second': round(rate, 3) if rate is not None else None,
+            'eta_seconds': round(eta) if eta is not None else None,
+        }
+
+    def print_status(self, project=None):
+        self.last_print = time.time()
+        status = self.get_status()
+        percentage = (self.done / self.total) * 100 if self.total > 0 else 100
+        rate = status['items_per_second'] if status['items_per_second'] is not None else 0
+        message = f"{time.ctime()} ### {percentage:.1f}% ({self.done}/{self.total} {self.unit}) | {rate:.2f} {self.unit}/s | ETA {format_duration(status['eta_seconds'])}"
+        if project is not None and project in metrics.projects:
+            chunks, elapsed = metrics.projects[project]
+            if elapsed > 0:
+                message += f" | {project}: {chunks / elapsed:.2f} {self.unit}/s"
+        print(message, flush=True)
+
+    def finish(self):
+        metrics.progress = self.get_status()
+        print(f"{time.ctime()} ### {self.done} {self.unit} processed in {format_duration(time.time() - self.start)}.", flush=True)
+        metrics.export()
+
+# command without its arguments (e.g., "git blame", "java -jar classifyConcatenation.jar" or the database function)
+def get_command_kind(record):
+    if record['kind'] == 'db':
+        return f"db {record['function']}"
+    words = str(record['command']).split()
+    # the folder of "git -C folder" is not part of the kind
+    words = [word for i, word in enumerate(words) if word != '-C' and (i == 0 or words[i - 1] != '-C')]
+    kind = []
+    for word in words:
+        kind.append(word)
+        if not word.startswith('-') and word not in ['git', 'java', '-jar'] and len(kind) > 1:
+            break
+    return ' '.join(kind)
+
+def load_traces(trace_paths):
+    traces = []
+    for trace_path in trace_paths:
+        df = pd.read_json(trace_path, lines=True)
+        df['script'] = os.path.basename(trace_path).replace('.trace.jsonl', '')
+        traces.append(df)
+    traces = pd.concat(traces, ignore_index=True)
+    traces['command_kind'] = traces.apply(get_command_kind, axis=1)
+    # calls made outside of a chunk are assigned to the folder where they were executed
+    if 'project' not in traces:
+        traces['project'] = None
+    traces['project'] = traces['project'].fillna(traces['cwd'])
+    return traces
+
+def summarize(traces, column, top):
+    summary = traces.groupby(column).agg(calls=('duration_ms', 'size'), total_seconds=('duration_ms', 'sum'),
+        mean_ms=('duration_ms', 'mean'), p95_ms=('duration_ms', lambda durations: np.percentile(durations, 95)),
+        max_ms=('duration_ms', 'max'), output_size=('output_size', 'sum'), failures=('failed', 'sum'))
+    summary['total_seconds'] = summary['total_seconds'] / 1000
+    summary['share'] = (summary['total_seconds'] / summary['total_seconds'].sum() * 100).round(1)
+    return summary.sort_values('total_seconds', ascending=False).head(top).round(2)
+
+def print_report(trace_paths, top=10):
+    traces = load_traces(trace_paths)
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_colwidth', 60)
+    print(f"{len(traces)} calls traced in {', '.join(traces['script'].unique())}: {traces['duration_ms'].sum() / 1000:.1f} seconds.\n")
+    print('Slowest command kinds:')
+    print(summarize(traces, 'command_kind', top).to_string(), '\n')
+    print('Slowest repos:')
+    print(summarize(traces, 'project', top).to_string(), '\n')
+    if 'chunk_id' in traces and traces['chunk_id'].notnull().any():
+        print('Slowest chunks:')
+        print(summarize(traces, ['project', 'chunk_id'], top).to_string(), '\n')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarizes the traces written by the scripts executed with DEBUG_COMMANDS=1.')
+    parser.add_argument('traces', nargs='*', help=f'trace files (default: all files {configs.LOGS_PATH}/*.trace.jsonl).')
+    parser.add_argument('--top', type=int, default=10, help='number of rows of each table.')
+    arguments = parser.parse_args()
+    trace_paths = arguments.traces
+    if len(trace_paths) == 0:
+        trace_paths = [f'{configs.LOGS_PATH}/{file_name}' for file_name in sorted(os.listdir(configs.LOGS_PATH)) if file_name.endswith('.trace.jsonl')]
+    if len(trace_paths) == 0:
+        print(f'No traces found in {configs.LOGS_PATH}. Execute the scripts with DEBUG_COMMANDS=1 to generate them.')
+    else:
+        print_report(trace_paths, arguments.top)
@@ -1,21 +1,84 @@
+import argparse
+import numpy as np
 import pandas as pd
+import scipy.sparse
 import configs
+import incremental
+import storage
 
-df = pd.read_csv(f"{configs.DATA_PATH}/selected_dataset.csv")
+'''
+    Multi-hot encoding of the language constructs of each chunk (kind_conflict, e.g. "Method invocation, Variable"):
+    one 0/1 column for each construct, ordered by name.
+    With sparse=True the columns use a pandas sparse dtype, since most chunks only have a few of the ~40 constructs.
+'''
+def encode_language_constructors(kind_conflict, sparse=False):
+    constructors = kind_conflict.str.split(',').explode().str.strip().dropna()
+    encoded = pd.crosstab(constructors.index, constructors).clip(upper=1)
+    encoded = encoded.reindex(kind_conflict.index, fill_value=0).astype('int64')
+    encoded.index.name = None
+    encoded.columns.name = None
+    if sparse:
+        encoded = encoded.astype(pd.SparseDtype('int8', 0))
+    return encoded
 
-print('Transforming language constructors into boolean attributes...')
-language_constructors = set()
-for index, row in df.iterrows():
-    row_constructors = row['kind_conflict'].split(',')
-    for row_constructor in row_constructors:
-        language_constructors.add(row_constructor.strip())
+def transform_language_constructors(df, sparse=False):
+    encoded = encode_language_constructors(df['kind_conflict'], sparse)
+    existing_columns = [column for column in encoded.columns if column in df.columns]
+    for column in existing_columns:
+        df[column] = encoded[column]
+    return pd.concat([df, encoded.drop(columns=existing_columns)], axis=1)
 
-for language_constructor in language_constructors:
-    df[language_constructor] = 0
+'''
+    Saves the encoding of the chunks in a compact npz file:
+        sparse: CSR matrix (data, indices, indptr)
+        packed: bit matrix packed with np.packbits (8 constructs per byte)
+    together with the chunk ids (rows) and the constructs (columns).
+'''
+def save_language_constructors(encoded, chunk_ids, file_path, file_format):
+    values = encoded.sparse.to_coo().tocsr() if hasattr(encoded, 'sparse') else scipy.sparse.csr_matrix(encoded.values)
+    arrays = {'chunk_ids': np.asarray(chunk_ids), 'columns': np.array(encoded.columns, dtype=str), 'format': file_format, 'shape': np.array(values.shape)}
+    if file_format == 'sparse':
+        arrays.update({'data': values.data.astype(np.int8), 'indices': values.indices, 'indptr': values.indptr})
+    else:
+        arrays['bits'] = np.packbits(values.toarray().astype(bool), axis=1)
+    np.savez_compressed(file_path, **arrays)
 
-for index, row in df.iterrows():
-    row_constructors = row['kind_conflict'].split(',')
-    for row_constructor in row_constructors:
-        df.loc[index, row_constructor.strip()] = 1
-print(f'Finished. Generating file: {configs.DATA_PATH}/selected_dataset_2.csv ')
-df.to_csv(f"{configs.DATA_PATH}/selected_dataset_2.csv", index=False)
\ No newline at end of file
+def load_language_constructors(file_path, sparse=False):
+    arrays = np.load(file_path)
+    shape = tuple(arrays['shape'])
+    if str(arrays['format']) == 'sparse':
+        values = scipy.sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=shape)
+    else:
+        values = scipy.sparse.csr_matrix(np.unpackbits(arrays['bits'], axis=1, count=shape[1]).astype(np.int8))
+    if sparse:
+        encoded = pd.DataFrame.sparse.from_spmatrix(values, index=arrays['chunk_ids'], columns=list(arrays['columns']))
+    else:
+        encoded = pd.DataFrame(values.toarray().astype('int64'), index=arrays['chunk_ids'], columns=list(arrays['columns']))
+    encoded.index.name = 'chunk_id'
+    return encoded
+
+def main():
+    parser = argparse.ArgumentParser(description='Transforms the language constructs of each chunk into boolean attributes.')
+    parser.add_argument('--incremental', action='store_true', help='only process the chunks that are not in the output yet and append them to it.')
+    parser.add_argument('--compact', choices=['sparse', 'packed'], help='also saves the encoding of all chunks to language_constructs.npz in this format.')
+    arguments = parser.parse_args()
+    output_path = f"{configs.DATA_PATH}/selected_dataset_2.csv"
+    df = storage.read(f"{configs.DATA_PATH}/selected_dataset.csv")
+    if arguments.compact is not None:
+        compact_path = f"{configs.DATA_PATH}/language_constructs.npz"
+        save_language_constructors(encode_language_constructors(df['kind_conflict'], sparse=True), df['chunk_id'], compact_path, arguments.compact)
+        print(f'Encoding saved to {compact_path} ({arguments.compact}).')
+    if arguments.incremental:
+        df = incremental.get_new_rows(df, output_path)
+
+    print('Transforming language constructors into boolean attributes...')
+    df = transform_language_constructors(df)
+    print(f'Finished. Generating file: {output_path} ')
+    if arguments.incremental:
+        # constructs that did not occur in the existing chunks are added as new columns
+        incremental.append_rows(df, output_path, fill_value=0)
+    else:
+        storage.write(df, output_path)
+
+if __name__ == '__main__':
+    main()